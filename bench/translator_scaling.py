@@ -0,0 +1,117 @@
+"""Translator scaling benchmark.
+
+Translates generated programs of growing size and times every translator
+phase separately. For each phase the log-log slope of time over token count is
+reported; a slope well above 1 means the phase is super-linear.
+"""
+
+from __future__ import annotations
+
+import argparse
+import math
+import os
+import tempfile
+import time
+
+from bench.forth_gen import generate_program
+from src.isa import write_data, write_hex_data, write_hex_instructions, write_instructions
+from src.translator import (
+    check_interrupt_handler,
+    first_stage,
+    forth_to_assemble,
+    second_stage,
+    tokenize,
+)
+
+PHASES = ("tokenize", "forth_to_assemble", "first_stage", "second_stage", "write_images")
+SUPERLINEAR_SLOPE = 1.25
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def write_images(directory, instructions, data_words, intr, handler_addr):
+    code_file = os.path.join(directory, "code.bin")
+    data_file = os.path.join(directory, "data.bin")
+    write_instructions(code_file, instructions, intr, handler_addr)
+    write_data(data_file, data_words)
+    write_hex_instructions(code_file + ".hex", instructions)
+    write_hex_data(data_file + ".hex", data_words)
+
+
+def measure(text: str, directory: str) -> tuple[int, dict[str, float]]:
+    times = {}
+    (tokens, _), times["tokenize"] = timed(tokenize, text)
+    asm_text, times["forth_to_assemble"] = timed(forth_to_assemble, text)
+    (instrs_tmp, labels, data_words), times["first_stage"] = timed(first_stage, asm_text)
+    instructions, times["second_stage"] = timed(second_stage, instrs_tmp, labels)
+    intr, handler_addr = check_interrupt_handler(instrs_tmp, labels)
+    _, times["write_images"] = timed(write_images, directory, instructions, data_words, intr, handler_addr)
+    return len(tokens), times
+
+
+def slope(xs: list[float], ys: list[float]) -> float:
+    """Least-squares slope of log(y) over log(x).
+
+    >>> round(slope([1, 10, 100], [2, 20, 200]), 6)
+    1.0
+    """
+    lx = [math.log(x) for x in xs]
+    ly = [math.log(max(y, 1e-9)) for y in ys]
+    mx, my = sum(lx) / len(lx), sum(ly) / len(ly)
+    den = sum((x - mx) ** 2 for x in lx)
+    return sum((x - mx) * (y - my) for x, y in zip(lx, ly)) / den if den else 0.0
+
+
+def run(sizes, depth, strings_per_word, repeat):
+    rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        for words in sizes:
+            text = generate_program(
+                words=words,
+                depth=depth,
+                variables=max(8, words // 10),
+                arrays=max(2, words // 50),
+                strings=max(2, words * strings_per_word),
+            )
+            best = None
+            for _ in range(repeat):
+                n_tokens, times = measure(text, directory)
+                best = times if best is None else {k: min(best[k], times[k]) for k in PHASES}
+            rows.append((words, n_tokens, best))
+    return rows
+
+
+def report(rows):
+    print(f"{'words':>8} {'tokens':>10} " + " ".join(f"{phase:>18}" for phase in PHASES))
+    for words, n_tokens, times in rows:
+        print(f"{words:>8} {n_tokens:>10} " + " ".join(f"{times[phase]:>17.4f}s" for phase in PHASES))
+    if len(rows) < 2:
+        return []
+    tokens = [n for _, n, _ in rows]
+    suspicious = []
+    print(f"{'slope':>19} " + " ".join(f"{slope(tokens, [t[p] for _, _, t in rows]):>18.2f}" for p in PHASES))
+    for phase in PHASES:
+        if slope(tokens, [t[phase] for _, _, t in rows]) > SUPERLINEAR_SLOPE:
+            suspicious.append(phase)
+    for phase in suspicious:
+        print(f"WARNING: {phase} grows super-linearly (slope > {SUPERLINEAR_SLOPE})")
+    return suspicious
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Translator scaling benchmark")
+    parser.add_argument("sizes", nargs="*", type=int, default=[250, 500, 1000, 2000, 4000])
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--strings-per-word", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    suspicious = report(run(args.sizes, args.depth, args.strings_per_word, args.repeat))
+    raise SystemExit(1 if suspicious else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+var done
+: interrupt_handler
+    begin
+        in 1 0 != if
+            in 0
+            dup 0 != if
+                out 1
+            else
+                drop
+                1 done !
+            then
+        else
+            exit
+        then
+    again
+;
+eint
+begin
+    done @ 0 != if
+        exit
+    then
+again
+halt
@@ -0,0 +1,4 @@
+str s1 "hello world!"
+s1 outs 1
+s1 5 + 7 type 1
+halt
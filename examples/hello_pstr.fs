@@ -0,0 +1,21 @@
+\ Packed strings: 4 characters per data word, equal strings and shared suffixes stored once
+pstr greeting "Hello, world!\n"
+pstr world "world!\n"
+pstr copy "Hello, world!\n"
+: print_packed
+    begin
+        dup c@
+        dup 0 != if
+            out 1
+            inc
+        else
+            drop
+            drop
+            exit
+        then
+    again
+;
+greeting outps 1
+world outps 1
+copy print_packed
+halt
@@ -0,0 +1,44 @@
+var sum1
+var sum2
+var len
+: print
+    begin
+        len @ 0 != if
+        48 +
+        out 1
+        len @ dec len !
+        else
+            exit
+        then
+    again
+;
+: int_to_digits
+    begin
+        dup 0 != if
+        dup dup 10 swap /
+        10 * swap - swap 10 swap /
+        len @ inc len !
+        else
+            drop
+            exit
+        then
+    again
+;
+: sum_of_square
+    101 0 do
+        sum1 @ i dup * + sum1 !
+    loop
+;
+: sum
+    101 0 do
+        sum2 @ i + sum2 !
+    loop
+;
+sum_of_square
+sum
+sum2 @ dup *
+sum1 @
+swap -
+int_to_digits
+print
+halt
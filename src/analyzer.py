@@ -0,0 +1,386 @@
+"""Static best/worst-case tick estimation over a translated program.
+
+The control-flow graph is built from the final instructions. Jump and call
+targets come from the constant pushed right before them (`lit X [inc|dec]*`,
+as the translator emits them); a computed target is reported as an error.
+Every instruction costs what ControlUnit spends on it, calls cost their
+callee, a jump to another procedure's entry is a tail call.
+
+Loops are the natural loops of the graph, collapsed innermost first. A
+`do ... loop` whose limits are literals runs a known number of times; any
+other loop needs a bound — the maximum number of times its header executes —
+given per header address or per word:
+
+    python -m src.analyzer <container_file> [<input_file>] [--limit=<ticks>] [--bound=<word|pc>=<n>]...
+
+With an input schedule the interrupt handler's worst-case latency is checked
+against the smallest gap between input events, and the worst-case run
+(main program plus one handler invocation per event) against the tick limit.
+`wait` costs its issue tick; the time a program idles in it depends on the
+schedule and is bounded by the tick of the last input event, so a program
+that waits is rejected for a schedule with no input at all.
+"""
+
+from __future__ import annotations
+
+import sys
+from itertools import pairwise
+from graphlib import CycleError, TopologicalSorter
+
+from src.container import Container
+from src.isa import BRANCH_OPCODES, Opcode, unpack_string
+from src.machine import read_input_schedule
+
+TWO_TICK_OPCODES = (
+    Opcode.JZ,
+    Opcode.JN,
+    *BRANCH_OPCODES,
+    Opcode.DO,
+    Opcode.LOAD,
+    Opcode.LOADB,
+    Opcode.STORE,
+    Opcode.LOAD_ABS,
+    Opcode.STORE_ABS,
+)
+EXIT = None  # successor of instructions that leave the procedure
+
+
+def literal_before(program, pc):
+    """Value on top of the stack before `pc` if it is a literal adjusted by inc/dec, else None."""
+    offset = 0
+    k = pc - 1
+    while k >= 0 and program[k]["opcode"] in (Opcode.INC, Opcode.DEC):
+        offset += 1 if program[k]["opcode"] == Opcode.INC else -1
+        k -= 1
+    if k < 0 or program[k]["opcode"] != Opcode.LIT:
+        return None
+    return program[k]["arg"] + offset
+
+
+def add(a, b):
+    return a[0] + b[0], a[1] + b[1]
+
+
+class Analyzer:
+    def __init__(self, program, data, handler_addr=None, symbols=None, bounds=None):
+        self.program = program
+        self.data = data
+        self.handler_addr = handler_addr if handler_addr is not None and handler_addr < len(program) else None
+        symbols = symbols or {}
+        self.names = {0: "main"}
+        self.names.update({s["value"]: name for name, s in symbols.items() if s["section"] == "code"})
+        self.entries = set(self.names)
+        self.entries.update(self.constant(pc) for pc, ins in enumerate(program) if ins["opcode"] == Opcode.CALL)
+        if self.handler_addr is not None:
+            self.entries.add(self.handler_addr)
+        self.entries.discard(None)
+        self.bounds = {}
+        for key, bound in (bounds or {}).items():
+            if isinstance(key, str) and not key.isdigit():
+                if key not in symbols:
+                    sys.exit(f"unknown word {key}")
+                key = symbols[key]["value"]
+            self.bounds[int(key)] = bound
+        self.costs = {}
+        self.in_progress = set()
+
+    def name(self, entry):
+        return self.names.get(entry, f"proc_{entry}")
+
+    def constant(self, pc):
+        return literal_before(self.program, pc)
+
+    def target(self, pc):
+        target = self.constant(pc)
+        if target is None or not 0 <= target < len(self.program):
+            sys.exit(f"computed target of {self.program[pc]['opcode']} at pc {pc}")
+        return target
+
+    def do_count(self, pc):
+        if pc < 2 or self.program[pc - 1]["opcode"] != Opcode.LIT or self.program[pc - 2]["opcode"] != Opcode.LIT:
+            return None
+        return max(self.program[pc - 2]["arg"] - self.program[pc - 1]["arg"], 0)
+
+    def block_ticks(self, pc):
+        opcode = self.program[pc]["opcode"]
+        value = self.constant(pc)
+        if value is None:
+            sys.exit(f"block length of {opcode} at pc {pc} is not a literal")
+        if opcode == Opcode.OUTB:
+            words = value
+        elif opcode == Opcode.OUTPS:
+            _, words = unpack_string(self.data, value)
+        else:
+            end = value
+            while end < len(self.data) and self.data[end] != 0:
+                end += 1
+            words = end - value + 1
+        return 1 + max(words, 1)
+
+    def ticks(self, pc):
+        opcode = self.program[pc]["opcode"]
+        if opcode == Opcode.HALT:
+            return 0
+        if opcode in (Opcode.OUTS, Opcode.OUTB, Opcode.OUTPS):
+            return self.block_ticks(pc)
+        if opcode in TWO_TICK_OPCODES:
+            return 2
+        return 1
+
+    def successors(self, entry, pc):
+        """[(next pc or EXIT, (best, worst) ticks spent on the way)]"""
+        ins = self.program[pc]
+        opcode = ins["opcode"]
+        cost = self.ticks(pc)
+        one = (cost, cost)
+        if opcode in (Opcode.HALT, Opcode.RET, Opcode.IRET):
+            return [(EXIT, one)]
+        if opcode == Opcode.JUMP:
+            target = self.target(pc)
+            if target in self.entries and target != entry:
+                return [(EXIT, add(one, self.cost(target)))]
+            return [(target, one)]
+        if opcode == Opcode.CALL:
+            return [(pc + 1, add(one, self.cost(self.target(pc))))]
+        if opcode in (Opcode.JZ, Opcode.JN):
+            sys.exit(f"computed target of {opcode} at pc {pc}")
+        if opcode in BRANCH_OPCODES or opcode == Opcode.LOOP:
+            return [(ins["arg"], one), (pc + 1, one)]
+        if opcode == Opcode.DO:
+            count = self.do_count(pc)
+            if count is None:
+                return [(pc + 1, one), (ins["arg"], one)]
+            return [(ins["arg"] if count == 0 else pc + 1, one)]
+        return [(pc + 1, one)]
+
+    def graph(self, entry):
+        graph = {}
+        todo = [entry]
+        while todo:
+            pc = todo.pop()
+            if pc in graph:
+                continue
+            if not 0 <= pc < len(self.program):
+                sys.exit(f"{self.name(entry)} runs off the program at pc {pc}")
+            graph[pc] = self.successors(entry, pc)
+            todo.extend(succ for succ, _ in graph[pc] if succ is not EXIT)
+        return graph
+
+    def loop_bound(self, entry, header, back_edges):
+        if isinstance(header, tuple):  # an inner loop sharing the header was collapsed first
+            header = header[1]
+        loop_opcodes = {self.program[u]["opcode"] for u in back_edges if isinstance(u, int)}
+        if loop_opcodes == {Opcode.LOOP} and self.program[header - 1]["opcode"] == Opcode.DO:
+            count = self.do_count(header - 1)
+            if count is not None:
+                return count, count
+        for key in (header, entry):
+            if key in self.bounds:
+                return 1, self.bounds[key]
+        sys.exit(f"loop at pc {header} in {self.name(entry)} needs a bound")
+
+    def cost(self, entry):
+        """(best, worst) ticks from entering the procedure to leaving it."""
+        if entry in self.costs:
+            return self.costs[entry]
+        if entry in self.in_progress:
+            sys.exit(f"recursive call of {self.name(entry)}")
+        self.in_progress.add(entry)
+        try:
+            graph = self.graph(entry)
+            entry_node = collapse_loops(graph, entry, lambda header, back: self.loop_bound(entry, header, back))
+            costs = paths(graph, entry_node)
+            if EXIT not in costs:
+                sys.exit(f"{self.name(entry)} never returns")
+            self.costs[entry] = costs[EXIT]
+        finally:
+            self.in_progress.discard(entry)
+        return self.costs[entry]
+
+    def report(self):
+        """[{"name", "entry", "best", "worst", "error"}] for main, the handler and every called word."""
+        rows = []
+        for entry in sorted(self.entries):
+            row = {"name": self.name(entry), "entry": entry, "best": None, "worst": None, "error": None}
+            try:
+                row["best"], row["worst"] = self.cost(entry)
+            except SystemExit as e:
+                row["error"] = str(e.code)
+            rows.append(row)
+        return rows
+
+    def interrupt_latency(self):
+        """Worst ticks from an input event to the end of its handler: waiting for the current
+        instruction to finish, entering the handler and running it."""
+        assert self.handler_addr is not None, "program has no interrupt handler"
+        reachable = set()
+        for entry in self.entries - {self.handler_addr}:
+            try:
+                reachable.update(self.graph(entry))
+            except SystemExit:
+                continue
+        wait = max((self.ticks(pc) - 1 for pc in reachable), default=0)
+        return wait + 1 + self.cost(self.handler_addr)[1]
+
+    def check(self, schedule, limit):
+        """Problems that would make a run with `schedule` drop input or exceed `limit` ticks."""
+        problems = []
+        events = sorted(schedule)
+        handler_worst = 0
+        if events and self.handler_addr is not None:
+            latency = self.interrupt_latency()
+            handler_worst = 1 + self.cost(self.handler_addr)[1]
+            gaps = [b - a for a, b in pairwise(events)]
+            if gaps and min(gaps) < latency:
+                tick = events[gaps.index(min(gaps)) + 1]
+                problems.append(
+                    f"input at tick {tick} comes {min(gaps)} ticks after the previous one, handler latency is {latency}"
+                )
+        waits = any(ins["opcode"] == Opcode.WAIT for ins in self.program)
+        if waits and not events:
+            problems.append("wait is unbounded: the schedule has no input to wake it")
+            return problems
+        try:
+            worst = self.cost(0)[1] + len(events) * handler_worst
+            if waits:
+                worst += events[-1]  # every wait ends by the last input
+        except SystemExit as e:
+            problems.append(f"cannot check the tick limit: {e.code}")
+            return problems
+        if worst > limit:
+            problems.append(f"worst case {worst} ticks exceeds the limit of {limit}")
+        return problems
+
+
+def collapse_loops(graph, entry, loop_bound):
+    """Replace every natural loop of `graph` by one node, innermost loops first; return the new entry node.
+
+    `loop_bound(header, back_edge_sources)` gives the (least, most) times the header executes.
+    """
+    while True:
+        loops = natural_loops(graph, entry)
+        if not loops:
+            return entry
+        header, body, back = min(loops, key=lambda loop: len(loop[1]))
+        for node in graph:
+            if node not in body and any(succ in body and succ != header for succ, _ in graph[node]):
+                sys.exit(f"loop at pc {header} is entered in the middle")
+        least, most = loop_bound(header, back)
+        inside = {node: [(s, c) for s, c in graph[node] if s in body and s != header] for node in body}
+        dist = paths(inside, header)
+        iteration = [add(dist[u], cost) for u in back for s, cost in graph[u] if s == header]
+        exits = {}
+        for u in body:
+            for succ, cost in graph[u]:
+                if succ not in body:
+                    lo, hi = add(dist[u], cost)
+                    old = exits.get(succ, (lo, hi))
+                    exits[succ] = (min(lo, old[0]), max(hi, old[1]))
+        if not exits:
+            sys.exit(f"loop at pc {header} never exits")
+        iter_lo = min(lo for lo, _ in iteration)
+        iter_hi = max(hi for _, hi in iteration)
+        node = ("loop", header)
+        collapsed = [
+            (succ, ((least - 1) * iter_lo + lo, (most - 1) * iter_hi + hi)) for succ, (lo, hi) in exits.items()
+        ]
+        for u in body:
+            del graph[u]
+        for u, succs in graph.items():
+            graph[u] = [(node if s == header else s, c) for s, c in succs]
+        graph[node] = collapsed
+        if entry in body:
+            entry = node
+
+
+def natural_loops(graph, entry):
+    """[(header, body, back edge sources)] found by a depth-first search from `entry`."""
+    back = {}
+    state = {entry: "open"}
+    stack = [(entry, iter(graph[entry]))]
+    while stack:
+        node, succs = stack[-1]
+        for succ, _ in succs:
+            if succ is EXIT or succ not in graph:
+                continue
+            if state.get(succ) == "open":
+                back.setdefault(succ, set()).add(node)
+            elif succ not in state:
+                state[succ] = "open"
+                stack.append((succ, iter(graph[succ])))
+                break
+        else:
+            state[node] = "done"
+            stack.pop()
+    preds = {}
+    for u, succs in graph.items():
+        for s, _ in succs:
+            preds.setdefault(s, set()).add(u)
+    loops = []
+    for header, sources in back.items():
+        body = {header}
+        todo = list(sources)
+        while todo:
+            u = todo.pop()
+            if u not in body:
+                body.add(u)
+                todo.extend(preds.get(u, ()))
+        loops.append((header, body, sources))
+    return loops
+
+
+def paths(graph, start):
+    """(best, worst) ticks from `start` to every node reachable in the acyclic `graph` (EXIT included)."""
+    order = TopologicalSorter({node: set() for node in graph})
+    for u, succs in graph.items():
+        for s, _ in succs:
+            order.add(s, u)
+    try:
+        order = list(order.static_order())
+    except CycleError as e:
+        sys.exit(f"irreducible control flow around pc {e.args[1][0]}")
+    dist = {start: (0, 0)}
+    for u in order:
+        if u not in dist or u not in graph:
+            continue
+        for succ, cost in graph[u]:
+            lo, hi = add(dist[u], cost)
+            old = dist.get(succ, (lo, hi))
+            dist[succ] = (min(lo, old[0]), max(hi, old[1]))
+    return dist
+
+
+def main(container_file, input_file=None, limit=10000, bounds=None):
+    with Container(container_file) as container:
+        (code, handler_addr), data, symbols = container.code, container.data, container.symbols
+    analyzer = Analyzer(code, data, handler_addr, symbols, bounds)
+    print(f"{'procedure':<24}{'entry':>6}{'best':>8}{'worst':>8}")
+    report = analyzer.report()
+    for row in report:
+        if row["error"] is None:
+            print(f"{row['name']:<24}{row['entry']:>6}{row['best']:>8}{row['worst']:>8}")
+        else:
+            print(f"{row['name']:<24}{row['entry']:>6}  {row['error']}")
+    if any(row["entry"] == analyzer.handler_addr and row["error"] is None for row in report):
+        print("interrupt latency:", analyzer.interrupt_latency())
+    if input_file is None:
+        return
+    problems = analyzer.check(read_input_schedule(input_file), limit)
+    if problems:
+        sys.exit("\n".join(problems))
+    print("schedule ok")
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    options = [arg.removeprefix("--").split("=", 1) for arg in sys.argv[1:] if arg.startswith("--")]
+    usage = "Wrong arguments: analyzer.py <container_file> [<input_file>] [--limit=<ticks>] [--bound=<word|pc>=<n>]..."
+    assert len(args) in (1, 2), usage
+    assert all(name in ("limit", "bound") for name, _ in options), usage
+    limit = int(dict(options).get("limit", 10000))
+    bounds = {}
+    for name, value in options:
+        if name == "bound":
+            key, bound = value.rsplit("=", 1)
+            bounds[key] = int(bound)
+    main(*args, limit=limit, bounds=bounds)
@@ -0,0 +1,176 @@
+"""Asyncio runtime for the machine model.
+
+The ControlUnit is driven in slices of `slice_ticks` ticks; between slices the
+event loop serves other machines. Input bytes from an async source are queued
+and delivered one at a time through `signal_set_intr`, at most one every
+`input_gap` ticks (the device rate). Output ports are flushed to an async sink
+and awaited with `drain()`, so a slow consumer stalls the machine instead of
+growing its buffers.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import sys
+
+from src.isa import from_bytes_to_data, from_bytes_to_instructions
+from src.machine import MACHINE_FAULTS, ControlUnit, DataPath, IOController
+from src.signals import ProcessorState
+
+
+class AsyncMachine:
+    def __init__(
+        self,
+        code,
+        data,
+        handler_addr,
+        source=None,
+        sink=None,
+        data_size=200,
+        slice_ticks=1000,
+        limit=None,
+        inbox_size=64,
+        input_gap=100,
+        output_ports=(1,),
+        eof_value=0,
+    ):
+        self.io_controller = IOController({0: list(), 1: list(), 2: list()})
+        self.data_path = DataPath(data, data_size, 25, self.io_controller)
+        self.control_unit = ControlUnit(code, self.data_path, 10, {}, handler_addr)
+        self.source = source
+        self.sink = sink
+        self.slice_ticks = slice_ticks
+        self.limit = limit
+        self.inbox: asyncio.Queue[int] = asyncio.Queue(inbox_size)
+        self.input_gap = input_gap
+        self.next_input_tick = 0
+        self.output_ports = output_ports
+        self.eof_value = eof_value
+        # kept only when there is no sink to stream into
+        self.output = []
+        self.fault = None
+        self.input_ready = asyncio.Event()  # set by pump_input when the inbox gets a byte or the source ends
+        self.input_closed = source is None
+
+    async def pump_input(self):
+        """Move bytes from the source to the inbox; blocks while the inbox is full."""
+        try:
+            while True:
+                chunk = await self.source.read(256)
+                if not chunk:
+                    if self.eof_value is not None:
+                        await self.inbox.put(self.eof_value)
+                    return
+                for byte in chunk:
+                    await self.inbox.put(byte)
+                    self.input_ready.set()
+        finally:
+            self.input_closed = True
+            self.input_ready.set()
+
+    def deliver_input(self):
+        cu = self.control_unit
+        if self.inbox.empty() or cu.current_tick() < self.next_input_tick:
+            return
+        if not cu.IF or cu.INTR or cu.state is not ProcessorState.NORMAL:
+            return
+        self.io_controller.push_input_buf(0, self.inbox.get_nowait())
+        cu.signal_set_intr()
+        self.next_input_tick = cu.current_tick() + self.input_gap
+
+    def starved(self):
+        """Stopped by `wait` with no input to deliver."""
+        cu = self.control_unit
+        return cu.waiting and not cu.INTR and self.inbox.empty()
+
+    def run_slice(self) -> bool:
+        cu = self.control_unit
+        end = cu.current_tick() + self.slice_ticks
+        if self.limit is not None:
+            end = min(end, self.limit)
+        try:
+            while cu.current_tick() < end:
+                self.deliver_input()
+                if self.starved():
+                    return False
+                # a waiting machine skips ahead to the next delivery it can get
+                cu.idle_limit = None if self.inbox.empty() else min(self.next_input_tick, end)
+                cu.decode_and_execute_instruction()
+        except StopIteration:
+            return True
+        except MACHINE_FAULTS as e:
+            # a faulty program ends its own session, not the whole server
+            self.fault = f"{type(e).__name__}: {e}"
+            return True
+        return False
+
+    async def flush_output(self):
+        text = ""
+        for port in self.output_ports:
+            text += "".join(self.io_controller.io_ports[port])
+            self.io_controller.io_ports[port].clear()
+        if not text:
+            return
+        if self.sink is None:
+            self.output.append(text)
+            return
+        self.sink.write(text.encode("utf-8"))
+        await self.sink.drain()
+
+    async def run(self):
+        """Run until `halt`, a machine fault, the tick limit or a `wait` no input can end; returns (output, ticks).
+
+        A machine stopped by `wait` with an empty inbox sleeps until pump_input delivers.
+
+        With a sink attached the output has been streamed into it and is not returned.
+        """
+        pump = asyncio.create_task(self.pump_input()) if self.source is not None else None
+        halted = False
+        try:
+            while not halted and (self.limit is None or self.control_unit.current_tick() < self.limit):
+                halted = self.run_slice()
+                await self.flush_output()
+                if not self.starved():
+                    await asyncio.sleep(0)
+                elif self.input_closed:
+                    break  # nothing is left to wake it
+                else:
+                    self.input_ready.clear()
+                    await self.input_ready.wait()
+        finally:
+            if pump is not None:
+                pump.cancel()
+        return "".join(self.output), self.control_unit.current_tick()
+
+
+async def open_subprocess(*cmd):
+    """Start `cmd` and return (source, sink) bound to its stdout and stdin."""
+    proc = await asyncio.create_subprocess_exec(*cmd, stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE)
+    return proc.stdout, proc.stdin
+
+
+async def serve_unix(path, code, data, handler_addr, **kwargs):
+    """Serve one fresh machine instance per connection on a Unix socket."""
+
+    async def handle(reader, writer):
+        try:
+            await AsyncMachine(code, data, handler_addr, reader, writer, **kwargs).run()
+        finally:
+            writer.close()
+            await writer.wait_closed()
+
+    return await asyncio.start_unix_server(handle, path=path)
+
+
+async def serve_forever(code_file, data_file, socket_path):
+    code, handler_addr = from_bytes_to_instructions(code_file)
+    data = from_bytes_to_data(data_file)
+    server = await serve_unix(socket_path, code, data, handler_addr)
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    assert len(sys.argv) == 4, "Wrong arguments: async_machine.py <instructions_file> <data_file> <socket_path>"
+    _, instructions_file, data_file, socket_path = sys.argv
+    asyncio.run(serve_forever(instructions_file, data_file, socket_path))
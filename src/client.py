@@ -0,0 +1,82 @@
+"""Thin client for src.server with the command lines of translator.py and machine.py:
+
+    client.py translator <input_file> <target_instructions_file> <target_data_file>
+    client.py machine <instructions_file> <data_file> <input_file> [<counters_prefix>]
+        [--fifo=<depth>:<threshold>:<timeout>] [--stack-cache=<words>:<chunk>:<cost>]
+
+The socket is taken from $CSA_SERVER_SOCKET (default /tmp/csa-server.sock).
+"""
+
+from __future__ import annotations
+
+import base64
+import json
+import os
+import socket
+import sys
+from pathlib import Path
+
+DEFAULT_SOCKET = "/tmp/csa-server.sock"
+
+
+def request(payload, socket_path=None):
+    socket_path = socket_path or os.environ.get("CSA_SERVER_SOCKET", DEFAULT_SOCKET)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        sock.sendall(json.dumps(payload).encode() + b"\n")
+        with sock.makefile("rb") as stream:
+            response = json.loads(stream.readline())
+    if not response["ok"]:
+        sys.exit(response["error"])
+    return response
+
+
+def translator(source, code_file, data_file, socket_path=None):
+    result = request({"op": "translate", "source": Path(source).read_text(encoding="utf-8")}, socket_path)
+    if code_file.endswith(".bin"):
+        for filename in (code_file, data_file):
+            os.makedirs(os.path.dirname(os.path.abspath(filename)) or ".", exist_ok=True)
+        Path(code_file).write_bytes(base64.b64decode(result["code"]))
+        Path(data_file).write_bytes(base64.b64decode(result["data"]))
+        Path(code_file + ".hex").write_text(result["code_hex"], encoding="utf-8")
+        Path(data_file + ".hex").write_text(result["data_hex"], encoding="utf-8")
+    print("source LoC:", result["loc"], "code instr:", result["instructions"])
+
+
+def machine(code_file, data_file, input_file, counters_prefix=None, fifo=None, stack_cache=None, socket_path=None):
+    result = request(
+        {
+            "op": "run",
+            "code": base64.b64encode(Path(code_file).read_bytes()).decode(),
+            "data": base64.b64encode(Path(data_file).read_bytes()).decode(),
+            "input": Path(input_file).read_text(),
+            "fifo": fifo,
+            "stack_cache": stack_cache,
+            "counters": counters_prefix is not None,
+        },
+        socket_path,
+    )
+    if counters_prefix is not None:
+        Path(counters_prefix + ".json").write_text(result["counters_json"], encoding="utf-8")
+        Path(counters_prefix + ".prom").write_text(result["counters_prom"], encoding="utf-8")
+    print(f"output_buffer:{result['output']}")
+    print("ticks:", result["ticks"])
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    options = dict(arg.removeprefix("--").partition("=")[::2] for arg in sys.argv[1:] if arg.startswith("--"))
+    usage = (
+        "Wrong arguments: client.py translator <input_file> <target_instructions_file> <target_data_file>"
+        " | client.py machine <instructions_file> <data_file> <input_file> [<counters_prefix>]"
+        " [--fifo=<depth>:<threshold>:<timeout>] [--stack-cache=<words>:<chunk>:<cost>]"
+    )
+    assert args[:1] in (["translator"], ["machine"]), usage
+    if args[0] == "translator":
+        assert len(args) == 4, usage
+        assert not options, usage
+        translator(*args[1:])
+    else:
+        assert len(args) in (4, 5), usage
+        assert set(options) <= {"fifo", "stack-cache"}, usage
+        machine(*args[1:], fifo=options.get("fifo"), stack_cache=options.get("stack-cache"))
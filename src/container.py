@@ -0,0 +1,173 @@
+"""Single-file executable container (.csa).
+
+Layout (big-endian):
+
+    header   magic "CSA1", version u16, flags u16, section count u16, reserved u16
+    table    per section: kind (4 ASCII chars), offset u32, stored size u32, size u32, CRC32 u32
+    crc      CRC32 of header and table
+    sections CODE (instructions_to_bytes image), DATA (data_to_bytes image),
+             SYMS (JSON symbol table), SMAP (JSON source map)
+
+With FLAG_COMPRESSED every section is stored zlib-compressed; the section CRC
+covers the stored bytes. The loader maps the file and decodes a section the
+first time it is asked for, so running a program never touches the symbol
+table or the source map and listings are only produced on request.
+
+    python -m src.container <file.csa> [code|data|symbols|source-map]
+"""
+
+from __future__ import annotations
+
+import json
+import mmap
+import os
+import struct
+import sys
+import zlib
+from functools import cached_property
+from pathlib import Path
+
+from src.isa import (
+    bytes_to_data,
+    bytes_to_instructions,
+    data_to_bytes,
+    hex_data,
+    hex_instructions,
+    instructions_to_bytes,
+)
+
+MAGIC = b"CSA1"
+VERSION = 1
+FLAG_COMPRESSED = 1
+FLAG_VERIFIED = 2  # stack effects checked by src.verifier, may run without run-time stack checks
+HEADER = struct.Struct(">4sHHHH")
+SECTION = struct.Struct(">4sIIII")
+CRC = struct.Struct(">I")
+CODE, DATA, SYMBOLS, SOURCE_MAP = b"CODE", b"DATA", b"SYMS", b"SMAP"
+
+
+def container_to_bytes(
+    instructions, data, intr, handler_addr, symbols=None, source_map=None, compress=False, verified=False
+) -> bytes:
+    sections = [
+        (CODE, instructions_to_bytes(instructions, intr, handler_addr)),
+        (DATA, data_to_bytes(data)),
+        (SYMBOLS, json.dumps(symbols or {}, sort_keys=True).encode()),
+        (SOURCE_MAP, json.dumps(source_map or []).encode()),
+    ]
+    flags = (FLAG_COMPRESSED if compress else 0) | (FLAG_VERIFIED if verified else 0)
+    header = HEADER.pack(MAGIC, VERSION, flags, len(sections), 0)
+    offset = HEADER.size + SECTION.size * len(sections) + CRC.size
+    table = b""
+    payload = b""
+    for kind, raw in sections:
+        stored = zlib.compress(raw, 9) if compress else raw
+        table += SECTION.pack(kind, offset, len(stored), len(raw), zlib.crc32(stored))
+        payload += stored
+        offset += len(stored)
+    return header + table + CRC.pack(zlib.crc32(header + table)) + payload
+
+
+def write_container(
+    filename, instructions, data, intr, handler_addr, symbols=None, source_map=None, compress=False, verified=False
+):
+    image = container_to_bytes(instructions, data, intr, handler_addr, symbols, source_map, compress, verified)
+    Path(filename).write_bytes(image)
+
+
+class Container:
+    """Lazily decoded view of a .csa file."""
+
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, "rb") as file:
+            # mmap cannot map an empty file
+            assert os.fstat(file.fileno()).st_size >= HEADER.size, f"{filename}: truncated container"
+            self.image = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self.read_header()
+        except BaseException:
+            self.image.close()
+            raise
+
+    def read_header(self):
+        filename = self.filename
+        magic, self.version, self.flags, count, _ = HEADER.unpack_from(self.image)
+        assert magic == MAGIC, f"{filename}: not a container"
+        assert self.version == VERSION, f"{filename}: unsupported container version {self.version}"
+        table_end = HEADER.size + SECTION.size * count
+        assert len(self.image) >= table_end + CRC.size, f"{filename}: truncated container"
+        (crc,) = CRC.unpack_from(self.image, table_end)
+        assert crc == zlib.crc32(self.image[:table_end]), f"{filename}: header checksum mismatch"
+        self.sections = {}
+        for i in range(count):
+            kind, offset, stored, size, crc = SECTION.unpack_from(self.image, HEADER.size + SECTION.size * i)
+            self.sections[kind] = (offset, stored, size, crc)
+
+    def section(self, kind) -> bytes:
+        assert kind in self.sections, f"{self.filename}: no {kind.decode()} section"
+        offset, stored, size, crc = self.sections[kind]
+        raw = self.image[offset : offset + stored]
+        assert len(raw) == stored, f"{self.filename}: truncated {kind.decode()} section"
+        assert zlib.crc32(raw) == crc, f"{self.filename}: {kind.decode()} section checksum mismatch"
+        if self.flags & FLAG_COMPRESSED:
+            raw = zlib.decompress(raw)
+        assert len(raw) == size, f"{self.filename}: {kind.decode()} section size mismatch"
+        return raw
+
+    @cached_property
+    def code(self):
+        """(instructions, handler_addr) as returned by bytes_to_instructions."""
+        return bytes_to_instructions(self.section(CODE))
+
+    @cached_property
+    def data(self):
+        return bytes_to_data(self.section(DATA))
+
+    @cached_property
+    def symbols(self):
+        return json.loads(self.section(SYMBOLS))
+
+    @cached_property
+    def source_map(self):
+        return json.loads(self.section(SOURCE_MAP))
+
+    @property
+    def verified(self):
+        return bool(self.flags & FLAG_VERIFIED)
+
+    def code_listing(self) -> str:
+        return hex_instructions({"index": i, **instr} for i, instr in enumerate(self.code[0]))
+
+    def data_listing(self) -> str:
+        return hex_data(self.data)
+
+    def close(self):
+        self.image.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main(filename, what="code"):
+    with Container(filename) as container:
+        if what == "code":
+            print(container.code_listing(), end="")
+        elif what == "data":
+            print(container.data_listing(), end="")
+        elif what == "symbols":
+            for name, symbol in sorted(container.symbols.items(), key=lambda item: item[1]["value"]):
+                print(f"{symbol['value']} {symbol['section']} {name}")
+        elif what == "source-map":
+            for entry in container.source_map:
+                print(f"{entry['start']}-{entry['end'] - 1} line {entry['line']} {entry['word']}")
+        else:
+            sys.exit(f"unknown section {what!r}")
+
+
+if __name__ == "__main__":
+    assert len(sys.argv) in (2, 3), "Wrong arguments: container.py <container_file> [code|data|symbols|source-map]"
+    main(*sys.argv[1:])
@@ -0,0 +1,286 @@
+"""Performance counters for the machine model.
+
+Counters are attached to a ControlUnit by wrapping its bound methods (and those
+of its DataPath) on the instance, so a machine without counters runs the plain
+class methods and pays nothing. Results are exported as JSON and in the
+Prometheus textfile format, at the end of `simulation()` and every
+`export_every` ticks during long runs.
+"""
+
+from __future__ import annotations
+
+import json
+from collections import Counter, deque
+from pathlib import Path
+
+from src.isa import program_digest
+from src.signals import ProcessorState, Signal
+
+SELECTOR_METHODS = ("latch_sp", "latch_tos", "latch_data_address", "latch_pc", "latch_scp", "latch_lsp")
+
+
+class PerfCounters:
+    def __init__(self, json_path=None, prom_path=None, export_every=None, prefix="csa"):
+        self.json_path = json_path
+        self.prom_path = prom_path
+        self.export_every = export_every
+        self.prefix = prefix
+        self.next_export = export_every
+        self.ticks = 0
+        self.program = None  # program_digest of the counted code
+        self.retired = Counter()  # opcode -> instructions
+        self.retired_pc = Counter()  # pc -> instructions
+        self.opcode_ticks = Counter()  # opcode -> ticks
+        self.step_ticks = Counter()  # (opcode, step) -> ticks
+        self.signals = Counter()  # Signal or signal_* method name -> assertions
+        self.memory_reads = Counter()  # address -> reads
+        self.memory_writes = Counter()  # address -> writes
+        self.data_stack_high_water = 0
+        self.call_stack_high_water = 0
+        self.loop_stack_high_water = 0
+        self.interrupts = 0
+        self.handler_ticks = 0
+        self.idle_ticks = 0  # waiting after WAIT
+        self.input_requests = deque()  # ticks of inputs that requested an interrupt not taken yet
+        self.input_latency = Counter()  # ticks from an input to the handler entry -> inputs
+        self.service_ticks = Counter()  # ticks from a handler entry to its iret -> interrupts
+        self.handler_entry = None
+        self.dropped_inputs = 0  # discarded: interrupts disabled or input FIFO full
+        self.nested_interrupts = 0  # entries while the handler was running (the return address is lost)
+
+    def attach(self, control_unit):
+        self.program = program_digest(control_unit.program)
+        data_path = control_unit.data_path
+        for owner in (data_path, control_unit):
+            for name in dir(type(owner)):
+                if name in SELECTOR_METHODS:
+                    self.wrap_selector(owner, name)
+                elif name.startswith("signal_"):
+                    self.wrap_signal(owner, name)
+
+        latch_tos = data_path.latch_tos
+        memory_store = data_path.signal_memory_store
+        latch_sp = data_path.latch_sp
+        latch_scp = control_unit.latch_scp
+        latch_lsp = control_unit.latch_lsp
+
+        def counted_latch_tos(sel):
+            if sel in (Signal.SEL_TOS_MEM, Signal.SEL_TOS_MEM_BYTE):
+                self.memory_reads[data_path.data_address] += 1
+            latch_tos(sel)
+
+        def counted_memory_store():
+            self.memory_writes[data_path.data_address] += 1
+            memory_store()
+
+        def counted_latch_sp(sel):
+            latch_sp(sel)
+            self.data_stack_high_water = max(self.data_stack_high_water, data_path.stack_pointer + 1)
+
+        def counted_latch_scp(sel):
+            latch_scp(sel)
+            self.call_stack_high_water = max(self.call_stack_high_water, control_unit.scp + 1)
+
+        def counted_latch_lsp(sel):
+            latch_lsp(sel)
+            self.loop_stack_high_water = max(self.loop_stack_high_water, control_unit.lsp + 1)
+
+        data_path.latch_tos = counted_latch_tos
+        data_path.signal_memory_store = counted_memory_store
+        data_path.latch_sp = counted_latch_sp
+        control_unit.latch_scp = counted_latch_scp
+        control_unit.latch_lsp = counted_latch_lsp
+        self.wrap_input_events(control_unit)
+        self.wrap_execute(control_unit)
+        return control_unit
+
+    def wrap_selector(self, owner, name):
+        method = getattr(owner, name)
+
+        def counted(sel):
+            self.signals[sel] += 1
+            method(sel)
+
+        setattr(owner, name, counted)
+
+    def wrap_signal(self, owner, name):
+        method = getattr(owner, name)
+
+        def counted(*args):
+            self.signals[name] += 1
+            return method(*args)
+
+        setattr(owner, name, counted)
+
+    def wrap_input_events(self, cu):
+        """Sort scheduled inputs into interrupt requests and dropped ones as check_interrupt_request consumes them."""
+        pending_input_events = cu.pending_input_events
+        fifo = cu.data_path.IO_Controller.fifo
+
+        def counted_pending_input_events():
+            for event in pending_input_events():
+                overflows = fifo.overflows if fifo is not None else 0
+                yield event  # delivered (or not) by the caller before the next one is asked for
+                tick, port, _ = event
+                if fifo is not None and port != 0:
+                    continue
+                if (fifo is None and not cu.IF) or (fifo is not None and fifo.overflows > overflows):
+                    self.dropped_inputs += 1
+                else:
+                    self.input_requests.append(tick)
+
+        cu.pending_input_events = counted_pending_input_events
+
+    def wrap_execute(self, cu):
+        execute = cu.decode_and_execute_instruction
+        fifo = cu.data_path.IO_Controller.fifo
+
+        def counted_execute():
+            pc, step, state, tick, waiting = cu.pc, cu.step, cu.state, cu.current_tick(), cu.waiting
+            entries = self.signals[Signal.SEL_PC_INT]
+            execute()
+            spent = cu.current_tick() - tick
+            self.ticks += spent
+            if self.signals[Signal.SEL_PC_INT] > entries:
+                self.nested_interrupts += state is ProcessorState.INTERRUPTION
+                self.handler_entry = tick
+                while self.input_requests:
+                    self.input_latency[tick - self.input_requests.popleft()] += 1
+            elif state is ProcessorState.INTERRUPTION and cu.state is ProcessorState.NORMAL:
+                self.service_ticks[cu.current_tick() - self.handler_entry] += 1
+                while fifo is not None and len(self.input_requests) > fifo.occupancy():
+                    self.input_requests.popleft()  # arrived while the handler ran and was read by it
+                    self.input_latency[0] += 1
+            if state is ProcessorState.NORMAL and cu.state is ProcessorState.INTERRUPTION:
+                self.interrupts += 1
+                self.handler_ticks += spent
+            elif waiting:
+                self.idle_ticks += spent
+            else:
+                opcode = cu.program[pc]["opcode"]
+                self.opcode_ticks[opcode] += spent
+                self.step_ticks[opcode, step] += spent
+                if cu.step == 0:
+                    self.retired[opcode] += 1
+                    self.retired_pc[pc] += 1
+                if state is ProcessorState.INTERRUPTION:
+                    self.handler_ticks += spent
+            if self.next_export is not None and self.ticks >= self.next_export:
+                self.next_export += self.export_every
+                self.export()
+
+        cu.decode_and_execute_instruction = counted_execute
+
+    def to_dict(self):
+        return {
+            "program": self.program,
+            "ticks": self.ticks,
+            "instructions": sum(self.retired.values()),
+            "retired": {opcode.value: n for opcode, n in self.retired.items()},
+            "retired_pc": {str(pc): n for pc, n in sorted(self.retired_pc.items())},
+            "opcode_ticks": {opcode.value: n for opcode, n in self.opcode_ticks.items()},
+            "step_ticks": {f"{opcode.value}/{step}": n for (opcode, step), n in self.step_ticks.items()},
+            "signals": {signal_name(signal): n for signal, n in self.signals.items()},
+            "memory_reads": {str(addr): n for addr, n in sorted(self.memory_reads.items())},
+            "memory_writes": {str(addr): n for addr, n in sorted(self.memory_writes.items())},
+            "data_stack_high_water": self.data_stack_high_water,
+            "call_stack_high_water": self.call_stack_high_water,
+            "loop_stack_high_water": self.loop_stack_high_water,
+            "interrupts": self.interrupts,
+            "interrupt_handler_ticks": self.handler_ticks,
+            "idle_ticks": self.idle_ticks,
+            "input_latency": {str(ticks): n for ticks, n in sorted(self.input_latency.items())},
+            "interrupt_service_ticks": {str(ticks): n for ticks, n in sorted(self.service_ticks.items())},
+            "dropped_inputs": self.dropped_inputs,
+            "unserved_inputs": len(self.input_requests),
+            "nested_interrupts": self.nested_interrupts,
+        }
+
+    def to_prometheus(self):
+        p = self.prefix
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {p}_{name} {help_text}")
+            lines.append(f"# TYPE {p}_{name} {kind}")
+            for labels, value in samples:
+                label_text = ",".join(f'{key}="{val}"' for key, val in labels.items())
+                lines.append(f"{p}_{name}{{{label_text}}} {value}" if label_text else f"{p}_{name} {value}")
+
+        metric("ticks_total", "counter", "Simulated ticks.", [({}, self.ticks)])
+        metric(
+            "instructions_retired_total",
+            "counter",
+            "Instructions retired per opcode.",
+            [({"opcode": op.value}, n) for op, n in self.retired.items()],
+        )
+        metric(
+            "opcode_ticks_total",
+            "counter",
+            "Ticks spent per opcode and step.",
+            [({"opcode": op.value, "step": step}, n) for (op, step), n in self.step_ticks.items()],
+        )
+        metric(
+            "signal_asserted_total",
+            "counter",
+            "Control signal assertions.",
+            [({"signal": signal_name(signal)}, n) for signal, n in self.signals.items()],
+        )
+        metric(
+            "memory_reads_total",
+            "counter",
+            "Data memory reads per address.",
+            [({"address": addr}, n) for addr, n in sorted(self.memory_reads.items())],
+        )
+        metric(
+            "memory_writes_total",
+            "counter",
+            "Data memory writes per address.",
+            [({"address": addr}, n) for addr, n in sorted(self.memory_writes.items())],
+        )
+        metric("data_stack_high_water", "gauge", "Deepest data stack.", [({}, self.data_stack_high_water)])
+        metric("call_stack_high_water", "gauge", "Deepest call stack.", [({}, self.call_stack_high_water)])
+        metric("loop_stack_high_water", "gauge", "Deepest loop stack.", [({}, self.loop_stack_high_water)])
+        metric("interrupts_total", "counter", "Interrupts taken.", [({}, self.interrupts)])
+        metric("interrupt_handler_ticks_total", "counter", "Ticks spent in the handler.", [({}, self.handler_ticks)])
+        metric("idle_ticks_total", "counter", "Ticks spent waiting for an interrupt.", [({}, self.idle_ticks)])
+        metric(
+            "input_latency_ticks_max",
+            "gauge",
+            "Longest wait of an input for the handler entry.",
+            [({}, max(self.input_latency, default=0))],
+        )
+        metric(
+            "interrupt_service_ticks_max",
+            "gauge",
+            "Longest handler run from entry to iret.",
+            [({}, max(self.service_ticks, default=0))],
+        )
+        metric("inputs_dropped_total", "counter", "Inputs discarded by the machine.", [({}, self.dropped_inputs)])
+        metric(
+            "nested_interrupts_total",
+            "counter",
+            "Handler entries while it was running.",
+            [({}, self.nested_interrupts)],
+        )
+        return "\n".join(lines) + "\n"
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=2) + "\n"
+
+    def export(self):
+        if self.json_path is not None:
+            write_atomic(self.json_path, self.to_json())
+        if self.prom_path is not None:
+            write_atomic(self.prom_path, self.to_prometheus())
+
+
+def signal_name(signal):
+    return signal.name.lower() if isinstance(signal, Signal) else signal
+
+
+def write_atomic(filename, text):
+    # textfile collectors may read at any moment, so never expose a partial file
+    tmp = Path(f"{filename}.tmp")
+    tmp.write_text(text, encoding="utf-8")
+    tmp.replace(filename)
@@ -0,0 +1,380 @@
+"""Breakpoints and watchpoints for the processor model.
+
+A Debugger drives a ControlUnit itself instead of simulation(). Nothing is
+checked per tick unless it has to be:
+
+- memory and stack-depth watchpoints wrap `signal_memory_store`/`latch_sp` of
+  the instance (like PerfCounters) and are only installed while armed;
+- tick stops and trace windows split the run limit, so the plain loop runs
+  up to them and DEBUG tracing is on only inside the window;
+- only PC/word breakpoints need the instrumented loop, which checks the PC at
+  every instruction boundary, and it is used only while one is set.
+
+A hit arms a one-shot trap that stops the run before the next step, so a step
+is never interrupted halfway.
+
+    python -m src.debugger <container_file> <input_file>
+    python -m src.debugger <instructions_file> <data_file> <input_file>
+"""
+
+from __future__ import annotations
+
+import cmd
+import logging
+import sys
+
+from src.container import Container
+from src.isa import from_bytes_to_data, from_bytes_to_instructions, instruction_to_mnemonic
+from src.machine import build_control_unit, read_input_schedule
+
+
+def restore(owner, name, previous):
+    """Put back an instance attribute saved with vars(owner).get(name); None falls back to the class method."""
+    if previous is None:
+        vars(owner).pop(name, None)
+    else:
+        setattr(owner, name, previous)
+
+
+class DebugStopError(Exception):
+    def __init__(self, reason, tick, pc):
+        super().__init__(f"{reason} at tick {tick}, pc {pc}")
+        self.reason = reason
+        self.tick = tick
+        self.pc = pc
+
+
+class Debugger:
+    def __init__(self, control_unit, symbols=None, source_map=None):
+        self.control_unit = control_unit
+        self.symbols = symbols or {}
+        self.source_map = source_map or []
+        self.breakpoints = set()
+        self.memory_watches = set()
+        self.depth_limit = None
+        self.tick_stops = set()
+        self.trace_window = None
+        self.trap_reasons = []
+        self.resume_pc = None  # breakpoint just reported, skipped once on resume
+        self.finished = None
+        self.installed = {}  # wrapped method name -> (owner, previous instance attribute)
+
+    def address(self, target, section):
+        if isinstance(target, int) or target.lstrip("-").isdigit():
+            return int(target)
+        assert target in self.symbols, f"unknown symbol {target}"
+        assert self.symbols[target]["section"] == section, f"{target} is not in the {section} section"
+        return self.symbols[target]["value"]
+
+    # --- arming
+
+    def break_at(self, target):
+        self.breakpoints.add(self.address(target, "code"))
+
+    def clear_break(self, target):
+        self.breakpoints.discard(self.address(target, "code"))
+
+    def watch(self, target):
+        self.memory_watches.add(self.address(target, "data"))
+        self.install_memory_watch()
+
+    def unwatch(self, target):
+        self.memory_watches.discard(self.address(target, "data"))
+        if not self.memory_watches:
+            self.uninstall("signal_memory_store")
+
+    def watch_depth(self, depth):
+        """Stop when the data stack holds `depth` entries or more (None disarms)."""
+        self.depth_limit = depth
+        if depth is None:
+            self.uninstall("latch_sp")
+        else:
+            self.install_depth_watch()
+
+    def stop_at_tick(self, tick):
+        self.tick_stops.add(tick)
+
+    def trace(self, start, end):
+        """Log every step with tick in [start, end) at DEBUG level, as simulation() does for the whole run."""
+        self.trace_window = (start, end)
+
+    # --- hooks
+
+    def stop(self, reason):
+        cu = self.control_unit
+        raise DebugStopError(reason, cu.current_tick(), cu.pc)
+
+    def arm_trap(self, reason):
+        self.trap_reasons.append(reason)
+        cu = self.control_unit
+        if len(self.trap_reasons) > 1:
+            return
+        wrapped = vars(cu).get("decode_and_execute_instruction")  # e.g. PerfCounters
+
+        def trap():
+            restore(cu, "decode_and_execute_instruction", wrapped)
+            reasons, self.trap_reasons = self.trap_reasons, []
+            self.stop("; ".join(reasons))
+
+        cu.decode_and_execute_instruction = trap
+
+    def install(self, owner, name, make_hook):
+        """Wrap a method of `owner` for as long as a watch needs it; the plain method is restored on uninstall."""
+        if name in self.installed:
+            return
+        self.installed[name] = owner, vars(owner).get(name)
+        setattr(owner, name, make_hook(getattr(owner, name)))
+
+    def uninstall(self, name):
+        if name in self.installed:
+            owner, previous = self.installed.pop(name)
+            restore(owner, name, previous)
+
+    def install_memory_watch(self):
+        data_path = self.control_unit.data_path
+
+        def make_hook(memory_store):
+            def watched_memory_store():
+                addr = data_path.data_address
+                old = data_path.data_memory[addr]
+                memory_store()
+                if addr in self.memory_watches:
+                    self.arm_trap(f"write {addr}: {old} -> {data_path.data_memory[addr]}")
+
+            return watched_memory_store
+
+        self.install(data_path, "signal_memory_store", make_hook)
+
+    def install_depth_watch(self):
+        data_path = self.control_unit.data_path
+
+        def make_hook(latch_sp):
+            def watched_latch_sp(sel):
+                latch_sp(sel)
+                if data_path.stack_pointer + 1 >= self.depth_limit:
+                    self.arm_trap(f"stack depth {data_path.stack_pointer + 1}")
+
+            return watched_latch_sp
+
+        self.install(data_path, "latch_sp", make_hook)
+
+    # --- running
+
+    def run(self, limit=10000):
+        """Run until a stop, HALT, end of input or `limit` ticks; return the DebugStopError or None."""
+        cu = self.control_unit
+        if self.finished is not None:
+            return None
+        try:
+            while cu.current_tick() < limit:
+                due = {tick for tick in self.tick_stops if tick <= cu.current_tick()}
+                if due:
+                    self.tick_stops -= due
+                    self.stop("tick")
+                until = min([limit, *self.tick_stops])
+                tracing = False
+                if self.trace_window is not None:
+                    start, end = self.trace_window
+                    if cu.current_tick() < start:
+                        until = min(until, start)
+                    elif cu.current_tick() < end:
+                        until = min(until, end)
+                        tracing = True
+                cu.idle_limit = until
+                if self.breakpoints or tracing:
+                    self.run_instrumented(until, tracing)
+                else:
+                    while cu.current_tick() < until:
+                        cu.decode_and_execute_instruction()
+        except DebugStopError as stop:
+            self.resume_pc = cu.pc if cu.step == 0 else None
+            return stop
+        except StopIteration:
+            self.finished = "halt"
+        except EOFError:
+            logging.warning("Input buffer is empty!")
+            self.finished = "input"
+        return None
+
+    def run_instrumented(self, until, tracing):
+        cu = self.control_unit
+        breakpoints = self.breakpoints
+        while cu.current_tick() < until:
+            if cu.step == 0 and not cu.waiting and cu.pc in breakpoints and cu.pc != self.resume_pc:
+                self.stop("breakpoint")
+            self.resume_pc = None
+            cu.decode_and_execute_instruction()
+            if tracing:
+                logging.debug("%s", cu)
+
+    def stepi(self):
+        """Execute one instruction (all its steps); return the DebugStopError of a watch hit, if any."""
+        cu = self.control_unit
+        if self.finished is not None:
+            return None
+        self.resume_pc = None
+        try:
+            cu.decode_and_execute_instruction()
+            while cu.step != 0:
+                cu.decode_and_execute_instruction()
+            if self.trap_reasons:
+                cu.decode_and_execute_instruction()  # fires the trap before anything executes
+        except DebugStopError as stop:
+            self.resume_pc = cu.pc
+            return stop
+        except StopIteration:
+            self.finished = "halt"
+        except EOFError:
+            self.finished = "input"
+        return None
+
+    # --- inspection
+
+    def word_at(self, pc):
+        for entry in self.source_map:
+            if entry["start"] <= pc < entry["end"]:
+                return entry["word"]
+        return None
+
+    def where(self):
+        cu = self.control_unit
+        word = self.word_at(cu.pc)
+        instr = cu.program[cu.pc]
+        location = f"pc {cu.pc}" + (f" in {word}" if word else "")
+        return f"tick {cu.current_tick()} {location}: {instruction_to_mnemonic(instr)}"
+
+    def state(self):
+        cu = self.control_unit
+        data_path = cu.data_path
+        return {
+            "tick": cu.current_tick(),
+            "pc": cu.pc,
+            "step": cu.step,
+            "word": self.word_at(cu.pc),
+            "state": cu.state.name,
+            "interrupts_enabled": cu.IF,
+            "tos": data_path.tos,
+            "stack": data_path.stack[: data_path.stack_pointer + 1],
+            "call_stack": cu.call_stack[: cu.scp + 1],
+            "flags": dict(data_path.flags),
+            "output": "".join(data_path.IO_Controller.io_ports[1]),
+        }
+
+    def memory(self, target, count=1):
+        addr = self.address(target, "data")
+        return self.control_unit.data_path.data_memory[addr : addr + count]
+
+
+class DebuggerShell(cmd.Cmd):
+    intro = "Type help or ? to list commands."
+    prompt = "(csa) "
+
+    def __init__(self, debugger, limit=10000):
+        super().__init__()
+        self.debugger = debugger
+        self.limit = limit
+
+    def report(self, stop):
+        if stop is not None:
+            print(f"stopped: {stop.reason}")
+        elif self.debugger.finished is not None:
+            print(f"finished ({self.debugger.finished})")
+        else:
+            print("limit reached")
+        print(self.debugger.where())
+
+    def onecmd(self, line):
+        try:
+            return super().onecmd(line)
+        except (AssertionError, ValueError) as e:
+            print(f"error: {e}")
+            return False
+
+    def do_break(self, arg):
+        """break <pc|word>: stop before the instruction is executed"""
+        self.debugger.break_at(arg)
+
+    def do_delete(self, arg):
+        """delete <pc|word>: remove a breakpoint"""
+        self.debugger.clear_break(arg)
+
+    def do_watch(self, arg):
+        """watch <addr|var>: stop after a write to data memory"""
+        self.debugger.watch(arg)
+
+    def do_unwatch(self, arg):
+        """unwatch <addr|var>: remove a watchpoint"""
+        self.debugger.unwatch(arg)
+
+    def do_depth(self, arg):
+        """depth <n>|off: stop when the data stack holds n entries"""
+        self.debugger.watch_depth(None if arg == "off" else int(arg))
+
+    def do_until(self, arg):
+        """until <tick>: stop when the tick counter reaches the value"""
+        self.debugger.stop_at_tick(int(arg))
+
+    def do_trace(self, arg):
+        """trace <start> <end>: log every step in the tick range"""
+        start, end = map(int, arg.split())
+        logging.getLogger().setLevel(logging.DEBUG)
+        self.debugger.trace(start, end)
+
+    def do_continue(self, arg):
+        """continue: run to the next stop"""
+        self.report(self.debugger.run(self.limit))
+
+    do_c = do_continue
+
+    def do_stepi(self, arg):
+        """stepi: execute one instruction"""
+        self.report(self.debugger.stepi())
+
+    do_si = do_stepi
+
+    def do_info(self, arg):
+        """info: show registers, stacks and output"""
+        for key, value in self.debugger.state().items():
+            print(f"{key}: {value}")
+
+    def do_x(self, arg):
+        """x <addr|var> [count]: show data memory"""
+        target, *count = arg.split()
+        print(self.debugger.memory(target, int(count[0]) if count else 1))
+
+    def do_where(self, arg):
+        """where: show the current instruction"""
+        print(self.debugger.where())
+
+    def do_quit(self, arg):
+        """quit: leave the debugger"""
+        return True
+
+    def default(self, line):
+        if line == "EOF":
+            print()
+            return True
+        return super().default(line)
+
+
+def main(*args):
+    if len(args) == 2:
+        container_file, input_file = args
+        with Container(container_file) as container:
+            (code, handler_addr), data = container.code, container.data
+            symbols, source_map = container.symbols, container.source_map
+    else:
+        code_file, data_file, input_file = args
+        code, handler_addr = from_bytes_to_instructions(code_file)
+        data, symbols, source_map = from_bytes_to_data(data_file), {}, []
+    logging.basicConfig(format="%(message)s")
+    control_unit = build_control_unit(code, data, 200, handler_addr, read_input_schedule(input_file))
+    DebuggerShell(Debugger(control_unit, symbols, source_map)).cmdloop()
+
+
+if __name__ == "__main__":
+    assert len(sys.argv) in (3, 4), (
+        "Wrong arguments: debugger.py <container_file> <input_file>"
+        " | debugger.py <instructions_file> <data_file> <input_file>"
+    )
+    main(*sys.argv[1:])
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import hashlib
 from enum import Enum
 
 
@@ -33,6 +34,25 @@ class Opcode(str, Enum):
     EINT = "eint"
     DINT = "dint"
     HALT = "halt"
+    BEQ = "beq"
+    BNE = "bne"
+    BLT = "blt"
+    BGE = "bge"
+    LOAD_ABS = "load_abs"
+    STORE_ABS = "store_abs"
+    DO = "do"
+    LOOP = "loop"
+    INDEX = "index"
+    OUTS = "outs"
+    OUTB = "outb"
+    SHL = "shl"
+    SHR = "shr"
+    SAR = "sar"
+    ROL = "rol"
+    ROR = "ror"
+    WAIT = "wait"
+    LOADB = "loadb"
+    OUTPS = "outps"
 
     def __str__(self):
         return str(self.value)
@@ -68,6 +88,25 @@ opcode_to_binary = {
     Opcode.DINT: 0x1B,
     Opcode.HALT: 0x1C,
     Opcode.NOP: 0x1D,
+    Opcode.BEQ: 0x1E,
+    Opcode.BNE: 0x1F,
+    Opcode.BLT: 0x20,
+    Opcode.BGE: 0x21,
+    Opcode.LOAD_ABS: 0x22,
+    Opcode.STORE_ABS: 0x23,
+    Opcode.DO: 0x24,
+    Opcode.LOOP: 0x25,
+    Opcode.INDEX: 0x26,
+    Opcode.OUTS: 0x27,
+    Opcode.OUTB: 0x28,
+    Opcode.SHL: 0x29,
+    Opcode.SHR: 0x2A,
+    Opcode.SAR: 0x2B,
+    Opcode.ROL: 0x2C,
+    Opcode.ROR: 0x2D,
+    Opcode.WAIT: 0x2E,
+    Opcode.LOADB: 0x2F,
+    Opcode.OUTPS: 0x30,
 }
 binary_to_opcode = {
     0x01: Opcode.LIT,
@@ -99,27 +138,103 @@ binary_to_opcode = {
     0x1B: Opcode.DINT,
     0x1C: Opcode.HALT,
     0x1D: Opcode.NOP,
+    0x1E: Opcode.BEQ,
+    0x1F: Opcode.BNE,
+    0x20: Opcode.BLT,
+    0x21: Opcode.BGE,
+    0x22: Opcode.LOAD_ABS,
+    0x23: Opcode.STORE_ABS,
+    0x24: Opcode.DO,
+    0x25: Opcode.LOOP,
+    0x26: Opcode.INDEX,
+    0x27: Opcode.OUTS,
+    0x28: Opcode.OUTB,
+    0x29: Opcode.SHL,
+    0x2A: Opcode.SHR,
+    0x2B: Opcode.SAR,
+    0x2C: Opcode.ROL,
+    0x2D: Opcode.ROR,
+    0x2E: Opcode.WAIT,
+    0x2F: Opcode.LOADB,
+    0x30: Opcode.OUTPS,
 }
 
+# Opcodes whose 26-bit argument field is meaningful.
+ARG_OPCODES = (
+    Opcode.LIT,
+    Opcode.IN,
+    Opcode.OUT,
+    Opcode.BEQ,
+    Opcode.BNE,
+    Opcode.BLT,
+    Opcode.BGE,
+    Opcode.LOAD_ABS,
+    Opcode.STORE_ABS,
+    Opcode.DO,
+    Opcode.LOOP,
+    Opcode.OUTS,
+    Opcode.OUTB,
+    Opcode.OUTPS,
+)
+BRANCH_OPCODES = (Opcode.BEQ, Opcode.BNE, Opcode.BLT, Opcode.BGE)
+INPUT_STATUS_PORT = 1  # `in 1` reads the number of words waiting on the input device
+# Opcodes whose argument is an I/O port number rather than an address.
+PORT_OPCODES = (Opcode.IN, Opcode.OUT, Opcode.OUTS, Opcode.OUTB, Opcode.OUTPS)
+
+
+def pack_string(codes) -> list[int]:
+    """Character codes packed 4 per word, low byte first, with a zero byte at the end.
+
+    >>> [hex(word) for word in pack_string(b"hello")]
+    ['0x6c6c6568', '0x6f']
+    >>> pack_string(b"abc\\xff")
+    [-10263967, 0]
+    """
+    codes = [*codes, 0]
+    codes += [0] * (-len(codes) % 4)
+    words = []
+    for i in range(0, len(codes), 4):
+        word = codes[i] | codes[i + 1] << 8 | codes[i + 2] << 16 | codes[i + 3] << 24
+        words.append(word - (1 << 32) if word & (1 << 31) else word)
+    return words
+
+
+def unpack_string(memory, byte_address) -> tuple[list[int], int]:
+    """Character codes of the packed string at `byte_address` and the number of words it spans.
+
+    >>> unpack_string(pack_string(b"hello"), 2)
+    ([108, 108, 111], 2)
+    """
+    addr, shift = divmod(byte_address, 4)
+    start = addr
+    codes = []
+    while True:
+        assert 0 <= addr < len(memory), "string output without terminator"
+        code = (memory[addr] >> 8 * shift) & 0xFF
+        if code == 0:
+            return codes, addr - start + 1
+        codes.append(code)
+        addr, shift = (addr + 1, 0) if shift == 3 else (addr, shift + 1)
+
 
 def instr_to_bytes(instr):
-    binary_instr = 0
-    if instr.get("opcode") in (Opcode.LIT, Opcode.OUT, Opcode.IN):
+    opcode = instr.get("opcode")
+    binary_instr = (opcode_to_binary[opcode] & 0x3F) << 26
+    if opcode in ARG_OPCODES:
         arg = instr.get("arg", 0)
         assert -(1 << 25) <= arg < (1 << 25), "arg out of 26-bit signed range"
-        arg &= (1 << 26) - 1
-        if instr.get("opcode") == Opcode.LIT:
-            binary_instr = (opcode_to_binary[Opcode.LIT] << 26) | arg
-        if instr.get("opcode") == Opcode.IN:
-            binary_instr = (opcode_to_binary[Opcode.IN] << 26) | arg
-        if instr.get("opcode") == Opcode.OUT:
-            binary_instr = (opcode_to_binary[Opcode.OUT] << 26) | arg
-    else:
-        opcode = opcode_to_binary[instr.get("opcode")] & 0x3F
-        binary_instr = opcode << 26
+        binary_instr |= arg & ((1 << 26) - 1)
     return binary_instr
 
 
+def program_digest(instructions: list[dict]) -> str:
+    """SHA-256 of the machine code, identifying the program a profile was recorded for."""
+    digest = hashlib.sha256()
+    for instr in instructions:
+        digest.update(instr_to_bytes(instr).to_bytes(4, "big"))
+    return digest.hexdigest()
+
+
 def instructions_to_bytes(instructions: list[dict], intr, handler_addr) -> bytes:
     binary_bytes = bytearray()
     if intr and handler_addr is not None:
@@ -153,30 +268,26 @@ def write_data(filename, data):
         file.write(data_to_bytes(data))
 
 
+def bytes_to_instructions(binary_bytes: bytes):
+    instructions = []
+    handler_addr = (binary_bytes[0] << 24) | (binary_bytes[1] << 16) | (binary_bytes[2] << 8) | binary_bytes[3]
+    for i in range(4, len(binary_bytes), 4):
+        word = (binary_bytes[i] << 24) | (binary_bytes[i + 1] << 16) | (binary_bytes[i + 2] << 8) | binary_bytes[i + 3]
+        opcode_val = (word >> 26) & 0x3F
+        opcode = binary_to_opcode.get(opcode_val, opcode_val)
+        if opcode in ARG_OPCODES:
+            arg = word & 0x3FFFFFF
+            if arg & (1 << 25):
+                arg -= 1 << 26
+            instructions.append({"opcode": opcode, "arg": arg})
+        else:
+            instructions.append({"opcode": opcode})
+    return instructions, handler_addr
+
+
 def from_bytes_to_instructions(filename):
     with open(filename, "rb") as file:
-        binary_bytes = file.read()
-        instructions = []
-        handler_addr = (binary_bytes[0] << 24) | (binary_bytes[1] << 16) | (binary_bytes[2] << 8) | binary_bytes[3]
-        for i in range(4, len(binary_bytes), 4):
-            word = (
-                (binary_bytes[i] << 24) | (binary_bytes[i + 1] << 16) | (binary_bytes[i + 2] << 8) | binary_bytes[i + 3]
-            )
-            opcode_val = (word >> 26) & 0x3F
-            opcode = binary_to_opcode.get(opcode_val, opcode_val)
-            if opcode in (Opcode.LIT, Opcode.OUT, Opcode.IN):
-                arg = word & 0x3FFFFFF
-                if arg & (1 << 25):
-                    arg -= 1 << 26
-                if opcode == Opcode.LIT:
-                    instructions.append({"opcode": Opcode.LIT, "arg": arg})
-                if opcode == Opcode.IN:
-                    instructions.append({"opcode": Opcode.IN, "arg": arg})
-                if opcode == Opcode.OUT:
-                    instructions.append({"opcode": Opcode.OUT, "arg": arg})
-            else:
-                instructions.append({"opcode": opcode})
-    return instructions, handler_addr
+        return bytes_to_instructions(file.read())
 
 
 def bytes_to_int(byte_arr: bytes) -> int:
@@ -186,33 +297,26 @@ def bytes_to_int(byte_arr: bytes) -> int:
     return word
 
 
+def bytes_to_data(bytes_array: bytes) -> list[int]:
+    return [bytes_to_int(bytes_array[i : i + 4]) for i in range(0, len(bytes_array), 4)]
+
+
 def from_bytes_to_data(filename):
     with open(filename, "rb") as file:
-        bytes_array = file.read()
-        data = []
-        for i in range(0, len(bytes_array), 4):
-            word = bytes_to_int(bytes_array[i : i + 4])
-            data.append(word)
-    return data
+        return bytes_to_data(file.read())
+
+
+def hex_data(data, start_addr=0) -> str:
+    return "".join(f"{i} - {value & 0xFFFFFFFF:08X}\n" for i, value in enumerate(data, start=start_addr))
 
 
 def write_hex_data(filename, data, start_addr=0):
     with open(filename, "w", encoding="utf-8") as f:
-        for i, value in enumerate(data, start=start_addr):
-            hex_str = f"{value & 0xFFFFFFFF:08X}"
-            f.write(f"{i} - {hex_str}\n")
+        f.write(hex_data(data, start_addr))
 
 
 def instruction_to_hex(instr) -> str:
-    if instr["opcode"] in (Opcode.LIT, Opcode.OUT, Opcode.IN):
-        arg = instr.get("arg", 0)
-        arg &= (1 << 26) - 1
-        opcode = opcode_to_binary[instr["opcode"]]
-        machine_code = (opcode << 26) | arg
-    else:
-        opcode = opcode_to_binary[instr["opcode"]]
-        machine_code = opcode << 26
-    return f"{machine_code:08X}"
+    return f"{instr_to_bytes(instr):08X}"
 
 
 def instruction_to_mnemonic(instr) -> str:
@@ -222,10 +326,12 @@ def instruction_to_mnemonic(instr) -> str:
     return name
 
 
+def hex_instructions(instructions) -> str:
+    return "".join(
+        f"{instr['index']} - {instruction_to_hex(instr)} - {instruction_to_mnemonic(instr)}\n" for instr in instructions
+    )
+
+
 def write_hex_instructions(filename, instructions):
     with open(filename, "w", encoding="utf-8") as f:
-        for instr in instructions:
-            hexcode = instruction_to_hex(instr)
-            mnemonic = instruction_to_mnemonic(instr)
-            address = instr["index"]
-            f.write(f"{address} - {hexcode} - {mnemonic}\n")
+        f.write(hex_instructions(instructions))
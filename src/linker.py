@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import json
+import os
+import sys
+from pathlib import Path
+
+from src.isa import (
+    Opcode,
+    write_data,
+    write_hex_data,
+    write_hex_instructions,
+    write_instructions,
+)
+from src.translator import OBJECT_FORMAT, OBJECT_VERSION, main_object
+
+INTERRUPT_LABEL = "interrupt_handler"
+
+
+def read_object(filename) -> dict:
+    with open(filename, encoding="utf-8") as file:
+        obj = json.load(file)
+    if obj.get("format") != OBJECT_FORMAT or obj.get("version") != OBJECT_VERSION:
+        sys.exit(f"{filename}: not a csa object file (version {OBJECT_VERSION})")
+    return obj
+
+
+def ensure_object(source: str) -> str:
+    """Return an object file for `source`, translating it only if it changed.
+
+    Object files are passed through; a Forth source `x.fs` is compiled to `x.o`
+    next to it unless that object is already newer than the source.
+    """
+    if not source.endswith(".fs"):
+        return source
+    object_file = Path(source).with_suffix(".o")
+    if not object_file.exists() or object_file.stat().st_mtime < Path(source).stat().st_mtime:
+        main_object(source, str(object_file))
+    return str(object_file)
+
+
+def layout(objects: list[dict]) -> list[dict[str, int]]:
+    bases = []
+    code_base, data_base = 0, 0
+    for obj in objects:
+        bases.append({"code": code_base, "data": data_base})
+        code_base += len(obj["code"])
+        data_base += len(obj["data"])
+    return bases
+
+
+def global_symbols(objects: list[dict], bases: list[dict[str, int]]) -> dict[str, tuple[str, int]]:
+    symbols: dict[str, tuple[str, int]] = {}
+    for obj, base in zip(objects, bases):
+        for name, sym in obj["symbols"].items():
+            if name in symbols:
+                sys.exit(f"duplicate symbol {name}")
+            symbols[name] = (sym["section"], base[sym["section"]] * sym.get("scale", 1) + sym["value"])
+    return symbols
+
+
+def relocate(obj: dict, base: dict[str, int], symbols: dict[str, tuple[str, int]]) -> list[dict]:
+    code = []
+    for entry in obj["code"]:
+        instr = {"opcode": Opcode(entry["opcode"])}
+        if "arg" in entry:
+            instr["arg"] = entry["arg"]
+        code.append(instr)
+    for reloc in obj["relocations"]:
+        instr = code[reloc["offset"]]
+        if "symbol" in reloc:
+            if reloc["symbol"] not in symbols:
+                sys.exit(f" undefined symbol '{reloc['symbol']}'")
+            if f"&{reloc['symbol']}" in symbols:
+                sys.exit(f"pstr {reloc['symbol']} is byte-addressed, import it with extern pstr")
+            instr["arg"] = symbols[reloc["symbol"]][1]
+        else:
+            instr["arg"] += base[reloc["section"]] * reloc.get("scale", 1)
+    return code
+
+
+def check_interrupt_handler(instructions, symbols, intr_enabled) -> int | None:
+    if not intr_enabled:
+        return None
+    if INTERRUPT_LABEL not in symbols:
+        sys.exit("EINT встречается, но метка interrupt_handler не объявлена")
+    start = symbols[INTERRUPT_LABEL][1]
+    code_addresses = (addr for section, addr in symbols.values() if section == "code")
+    end = min((addr for addr in code_addresses if addr > start), default=len(instructions))
+    if not any(instr["opcode"] == Opcode.IRET for instr in instructions[start:end]):
+        sys.exit("Обработчик прерывания не завершается IRET")
+    return start
+
+
+def link(objects: list[dict]):
+    """Combine objects into one program; the first object holds the entry point."""
+    bases = layout(objects)
+    symbols = global_symbols(objects, bases)
+    instructions = []
+    data_words = []
+    for obj, base in zip(objects, bases):
+        instructions.extend(relocate(obj, base, symbols))
+        data_words.extend(obj["data"])
+    for pc, instr in enumerate(instructions):
+        instr["index"] = pc
+    intr_enabled = any(obj["interrupts"] for obj in objects)
+    handler_addr = check_interrupt_handler(instructions, symbols, intr_enabled)
+    return instructions, data_words, intr_enabled, handler_addr
+
+
+def main(code_file, data_file, inputs):
+    objects = [read_object(ensure_object(name)) for name in inputs]
+    instructions, data_words, intr, addr_handler = link(objects)
+
+    os.makedirs(os.path.dirname(os.path.abspath(code_file)) or ".", exist_ok=True)
+    os.makedirs(os.path.dirname(os.path.abspath(data_file)) or ".", exist_ok=True)
+
+    write_instructions(code_file, instructions, intr, addr_handler)
+    write_data(data_file, data_words)
+    write_hex_instructions(code_file + ".hex", instructions)
+    write_hex_data(data_file + ".hex", data_words)
+    print("objects:", len(objects), "code instr:", len(instructions))
+
+
+if __name__ == "__main__":
+    assert len(sys.argv) >= 4, (
+        "Wrong arguments: linker.py <target_instructions_file> <target_data_file> <object_or_source_file>..."
+    )
+    _, target_instructions_file, target_data_file, *input_files = sys.argv
+    main(target_instructions_file, target_data_file, input_files)
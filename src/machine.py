@@ -1,15 +1,61 @@
 import logging
 import sys
+from collections import deque
 
+from src.container import Container
+from src.counters import PerfCounters
 from src.signals import ProcessorState, Signal
+from src.stack_cache import StackCache
 from src.isa import (
+    BRANCH_OPCODES,
+    INPUT_STATUS_PORT,
     from_bytes_to_data,
     from_bytes_to_instructions,
     instr_to_bytes,
     Opcode,
+    unpack_string,
 )
 
 
+SHIFT_OPCODES = (Opcode.SHL, Opcode.SHR, Opcode.SAR, Opcode.ROL, Opcode.ROR)
+DATA_STACK_CAPACITY = 25
+CALL_STACK_CAPACITY = 10
+LOOP_STACK_CAPACITY = 4
+BINARY_ALU_OPCODES = (
+    Opcode.ADD,
+    Opcode.SUB,
+    Opcode.MUL,
+    Opcode.DIV,
+    Opcode.OR,
+    Opcode.AND,
+    Opcode.XOR,
+    Opcode.MULH,
+    *SHIFT_OPCODES,
+)
+
+
+def shift(opcode, value, amount):
+    """Shift/rotate `value` (the second stack element) by `amount` bits.
+
+    SHL, SHR and rotates work on the 32-bit word; SAR keeps the sign, like DIV.
+
+    >>> shift(Opcode.SHL, 3, 4), shift(Opcode.SHR, -16, 28), shift(Opcode.SAR, -16, 2)
+    (48, 15, -4)
+    >>> hex(shift(Opcode.ROL, 0x80000001, 1)), hex(shift(Opcode.ROR, 1, 4))
+    ('0x3', '0x10000000')
+    """
+    word = value & 0xFFFFFFFF
+    if opcode == Opcode.SHL:
+        return (value << amount) & 0xFFFFFFFF
+    if opcode == Opcode.SHR:
+        return word >> amount
+    if opcode == Opcode.SAR:
+        return value >> amount
+    if opcode == Opcode.ROL:
+        return ((word << amount) | (word >> (32 - amount))) & 0xFFFFFFFF
+    return ((word >> amount) | (word << (32 - amount))) & 0xFFFFFFFF
+
+
 class DataPath:
     def __init__(self, data, data_memory_size, stack_capacity, io_controller):
         self.data_size = data_memory_size
@@ -19,6 +65,7 @@ class DataPath:
         self.stack = [0] * stack_capacity
         self.tos = 0
         self.data_address = 0
+        self.byte_select = 0  # byte of the addressed word for loadb/outps
         self.CU_arg = 0
         self.result_alu = 0
         self.flags = {"Z": 0, "N": 0, "C": 0}
@@ -39,8 +86,13 @@ class DataPath:
     def signal_latch_stack(self):
         self.stack[self.stack_pointer] = self.tos
 
-    def signal_latch_data_address(self):
-        self.data_address = self.tos
+    def latch_data_address(self, sel: Signal):
+        if sel == Signal.SEL_ADDR_TOS:
+            self.data_address = self.tos
+        elif sel == Signal.SEL_ADDR_ARG:
+            self.data_address = self.CU_arg
+        elif sel == Signal.SEL_ADDR_TOS_BYTE:
+            self.data_address, self.byte_select = divmod(self.tos, 4)
 
     def latch_sp(self, sel: Signal):
         if sel == Signal.SEL_SP_NEXT:
@@ -60,11 +112,16 @@ class DataPath:
             self.tos = self.result_alu
         elif sel == Signal.SEL_TOS_MEM:
             self.tos = self.data_memory[self.data_address]
+        elif sel == Signal.SEL_TOS_MEM_BYTE:
+            self.tos = (self.data_memory[self.data_address] >> 8 * self.byte_select) & 0xFF
         elif sel == Signal.SEL_TOS_IN:
             self.tos = self.IO_Controller.input(self.CU_arg)
 
     def signal_alu_binary(self, opcode):
         assert self.stack_pointer >= 1, f"Not enough elements on stack {self.stack_pointer}, {self.stack}"
+        self.alu_binary(opcode)
+
+    def alu_binary(self, opcode):
         a = self.tos
         b = self.stack[self.stack_pointer]
         result = 0
@@ -88,10 +145,15 @@ class DataPath:
             result = a // b
         elif opcode == Opcode.XOR:
             result = a ^ b
+        elif opcode in SHIFT_OPCODES:
+            result = shift(opcode, b, a & 31)
         self.result_alu = result
 
     def signal_alu(self, opcode):
         assert self.stack_pointer >= 0, "Not enough elements on stack"
+        self.alu_unary(opcode)
+
+    def alu_unary(self, opcode):
         result = 0
         if opcode == Opcode.INC:
             result = self.tos + 1
@@ -107,45 +169,166 @@ class DataPath:
     def signal_latch_negative_flag(self):
         self.flags["N"] = int(self.tos < 0)
 
+    def signal_latch_compare_flags(self):
+        assert self.stack_pointer >= 1, f"Not enough elements on stack {self.stack_pointer}, {self.stack}"
+        a = self.stack[self.stack_pointer]
+        b = self.tos
+        self.flags["Z"] = int(a == b)
+        self.flags["N"] = int(a < b)
+
     def signal_write_port(self):
         self.IO_Controller.output(self.CU_arg, self.tos)
 
+    def signal_dma_write_port(self, length=None):
+        """Hand a block starting at `data_address` to the port.
+
+        Without `length` the block runs up to a zero word (not sent). Returns
+        the number of words read from memory.
+        """
+        addr = self.data_address
+        if length is None:
+            end = addr
+            while end < len(self.data_memory) and self.data_memory[end] != 0:
+                end += 1
+            assert end < len(self.data_memory), "string output without terminator"
+            words = end - addr + 1
+        else:
+            end = addr + length
+            assert 0 <= addr <= end <= len(self.data_memory), "block output out of data memory"
+            words = length
+        self.IO_Controller.output_block(self.CU_arg, self.data_memory[addr:end])
+        return words
+
+    def signal_dma_write_packed(self):
+        """Hand the packed string at byte `byte_select` of `data_address` to the port.
+
+        The string runs up to a zero byte (not sent). Returns the number of
+        words read from memory.
+        """
+        codes, words = unpack_string(self.data_memory, self.data_address * 4 + self.byte_select)
+        self.IO_Controller.output_block(self.CU_arg, codes)
+        return words
+
     def stack_swap(self):
         assert self.stack_pointer >= 0, "data stack underflow"
         self.stack[self.stack_pointer], self.tos = self.tos, self.stack[self.stack_pointer]
 
 
+class UncheckedDataPath(DataPath):
+    """DataPath without the run-time stack checks, for images proven safe by src.verifier."""
+
+    def latch_sp(self, sel: Signal):
+        if sel == Signal.SEL_SP_NEXT:
+            self.stack_pointer += 1
+        elif Signal.SEL_SP_PREV == sel:
+            self.stack[self.stack_pointer] = 0
+            self.stack_pointer -= 1
+
+    signal_alu_binary = DataPath.alu_binary
+    signal_alu = DataPath.alu_unary
+
+    def signal_latch_compare_flags(self):
+        a = self.stack[self.stack_pointer]
+        b = self.tos
+        self.flags["Z"] = int(a == b)
+        self.flags["N"] = int(a < b)
+
+    def stack_swap(self):
+        self.stack[self.stack_pointer], self.tos = self.tos, self.stack[self.stack_pointer]
+
+
+class InputFIFO:
+    """Hardware input queue that coalesces interrupts.
+
+    An interrupt is requested while the FIFO holds at least `threshold` words,
+    or when its oldest word has waited `timeout` ticks. Words arriving at a
+    full FIFO are dropped and counted in `overflows`.
+    """
+
+    def __init__(self, depth=16, threshold=4, timeout=50):
+        assert 0 < threshold <= depth, "FIFO threshold must be in 1..depth"
+        self.depth = depth
+        self.threshold = threshold
+        self.timeout = timeout
+        self.words = deque()
+        self.arrivals = deque()
+        self.overflows = 0
+
+    def push(self, value, tick):
+        if len(self.words) >= self.depth:
+            self.overflows += 1
+            return
+        self.words.append(value)
+        self.arrivals.append(tick)
+
+    def pop(self):
+        assert self.words, "input FIFO underflow"
+        self.arrivals.popleft()
+        return self.words.popleft()
+
+    def occupancy(self):
+        return len(self.words)
+
+    def interrupt_request(self, tick):
+        if not self.words:
+            return False
+        return len(self.words) >= self.threshold or tick - self.arrivals[0] >= self.timeout
+
+
 class IOController:
-    def __init__(self, io_ports):
+    def __init__(self, io_ports, fifo=None):
         self.io_ports = io_ports  # port -> list
+        self.fifo = fifo
 
     def push_input_buf(self, port, value):
         self.io_ports[port].append(value)
 
     def input(self, port):
+        if port == INPUT_STATUS_PORT:
+            return self.fifo.occupancy() if self.fifo is not None else len(self.io_ports[0])
+        if self.fifo is not None:
+            return self.fifo.pop()
         return self.io_ports[port].pop(0)
 
     def output(self, port, value):
         self.io_ports[port].append(chr(value))
 
+    def output_block(self, port, values):
+        self.io_ports[port].extend(map(chr, values))
+
 
 class ControlUnit:
     def __init__(
-        self, program_memory, data_path: DataPath, call_stack_capacity, input_timetable, interrupt_handler_address
+        self,
+        program_memory,
+        data_path: DataPath,
+        call_stack_capacity,
+        input_timetable,
+        interrupt_handler_address,
+        loop_stack_capacity=4,
     ):
         self.IF = False
         self.INTR = False
         self.interrupt_handler_address = interrupt_handler_address
         self.input_timetable = input_timetable
+        self.input_events = sorted(input_timetable)
+        self.next_input_event = 0
         self.scp = -1
         self.program = program_memory
         self.pc = 0
         self.call_stack = [0] * call_stack_capacity
+        self.lsp = -1
+        self.loop_index = [0] * loop_stack_capacity
+        self.loop_limit = [0] * loop_stack_capacity
         self.data_path = data_path
         self._tick = 0
         self.step = 0
         self.state = ProcessorState.NORMAL
         self.return_addr = 0
+        self.dma_remaining = 0
+        self.waiting = False  # stopped by WAIT until the next interrupt
+        self.wake_event = False  # an interrupt was taken while running; the next WAIT does not stop
+        self.idle_limit = None  # tick up to which a waiting processor may skip ahead; None steps tick by tick
 
     def tick(self):
         self._tick += 1
@@ -162,6 +345,8 @@ class ControlUnit:
             self.pc = self.interrupt_handler_address
         elif sel == Signal.SEL_PC_RET:
             self.pc = self.call_stack[self.scp]
+        elif sel == Signal.SEL_PC_ARG:
+            self.pc = self.data_path.CU_arg
 
     def latch_scp(self, sel: Signal):
         if sel == Signal.SEL_SCP_NEXT:
@@ -173,6 +358,26 @@ class ControlUnit:
             self.call_stack[self.scp] = 0
             self.scp -= 1
 
+    def latch_lsp(self, sel: Signal):
+        if sel == Signal.SEL_LSP_NEXT:
+            assert self.lsp + 1 < len(self.loop_index), "loop stack capacity exceeded"
+            self.lsp += 1
+        elif sel == Signal.SEL_LSP_PREV:
+            assert self.lsp >= 0, "negative loop stack pointer was received"
+            self.lsp -= 1
+
+    def signal_latch_loop_index(self):
+        self.loop_index[self.lsp] = self.data_path.tos
+
+    def signal_latch_loop_limit(self):
+        self.loop_limit[self.lsp] = self.data_path.tos
+
+    def signal_inc_loop_index(self):
+        self.loop_index[self.lsp] += 1
+
+    def loop_finished(self):
+        return self.loop_index[self.lsp] >= self.loop_limit[self.lsp]
+
     def signal_store_pc(self):
         self.call_stack[self.scp] = self.pc
 
@@ -188,18 +393,73 @@ class ControlUnit:
     def signal_reset_intr(self):
         self.INTR = False
 
-    def check_interrupt_request(self):
-        if self._tick not in self.input_timetable.keys():
+    def pending_input_events(self):
+        """Scheduled inputs due up to the current tick (several if ticks were skipped)."""
+        events = self.input_events
+        while self.next_input_event < len(events) and events[self.next_input_event] <= self._tick:
+            tick = events[self.next_input_event]
+            self.next_input_event += 1
+            yield tick, *self.input_timetable[tick]
+
+    def check_fifo_request(self, fifo):
+        for tick, port, value in self.pending_input_events():
+            if port == 0:
+                fifo.push(value, tick)
+            else:
+                self.data_path.IO_Controller.push_input_buf(port, value)
+        if self.IF and self.state is ProcessorState.NORMAL and fifo.interrupt_request(self._tick):
+            self.signal_set_intr()
+
+    def next_wake_tick(self):
+        """First tick at which a scheduled input can raise an interrupt, None if nothing is scheduled."""
+        ticks = []
+        if self.next_input_event < len(self.input_events):
+            ticks.append(self.input_events[self.next_input_event])
+        fifo = self.data_path.IO_Controller.fifo
+        if fifo is not None and fifo.arrivals:
+            ticks.append(fifo.arrivals[0] + fifo.timeout)
+        return min(ticks, default=None)
+
+    def idle(self):
+        """One step of a waiting processor: skip the ticks in which no input can arrive, up to `idle_limit`.
+
+        Every skipped tick would only have found no interrupt request, so the
+        tick count is the same as stepping through them one by one.
+        """
+        if self.idle_limit is None:
+            self.tick()
             return
-        if not self.IF:
+        wake = self.next_wake_tick()
+        self._tick = max(self._tick + 1, self.idle_limit if wake is None else min(wake, self.idle_limit))
+
+    def check_interrupt_request(self):
+        fifo = self.data_path.IO_Controller.fifo
+        if fifo is not None:
+            self.check_fifo_request(fifo)
             return
-        port, value = self.input_timetable[self._tick]
-        self.data_path.IO_Controller.push_input_buf(port, value)
-        self.signal_set_intr()
+        for _, port, value in self.pending_input_events():
+            if not self.IF:
+                continue
+            self.data_path.IO_Controller.push_input_buf(port, value)
+            self.signal_set_intr()
+
+    def branch_condition(self, opcode):
+        flags = self.data_path.flags
+        if opcode == Opcode.BEQ:
+            return flags["Z"] == 1
+        if opcode == Opcode.BNE:
+            return flags["Z"] == 0
+        if opcode == Opcode.BLT:
+            return flags["N"] == 1
+        return flags["N"] == 0
 
     def decode_and_execute_instruction(self):
         self.check_interrupt_request()
         if self.INTR and self.step == 0:
+            if self.waiting:
+                self.waiting = False
+            else:
+                self.wake_event = True
             self.return_addr = self.pc
             self.latch_pc(Signal.SEL_PC_INT)
             self.state = ProcessorState.INTERRUPTION
@@ -207,6 +467,9 @@ class ControlUnit:
             self.step = 0
             self.signal_reset_intr()
             return
+        if self.waiting:
+            self.idle()
+            return
 
         instr = self.program[self.pc]
         opcode = instr["opcode"]
@@ -233,6 +496,19 @@ class ControlUnit:
             self.tick()
             return
 
+        if opcode is Opcode.WAIT:
+            # the handler returns to the next instruction; an interrupt taken since the last WAIT
+            # (e.g. between a flag test and this WAIT) makes it fall through instead of missing the wakeup
+            assert self.state is ProcessorState.NORMAL, "wait inside the interrupt handler"
+            if self.wake_event:
+                self.wake_event = False
+            else:
+                self.waiting = True
+            self.latch_pc(Signal.SEL_PC_NEXT)
+            self.step = 0
+            self.tick()
+            return
+
         if opcode == Opcode.JUMP:
             self.latch_pc(Signal.SEL_PC_TOS)
             self.data_path.latch_tos(Signal.SEL_TOS_STACK)
@@ -279,6 +555,71 @@ class ControlUnit:
                 self.tick()
                 return
 
+        if opcode in BRANCH_OPCODES:
+            if self.step == 0:
+                self.data_path.signal_latch_compare_flags()
+                self.data_path.latch_tos(Signal.SEL_TOS_STACK)
+                self.data_path.latch_sp(Signal.SEL_SP_PREV)
+                self.step = 1
+                self.tick()
+                return
+            if self.step == 1:
+                if self.branch_condition(opcode):
+                    self.data_path.CU_arg = instr["arg"]
+                    self.latch_pc(Signal.SEL_PC_ARG)
+                else:
+                    self.latch_pc(Signal.SEL_PC_NEXT)
+                self.data_path.latch_tos(Signal.SEL_TOS_STACK)
+                self.data_path.latch_sp(Signal.SEL_SP_PREV)
+                self.step = 0
+                self.tick()
+                return
+
+        if opcode == Opcode.DO:
+            if self.step == 0:
+                self.latch_lsp(Signal.SEL_LSP_NEXT)
+                self.signal_latch_loop_index()
+                self.data_path.latch_tos(Signal.SEL_TOS_STACK)
+                self.data_path.latch_sp(Signal.SEL_SP_PREV)
+                self.step = 1
+                self.tick()
+                return
+            if self.step == 1:
+                self.signal_latch_loop_limit()
+                if self.loop_finished():
+                    self.latch_lsp(Signal.SEL_LSP_PREV)
+                    self.data_path.CU_arg = instr["arg"]
+                    self.latch_pc(Signal.SEL_PC_ARG)
+                else:
+                    self.latch_pc(Signal.SEL_PC_NEXT)
+                self.data_path.latch_tos(Signal.SEL_TOS_STACK)
+                self.data_path.latch_sp(Signal.SEL_SP_PREV)
+                self.step = 0
+                self.tick()
+                return
+
+        if opcode == Opcode.LOOP:
+            self.signal_inc_loop_index()
+            if self.loop_finished():
+                self.latch_lsp(Signal.SEL_LSP_PREV)
+                self.latch_pc(Signal.SEL_PC_NEXT)
+            else:
+                self.data_path.CU_arg = instr["arg"]
+                self.latch_pc(Signal.SEL_PC_ARG)
+            self.step = 0
+            self.tick()
+            return
+
+        if opcode == Opcode.INDEX:
+            self.data_path.CU_arg = self.loop_index[self.lsp]
+            self.data_path.latch_sp(Signal.SEL_SP_NEXT)
+            self.data_path.signal_latch_stack()
+            self.data_path.latch_tos(Signal.SEL_TOS_CU_ARG)
+            self.latch_pc(Signal.SEL_PC_NEXT)
+            self.step = 0
+            self.tick()
+            return
+
         if opcode == Opcode.LIT:
             self.data_path.CU_arg = instr["arg"]
             self.data_path.latch_sp(Signal.SEL_SP_NEXT)
@@ -305,7 +646,7 @@ class ControlUnit:
 
         if opcode == Opcode.LOAD:
             if self.step == 0:
-                self.data_path.signal_latch_data_address()
+                self.data_path.latch_data_address(Signal.SEL_ADDR_TOS)
                 self.step = 1
                 self.tick()
                 return
@@ -316,9 +657,22 @@ class ControlUnit:
                 self.tick()
                 return
 
+        if opcode == Opcode.LOADB:
+            if self.step == 0:
+                self.data_path.latch_data_address(Signal.SEL_ADDR_TOS_BYTE)
+                self.step = 1
+                self.tick()
+                return
+            if self.step == 1:
+                self.data_path.latch_tos(Signal.SEL_TOS_MEM_BYTE)
+                self.latch_pc(Signal.SEL_PC_NEXT)
+                self.step = 0
+                self.tick()
+                return
+
         if opcode == Opcode.STORE:
             if self.step == 0:
-                self.data_path.signal_latch_data_address()
+                self.data_path.latch_data_address(Signal.SEL_ADDR_TOS)
                 self.data_path.latch_tos(Signal.SEL_TOS_STACK)
                 self.data_path.latch_sp(Signal.SEL_SP_PREV)
                 self.step = 1
@@ -333,6 +687,38 @@ class ControlUnit:
                 self.tick()
                 return
 
+        if opcode == Opcode.LOAD_ABS:
+            if self.step == 0:
+                self.data_path.CU_arg = instr["arg"]
+                self.data_path.latch_data_address(Signal.SEL_ADDR_ARG)
+                self.data_path.latch_sp(Signal.SEL_SP_NEXT)
+                self.data_path.signal_latch_stack()
+                self.step = 1
+                self.tick()
+                return
+            if self.step == 1:
+                self.data_path.latch_tos(Signal.SEL_TOS_MEM)
+                self.latch_pc(Signal.SEL_PC_NEXT)
+                self.step = 0
+                self.tick()
+                return
+
+        if opcode == Opcode.STORE_ABS:
+            if self.step == 0:
+                self.data_path.CU_arg = instr["arg"]
+                self.data_path.latch_data_address(Signal.SEL_ADDR_ARG)
+                self.step = 1
+                self.tick()
+                return
+            if self.step == 1:
+                self.data_path.signal_memory_store()
+                self.data_path.latch_tos(Signal.SEL_TOS_STACK)
+                self.data_path.latch_sp(Signal.SEL_SP_PREV)
+                self.latch_pc(Signal.SEL_PC_NEXT)
+                self.step = 0
+                self.tick()
+                return
+
         if opcode == Opcode.IN:
             self.data_path.CU_arg = instr["arg"]
             self.data_path.latch_sp(Signal.SEL_SP_NEXT)
@@ -345,7 +731,7 @@ class ControlUnit:
 
         if opcode == Opcode.OUT:
             self.data_path.CU_arg = instr["arg"]
-            assert 1 <= self.data_path.CU_arg <= 7, f"OUT supports ports 1. Got port={self.data_path.CU_arg}"
+            assert 1 <= self.data_path.CU_arg <= 7, f"OUT supports ports 1-7, got port {self.data_path.CU_arg}"
             self.data_path.signal_write_port()
             self.data_path.latch_tos(Signal.SEL_TOS_STACK)
             self.data_path.latch_sp(Signal.SEL_SP_PREV)
@@ -353,7 +739,41 @@ class ControlUnit:
             self.step = 0
             self.tick()
             return
-        if opcode in {Opcode.ADD, Opcode.SUB, Opcode.MUL, Opcode.DIV, Opcode.OR, Opcode.AND, Opcode.XOR, Opcode.MULH}:
+        if opcode in (Opcode.OUTS, Opcode.OUTB, Opcode.OUTPS):
+            # 1 tick to start the transfer, then 1 tick per word moved by the controller
+            if self.step == 0:
+                self.data_path.CU_arg = instr["arg"]
+                assert 1 <= self.data_path.CU_arg <= 7, (
+                    f"{opcode.name} supports ports 1-7, got port {self.data_path.CU_arg}"
+                )
+                length = None
+                if opcode == Opcode.OUTB:
+                    length = self.data_path.tos
+                    self.data_path.latch_tos(Signal.SEL_TOS_STACK)
+                    self.data_path.latch_sp(Signal.SEL_SP_PREV)
+                if opcode == Opcode.OUTPS:
+                    self.data_path.latch_data_address(Signal.SEL_ADDR_TOS_BYTE)
+                    self.dma_remaining = self.data_path.signal_dma_write_packed()
+                else:
+                    self.data_path.latch_data_address(Signal.SEL_ADDR_TOS)
+                    self.dma_remaining = self.data_path.signal_dma_write_port(length)
+                self.step = 1
+                self.tick()
+                return
+            if self.dma_remaining > 1:
+                self.dma_remaining -= 1
+                self.step += 1
+                self.tick()
+                return
+            self.dma_remaining = 0
+            self.data_path.latch_tos(Signal.SEL_TOS_STACK)
+            self.data_path.latch_sp(Signal.SEL_SP_PREV)
+            self.latch_pc(Signal.SEL_PC_NEXT)
+            self.step = 0
+            self.tick()
+            return
+
+        if opcode in BINARY_ALU_OPCODES:
             self.data_path.signal_alu_binary(opcode)
             self.data_path.latch_sp(Signal.SEL_SP_PREV)
             self.data_path.latch_tos(Signal.SEL_TOS_ALU)
@@ -419,10 +839,46 @@ class ControlUnit:
         return "{}\t {:3}\t {}".format(state_repr, instr_repr, instr_hex)
 
 
-def simulation(code, data, data_size, handler_addr, schedule, limit):
-    io_controller = IOController({0: list(), 1: list(), 2: list()})
-    data_path = DataPath(data, data_size, 25, io_controller)
-    control_unit = ControlUnit(code, data_path, 10, schedule, handler_addr)
+class UncheckedControlUnit(ControlUnit):
+    """ControlUnit without the call and loop stack checks, for images proven safe by src.verifier."""
+
+    def latch_scp(self, sel: Signal):
+        if sel == Signal.SEL_SCP_NEXT:
+            self.scp += 1
+            self.call_stack[self.scp] = self.pc + 1
+        elif sel == Signal.SEL_SCP_PREV:
+            self.call_stack[self.scp] = 0
+            self.scp -= 1
+
+    def latch_lsp(self, sel: Signal):
+        if sel == Signal.SEL_LSP_NEXT:
+            self.lsp += 1
+        elif sel == Signal.SEL_LSP_PREV:
+            self.lsp -= 1
+
+
+def build_control_unit(code, data, data_size, handler_addr, schedule, fifo=None, checked=True):
+    io_controller = IOController({0: list(), 1: list(), 2: list()}, fifo)
+    data_path = (DataPath if checked else UncheckedDataPath)(data, data_size, DATA_STACK_CAPACITY, io_controller)
+    control_unit_class = ControlUnit if checked else UncheckedControlUnit
+    return control_unit_class(code, data_path, CALL_STACK_CAPACITY, schedule, handler_addr, LOOP_STACK_CAPACITY)
+
+
+# how the model fails when a program is driven too hard: failed checks, reading an empty
+# input buffer, stores out of data memory
+MACHINE_FAULTS = (AssertionError, IndexError, ZeroDivisionError)
+
+
+def simulation(
+    code, data, data_size, handler_addr, schedule, limit, counters=None, fifo=None, stack_cache=None, checked=True
+):
+    control_unit = build_control_unit(code, data, data_size, handler_addr, schedule, fifo, checked)
+    control_unit.idle_limit = limit
+    io_controller = control_unit.data_path.IO_Controller
+    if stack_cache is not None:
+        stack_cache.attach(control_unit, reserved_from=len(data))
+    if counters is not None:
+        counters.attach(control_unit)
     logging.debug("%s", control_unit)
     try:
         while control_unit.current_tick() < limit:
@@ -434,35 +890,93 @@ def simulation(code, data, data_size, handler_addr, schedule, limit):
         pass
     if control_unit.current_tick() >= limit:
         logging.warning("Limit exceeded!")
+    if counters is not None:
+        counters.export()
+    if stack_cache is not None:
+        logging.info("stack cache: %s", stack_cache.to_dict())
     logging.info("output_buffer: %s", repr("".join(io_controller.io_ports[1])))
     return "".join(io_controller.io_ports[1]), control_unit.current_tick()
 
 
-def read_input_schedule(filename):
+def parse_input_schedule(lines):
     schedule = dict()
-    with open(filename) as f:
-        for line in f:
-            tick, port, value = line.strip().split()
-            if value == "\\0":
-                value = 0
-            else:
-                value = ord(value)
-            tick, port = int(tick), int(port)
-            schedule[tick] = [port, value]
+    for line in lines:
+        tick, port, value = line.strip().split()
+        if value == "\\0":
+            value = 0
+        else:
+            value = ord(value)
+        tick, port = int(tick), int(port)
+        schedule[tick] = [port, value]
     return schedule
 
 
-def main(code_file, data_file, input_file):
+def read_input_schedule(filename):
+    with open(filename) as f:
+        return parse_input_schedule(f)
+
+
+def parse_fifo(spec):
+    """`depth:threshold:timeout` -> InputFIFO.
+
+    >>> fifo = parse_fifo("8:2:30")
+    >>> fifo.depth, fifo.threshold, fifo.timeout
+    (8, 2, 30)
+    """
+    depth, threshold, timeout = (int(part) for part in spec.split(":"))
+    return InputFIFO(depth, threshold, timeout)
+
+
+def parse_stack_cache(spec):
+    """`words:chunk:cost` -> StackCache with `words`-word regions for both stacks.
+
+    >>> cache = parse_stack_cache("16:4:2")
+    >>> cache.data_words, cache.call_words, cache.chunk, cache.cost
+    (16, 16, 4, 2)
+    """
+    words, chunk, cost = (int(part) for part in spec.split(":"))
+    return StackCache(words, words, chunk, cost)
+
+
+def main(code_file, data_file, input_file, counters_prefix=None, fifo=None, stack_cache=None):
     code, handl_addr = from_bytes_to_instructions(code_file)
     data = from_bytes_to_data(data_file)
+    run_program(code, data, handl_addr, input_file, counters_prefix, fifo, stack_cache)
+
+
+def main_container(container_file, input_file, counters_prefix=None, fifo=None, stack_cache=None, unchecked=False):
+    with Container(container_file) as container:
+        (code, handl_addr), data = container.code, container.data
+        assert container.verified or not unchecked, "only verified containers can run unchecked"
+    run_program(code, data, handl_addr, input_file, counters_prefix, fifo, stack_cache, not unchecked)
+
+
+def run_program(code, data, handl_addr, input_file, counters_prefix=None, fifo=None, stack_cache=None, checked=True):
     schedule = read_input_schedule(input_file)
-    output, ticks = simulation(code, data, 200, handl_addr, schedule, 10000)
+    counters = None
+    if counters_prefix is not None:
+        counters = PerfCounters(counters_prefix + ".json", counters_prefix + ".prom", export_every=1000)
+    output, ticks = simulation(code, data, 200, handl_addr, schedule, 10000, counters, fifo, stack_cache, checked)
     print(f"output_buffer:{''.join(output)}")
     print("ticks:", ticks)
 
 
 if __name__ == "__main__":
     logging.getLogger().setLevel(logging.DEBUG)
-    assert len(sys.argv) == 4, "Wrong arguments: machine.py <instructions_file> <data_file> <input_file>"
-    _, instructions_file, data_file, input_file = sys.argv
-    main(instructions_file, data_file, input_file)
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    options = dict(arg.removeprefix("--").partition("=")[::2] for arg in sys.argv[1:] if arg.startswith("--"))
+    usage = (
+        "Wrong arguments: machine.py <instructions_file> <data_file> <input_file> [<counters_prefix>]"
+        " | machine.py <container_file> <input_file> [<counters_prefix>]"
+        " [--fifo=<depth>:<threshold>:<timeout>] [--stack-cache=<words>:<chunk>:<cost>] [--unchecked]"
+    )
+    container = bool(args) and args[0].endswith(".csa")
+    assert len(args) in ((2, 3) if container else (3, 4)), usage
+    assert set(options) <= {"fifo", "stack-cache", "unchecked"}, usage
+    assert container or "unchecked" not in options, "--unchecked needs a verified container"
+    fifo = parse_fifo(options["fifo"]) if "fifo" in options else None
+    stack_cache = parse_stack_cache(options["stack-cache"]) if "stack-cache" in options else None
+    if container:
+        main_container(*args, fifo=fifo, stack_cache=stack_cache, unchecked="unchecked" in options)
+    else:
+        main(*args, fifo=fifo, stack_cache=stack_cache)
@@ -0,0 +1,170 @@
+"""Multi-core configuration of the machine model.
+
+Every core is a ControlUnit with its own DataPath (data stack, TOS, flags) and
+call stack; all DataPaths share one `data_memory` list. Cores advance in
+lockstep: in global cycle `c` each active core executes one tick, starting with
+core `c mod n` (round-robin priority), so accesses to shared memory within a
+cycle are serialized in that order and the whole run is deterministic.
+
+An inter-core link routes an output port of one core to input port 0 of
+another. Values wait in the receiver's mailbox and are delivered one at a time
+through `signal_set_intr` once it has interrupts enabled and no handler running.
+At reset each core finds its own number on the data stack.
+"""
+
+from __future__ import annotations
+
+import logging
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from src.isa import from_bytes_to_data, from_bytes_to_instructions
+from src.machine import ControlUnit, DataPath, IOController, read_input_schedule
+from src.signals import ProcessorState, Signal
+
+
+class LinkedIOController(IOController):
+    def __init__(self, io_ports, core_id, system):
+        super().__init__(io_ports)
+        self.core_id = core_id
+        self.system = system
+
+    def output(self, port, value):
+        target = self.system.links.get((self.core_id, port))
+        if target is None:
+            super().output(port, value)
+        else:
+            self.system.mailboxes[target].append(value)
+
+    def output_block(self, port, values):
+        target = self.system.links.get((self.core_id, port))
+        if target is None:
+            super().output_block(port, values)
+        else:
+            self.system.mailboxes[target].extend(values)
+
+
+class MultiCoreMachine:
+    def __init__(
+        self,
+        code,
+        data,
+        handler_addr,
+        cores,
+        data_size=200,
+        links=None,
+        schedules=None,
+        shared_memory=True,
+        first_core_id=0,
+    ):
+        self.code = code
+        self.data = data
+        self.handler_addr = handler_addr
+        self.data_size = data_size
+        self.links = dict(links or {})  # (source core, out port) -> destination core
+        self.schedules = schedules or [{} for _ in range(cores)]
+        self.shared_memory = shared_memory
+        self.mailboxes = [deque() for _ in range(cores)]
+        self.io_controllers = []
+        self.control_units = []
+        shared = None
+        for core_id in range(cores):
+            io_controller = LinkedIOController({0: list(), 1: list(), 2: list()}, core_id, self)
+            data_path = DataPath(data, data_size, 25, io_controller)
+            if shared_memory:
+                shared = data_path.data_memory if shared is None else shared
+                data_path.data_memory = shared
+            control_unit = ControlUnit(code, data_path, 10, self.schedules[core_id], handler_addr)
+            reset_core_id(control_unit, first_core_id + core_id)
+            self.io_controllers.append(io_controller)
+            self.control_units.append(control_unit)
+        self.cycle = 0
+
+    def deliver(self, core_id):
+        mailbox = self.mailboxes[core_id]
+        cu = self.control_units[core_id]
+        if not mailbox or not cu.IF or cu.INTR or cu.state is not ProcessorState.NORMAL:
+            return
+        self.io_controllers[core_id].push_input_buf(0, mailbox.popleft())
+        cu.signal_set_intr()
+
+    def independent(self):
+        return not self.shared_memory and not self.links
+
+    def run(self, limit, parallel=False):
+        """Simulate all cores; returns ([output per core], [ticks per core], cycles)."""
+        if parallel and self.independent():
+            return self.run_parallel(limit)
+        active = list(range(len(self.control_units)))
+        while active and self.cycle < limit:
+            start = self.cycle % len(self.control_units)
+            order = sorted(active, key=lambda core: (core - start) % len(self.control_units))
+            ticked = False
+            for core_id in order:
+                self.deliver(core_id)
+                try:
+                    self.control_units[core_id].decode_and_execute_instruction()
+                    ticked = True
+                except StopIteration:
+                    active.remove(core_id)
+            self.cycle += ticked
+        if active:
+            logging.warning("Limit exceeded!")
+        outputs = ["".join(io.io_ports[1]) for io in self.io_controllers]
+        return outputs, [cu.current_tick() for cu in self.control_units], self.cycle
+
+    def run_parallel(self, limit):
+        jobs = [
+            (self.code, self.data, self.data_size, self.handler_addr, self.schedules[core_id], core_id, limit)
+            for core_id in range(len(self.control_units))
+        ]
+        with ProcessPoolExecutor() as pool:
+            results = list(pool.map(run_single_core, *zip(*jobs)))
+        outputs = [output for output, _ in results]
+        ticks = [tick for _, tick in results]
+        self.cycle = max(ticks, default=0)
+        return outputs, ticks, self.cycle
+
+
+def reset_core_id(control_unit, core_id):
+    data_path = control_unit.data_path
+    data_path.CU_arg = core_id
+    data_path.latch_sp(Signal.SEL_SP_NEXT)
+    data_path.signal_latch_stack()
+    data_path.latch_tos(Signal.SEL_TOS_CU_ARG)
+
+
+def run_single_core(code, data, data_size, handler_addr, schedule, core_id, limit):
+    machine = MultiCoreMachine(
+        code, data, handler_addr, 1, data_size, schedules=[schedule], shared_memory=False, first_core_id=core_id
+    )
+    outputs, ticks, _ = machine.run(limit)
+    return outputs[0], ticks[0]
+
+
+def parse_link(text):
+    source, target = text.split("->")
+    core, port = source.split(":")
+    return (int(core), int(port)), int(target)
+
+
+def main(code_file, data_file, input_file, cores, links):
+    code, handler_addr = from_bytes_to_instructions(code_file)
+    data = from_bytes_to_data(data_file)
+    schedule = read_input_schedule(input_file)
+    schedules = [schedule] + [{} for _ in range(cores - 1)]
+    machine = MultiCoreMachine(code, data, handler_addr, cores, links=links, schedules=schedules)
+    outputs, ticks, cycles = machine.run(10000)
+    for core_id, output in enumerate(outputs):
+        print(f"core {core_id} output_buffer:{output}")
+        print(f"core {core_id} ticks:", ticks[core_id])
+    print("cycles:", cycles)
+
+
+if __name__ == "__main__":
+    assert len(sys.argv) >= 5, (
+        "Wrong arguments: multicore.py <instructions_file> <data_file> <input_file> <cores> [<core>:<port>-><core>...]"
+    )
+    _, instructions_file, data_file, input_file, n_cores, *link_args = sys.argv
+    main(instructions_file, data_file, input_file, int(n_cores), dict(parse_link(arg) for arg in link_args))
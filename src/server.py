@@ -0,0 +1,168 @@
+"""Warm translator/simulator server.
+
+Listens on a Unix socket and answers one JSON request per line with one JSON
+response line, so a client pays neither Python startup nor imports per job:
+
+    {"op": "translate", "source": "<forth text>"}
+    {"op": "run", "code": "<base64>", "data": "<base64>", "input": "<schedule>", "limit": 10000}
+    {"op": "run", "source": "<forth text>", "input": "<schedule>"}
+
+A run also takes the machine.py options "fifo" and "stack_cache" (their
+command-line specs) and "counters": true, which returns the counter files
+as "counters_json" and "counters_prom". A failed job, whatever raised,
+is answered with {"ok": false, "error": "..."}.
+
+Translations are cached by source hash in the server; decoded images are
+cached by every worker process. Jobs from all connections share one process
+pool, so they run concurrently.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import multiprocessing
+import sys
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+from src.counters import PerfCounters
+from src.isa import (
+    bytes_to_data,
+    bytes_to_instructions,
+    data_to_bytes,
+    hex_data,
+    hex_instructions,
+    instructions_to_bytes,
+)
+from src.machine import parse_fifo, parse_input_schedule, parse_stack_cache, simulation
+from src.translator import assemble, forth_to_assemble
+
+
+def translate_job(source):
+    try:
+        instructions, data_words, intr, handler_addr = assemble(forth_to_assemble(source))
+    except SystemExit as e:
+        return {"ok": False, "error": str(e.code)}
+    except Exception as e:
+        return {"ok": False, "error": f"translation error: {type(e).__name__}: {e}"}
+    return {
+        "ok": True,
+        "code": base64.b64encode(instructions_to_bytes(instructions, intr, handler_addr)).decode(),
+        "data": base64.b64encode(data_to_bytes(data_words)).decode(),
+        "code_hex": hex_instructions(instructions),
+        "data_hex": hex_data(data_words),
+        "loc": len(source.split("\n")),
+        "instructions": len(instructions),
+    }
+
+
+@lru_cache(maxsize=64)
+def decode_images(code_bytes, data_bytes):
+    code, handler_addr = bytes_to_instructions(code_bytes)
+    return code, bytes_to_data(data_bytes), handler_addr
+
+
+def run_job(code_bytes, data_bytes, schedule_text, limit, data_size, fifo=None, stack_cache=None, counters=False):
+    perf = PerfCounters() if counters else None
+    try:
+        code, data, handler_addr = decode_images(code_bytes, data_bytes)
+        schedule = parse_input_schedule(line for line in schedule_text.splitlines() if line.strip())
+        fifo = parse_fifo(fifo) if fifo is not None else None
+        stack_cache = parse_stack_cache(stack_cache) if stack_cache is not None else None
+        output, ticks = simulation(code, data, data_size, handler_addr, schedule, limit, perf, fifo, stack_cache)
+    except Exception as e:
+        return {"ok": False, "error": f"machine error: {type(e).__name__}: {e}"}
+    result = {"ok": True, "output": output, "ticks": ticks}
+    if perf is not None:
+        result.update(counters_json=perf.to_json(), counters_prom=perf.to_prometheus())
+    return result
+
+
+class SimulatorServer:
+    def __init__(self, workers=None, cache_size=128):
+        # spawned workers do not inherit the sockets of open client connections
+        self.pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+        self.cache_size = cache_size
+        self.translations = OrderedDict()  # sha256 of source -> translate_job result
+
+    async def translate(self, source):
+        key = hashlib.sha256(source.encode()).hexdigest()
+        if key in self.translations:
+            self.translations.move_to_end(key)
+            return self.translations[key]
+        result = await asyncio.get_running_loop().run_in_executor(self.pool, translate_job, source)
+        if result["ok"]:
+            self.translations[key] = result
+            if len(self.translations) > self.cache_size:
+                self.translations.popitem(last=False)
+        return result
+
+    async def run(self, request):
+        if "source" in request:
+            translated = await self.translate(request["source"])
+            if not translated["ok"]:
+                return translated
+            code, data = translated["code"], translated["data"]
+        else:
+            code, data = request["code"], request["data"]
+        return await asyncio.get_running_loop().run_in_executor(
+            self.pool,
+            run_job,
+            base64.b64decode(code),
+            base64.b64decode(data),
+            request.get("input", ""),
+            request.get("limit", 10000),
+            request.get("data_size", 200),
+            request.get("fifo"),
+            request.get("stack_cache"),
+            request.get("counters", False),
+        )
+
+    async def handle_request(self, request):
+        op = request.get("op")
+        if op == "translate":
+            return await self.translate(request["source"])
+        if op == "run":
+            return await self.run(request)
+        return {"ok": False, "error": f"unknown op {op!r}"}
+
+    async def handle(self, reader, writer):
+        try:
+            while line := await reader.readline():
+                try:
+                    response = await self.handle_request(json.loads(line))
+                except (ValueError, KeyError) as e:
+                    response = {"ok": False, "error": f"bad request: {e}"}
+                except Exception as e:
+                    response = {"ok": False, "error": f"server error: {type(e).__name__}: {e}"}
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        finally:
+            writer.close()
+            await writer.wait_closed()
+
+    async def start(self, path):
+        return await asyncio.start_unix_server(self.handle, path=path)
+
+    def close(self):
+        self.pool.shutdown()
+
+
+async def serve_forever(socket_path, workers):
+    server = SimulatorServer(workers)
+    try:
+        async with await server.start(socket_path) as unix_server:
+            await unix_server.serve_forever()
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    logging.getLogger().setLevel(logging.WARNING)
+    assert len(sys.argv) in (2, 3), "Wrong arguments: server.py <socket_path> [<workers>]"
+    asyncio.run(serve_forever(sys.argv[1], int(sys.argv[2]) if len(sys.argv) == 3 else None))
@@ -14,8 +14,15 @@ class Signal(str, Enum):
     SEL_PC_NEXT = auto()
     SEL_PC_TOS = auto()
     SEL_PC_RET = auto()
+    SEL_PC_ARG = auto()
     SEL_SCP_PREV = auto()
     SEL_SCP_NEXT = auto()
+    SEL_ADDR_TOS = auto()
+    SEL_ADDR_ARG = auto()
+    SEL_LSP_PREV = auto()
+    SEL_LSP_NEXT = auto()
+    SEL_ADDR_TOS_BYTE = auto()
+    SEL_TOS_MEM_BYTE = auto()
 
 
 class ProcessorState(Enum):
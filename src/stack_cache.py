@@ -0,0 +1,130 @@
+"""Stack cache: spill/fill of the data and call stacks to data memory.
+
+The on-chip stacks keep their capacity. When a push finds one full, its
+bottom `chunk` entries are spilled to a reserved region at the top of data
+memory; when a pop leaves it (nearly) empty, entries are filled back. Every
+moved word stalls the processor for `cost` ticks. The model is attached to a
+ControlUnit by swapping instance methods, like PerfCounters, so a machine
+without it runs unchanged.
+"""
+
+from __future__ import annotations
+
+from src.signals import Signal
+
+
+class SpillArea:
+    def __init__(self, name, base, size):
+        self.name = name
+        self.base = base
+        self.size = size
+        self.depth = 0  # words currently in memory
+        self.max_depth = 0
+        self.spills = 0
+        self.fills = 0
+        self.words_spilled = 0
+        self.words_filled = 0
+
+    def spill(self, memory, words):
+        assert self.depth + len(words) <= self.size, f"{self.name} spill region overflow"
+        start = self.base + self.depth
+        memory[start : start + len(words)] = words
+        self.depth += len(words)
+        self.max_depth = max(self.max_depth, self.depth)
+        self.spills += 1
+        self.words_spilled += len(words)
+
+    def fill(self, memory, count):
+        count = min(count, self.depth)
+        self.depth -= count
+        start = self.base + self.depth
+        words = memory[start : start + count]
+        memory[start : start + count] = [0] * count
+        self.fills += 1
+        self.words_filled += count
+        return words
+
+    def to_dict(self):
+        return {
+            "max_depth": self.max_depth,
+            "spills": self.spills,
+            "fills": self.fills,
+            "words_spilled": self.words_spilled,
+            "words_filled": self.words_filled,
+        }
+
+
+class StackCache:
+    def __init__(self, data_words=32, call_words=32, chunk=4, cost=1):
+        self.data_words = data_words
+        self.call_words = call_words
+        self.chunk = chunk
+        self.cost = cost
+        self.stall = 0  # ticks owed for the current instruction
+        self.stall_ticks = 0
+        self.data_area = None
+        self.call_area = None
+
+    def attach(self, control_unit, reserved_from=0):
+        """Reserve the top of data memory above `reserved_from` and swap in spilling stacks."""
+        data_path = control_unit.data_path
+        memory_size = len(data_path.data_memory)
+        call_base = memory_size - self.call_words
+        data_base = call_base - self.data_words
+        assert data_base >= reserved_from, "stack spill regions overlap program data"
+        assert self.chunk < len(data_path.stack), "spill chunk must be smaller than the data stack"
+        assert self.chunk < len(control_unit.call_stack), "spill chunk must be smaller than the call stack"
+        self.data_area = SpillArea("data stack", data_base, self.data_words)
+        self.call_area = SpillArea("call stack", call_base, self.call_words)
+
+        latch_sp = data_path.latch_sp
+        latch_scp = control_unit.latch_scp
+        tick = control_unit.tick
+
+        def spilling_latch_sp(sel):
+            stack = data_path.stack
+            if sel == Signal.SEL_SP_NEXT and data_path.stack_pointer == len(stack) - 1:
+                self.data_area.spill(data_path.data_memory, stack[: self.chunk])
+                stack[:] = stack[self.chunk :] + [0] * self.chunk
+                data_path.stack_pointer -= self.chunk
+                self.stall += self.chunk * self.cost
+            latch_sp(sel)
+            # binary operations read stack[sp], so keep at least one entry below TOS on chip
+            if sel == Signal.SEL_SP_PREV and data_path.stack_pointer < 1 and self.data_area.depth:
+                kept = data_path.stack_pointer + 1
+                words = self.data_area.fill(data_path.data_memory, self.chunk)
+                stack[:] = words + stack[:kept] + [0] * (len(stack) - kept - len(words))
+                data_path.stack_pointer += len(words)
+                self.stall += len(words) * self.cost
+
+        def spilling_latch_scp(sel):
+            call_stack = control_unit.call_stack
+            if sel == Signal.SEL_SCP_NEXT and control_unit.scp == len(call_stack) - 1:
+                self.call_area.spill(data_path.data_memory, call_stack[: self.chunk])
+                call_stack[:] = call_stack[self.chunk :] + [0] * self.chunk
+                control_unit.scp -= self.chunk
+                self.stall += self.chunk * self.cost
+            latch_scp(sel)
+            if sel == Signal.SEL_SCP_PREV and control_unit.scp < 0 and self.call_area.depth:
+                words = self.call_area.fill(data_path.data_memory, self.chunk)
+                call_stack[:] = words + [0] * (len(call_stack) - len(words))
+                control_unit.scp += len(words)
+                self.stall += len(words) * self.cost
+
+        def stalling_tick():
+            tick()
+            control_unit._tick += self.stall
+            self.stall_ticks += self.stall
+            self.stall = 0
+
+        data_path.latch_sp = spilling_latch_sp
+        control_unit.latch_scp = spilling_latch_scp
+        control_unit.tick = stalling_tick
+        return control_unit
+
+    def to_dict(self):
+        return {
+            "stall_ticks": self.stall_ticks,
+            "data_stack": self.data_area.to_dict(),
+            "call_stack": self.call_area.to_dict(),
+        }
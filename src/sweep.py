@@ -0,0 +1,133 @@
+"""Input rate sweep: how fast can the devices feed a program?
+
+The values of an input schedule are re-timed to arrive every `gap` ticks,
+starting at the tick of the first one, and every gap is simulated in its own
+process with PerfCounters attached. A gap is sustained when the run finishes
+with the output of the original schedule, no input is dropped and the
+handler is never entered while it runs. The smallest gap from which every
+larger gap in the range is sustained is the maximum input rate of the program.
+
+    python -m src.sweep <container_file> <input_file> [--gaps=<min>:<max>[:<step>]] [--fifo=<depth>:<threshold>:<timeout>]
+    python -m src.sweep <instructions_file> <data_file> <input_file> [...] [--workers=<n>]
+"""
+
+from __future__ import annotations
+
+import logging
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from src.container import Container
+from src.counters import PerfCounters
+from src.isa import from_bytes_to_data, from_bytes_to_instructions
+from src.machine import MACHINE_FAULTS, parse_fifo, read_input_schedule, simulation
+
+SLACK = 10000  # ticks allowed after the last input
+
+
+def retime(schedule, gap):
+    """The same inputs, one every `gap` ticks from the first one.
+
+    >>> retime({30: [0, 72], 90: [0, 73], 160: [0, 0]}, 5)
+    {30: [0, 72], 35: [0, 73], 40: [0, 0]}
+    """
+    ticks = sorted(schedule)
+    return {ticks[0] + n * gap: schedule[tick] for n, tick in enumerate(ticks)}
+
+
+def run_schedule(code, data, handler_addr, schedule, fifo_spec=None):
+    """One simulation with counters; a machine fault is reported in `error`."""
+    counters = PerfCounters()
+    limit = max(schedule, default=0) + SLACK
+    fifo = parse_fifo(fifo_spec) if fifo_spec is not None else None
+    output, error = None, None
+    try:
+        output, _ = simulation(code, data, 200, handler_addr, dict(schedule), limit, counters, fifo)
+    except MACHINE_FAULTS as e:
+        error = f"{type(e).__name__}: {e}"
+    if error is None and counters.ticks >= limit:
+        error = "tick limit exceeded"
+    return {
+        "output": output,
+        "ticks": counters.ticks,
+        "error": error,
+        "dropped": counters.dropped_inputs,
+        "nested": counters.nested_interrupts,
+        "latency": max(counters.input_latency, default=0),
+        "service": max(counters.service_ticks, default=0),
+    }
+
+
+def sweep(code, data, handler_addr, schedule, gaps, fifo_spec=None, workers=None):
+    """Results per gap (as listed in `gaps`) and the smallest sustained gap, None if the largest one fails."""
+    reference = run_schedule(code, data, handler_addr, schedule, fifo_spec)
+    if reference["error"] is not None or reference["dropped"] or reference["nested"]:
+        sys.exit(f"the original schedule already loses input: {reference}")
+    schedules = [retime(schedule, gap) for gap in gaps]
+    with ProcessPoolExecutor(workers) as pool:
+        runs = pool.map(run_schedule, *zip(*[(code, data, handler_addr, s, fifo_spec) for s in schedules]))
+        results = {gap: result for gap, result in zip(gaps, runs)}
+    for result in results.values():
+        result["sustained"] = (
+            result["error"] is None
+            and result["output"] == reference["output"]
+            and result["dropped"] == 0
+            and result["nested"] == 0
+        )
+    sustained = None
+    for gap in sorted(gaps, reverse=True):
+        if not results[gap]["sustained"]:
+            break
+        sustained = gap
+    return results, sustained
+
+
+def parse_gaps(spec):
+    """`min:max[:step]` -> gaps.
+
+    >>> parse_gaps("10:30:10"), parse_gaps("3:5")
+    ([10, 20, 30], [3, 4, 5])
+    """
+    low, high, *step = (int(part) for part in spec.split(":"))
+    return list(range(low, high + 1, step[0] if step else 1))
+
+
+def main(*args, gaps="5:200:5", fifo=None, workers=None):
+    if len(args) == 2:
+        container_file, input_file = args
+        with Container(container_file) as container:
+            (code, handler_addr), data = container.code, container.data
+    else:
+        code_file, data_file, input_file = args
+        code, handler_addr = from_bytes_to_instructions(code_file)
+        data = from_bytes_to_data(data_file)
+    results, sustained = sweep(
+        code, data, handler_addr, read_input_schedule(input_file), parse_gaps(gaps), fifo, workers
+    )
+    print(f"{'gap':>5} {'ticks':>7} {'dropped':>8} {'nested':>7} {'latency':>8} {'service':>8}  result")
+    for gap, result in sorted(results.items()):
+        verdict = "ok" if result["sustained"] else result["error"] or f"output {result['output']!r}"
+        print(
+            f"{gap:>5} {result['ticks']:>7} {result['dropped']:>8} {result['nested']:>7}"
+            f" {result['latency']:>8} {result['service']:>8}  {verdict}"
+        )
+    if sustained is None:
+        print("no gap in the range is sustained")
+    else:
+        print(f"max sustainable rate: one input every {sustained} ticks")
+
+
+if __name__ == "__main__":
+    logging.getLogger().setLevel(logging.ERROR)
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    options = dict(arg.removeprefix("--").partition("=")[::2] for arg in sys.argv[1:] if arg.startswith("--"))
+    usage = (
+        "Wrong arguments: sweep.py <container_file> <input_file>"
+        " | sweep.py <instructions_file> <data_file> <input_file>"
+        " [--gaps=<min>:<max>[:<step>]] [--fifo=<depth>:<threshold>:<timeout>] [--workers=<n>]"
+    )
+    assert len(args) in (2, 3), usage
+    assert set(options) <= {"gaps", "fifo", "workers"}, usage
+    if "workers" in options:
+        options["workers"] = int(options["workers"])
+    main(*args, **options)
@@ -1,12 +1,20 @@
 from __future__ import annotations
 
+import json
 import os
 import re
 import sys
 from pathlib import Path
 
+from src import verifier
+from src.container import write_container
 from src.isa import (
+    ARG_OPCODES,
+    INPUT_STATUS_PORT,
+    PORT_OPCODES,
     Opcode,
+    pack_string,
+    program_digest,
     write_data,
     write_hex_data,
     write_hex_instructions,
@@ -14,6 +22,8 @@ from src.isa import (
 )
 
 LABEL_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+OBJECT_FORMAT = "csa-object"
+OBJECT_VERSION = 1
 
 
 class ParsInstr:
@@ -22,22 +32,39 @@ class ParsInstr:
         self.argument = argument
 
 
-def tokenize(text):
+def tokenize(text, lines=None):
+    """Split source text into tokens; a string literal becomes "*" and its text goes to `strings`.
+
+    When `lines` is a list, the source line of every token is appended to it.
+
+    >>> lines = []
+    >>> tokenize('var x : f\\n  drop ;', lines)
+    (['var', 'x', ':', 'f', 'drop', ';'], [])
+    >>> lines
+    [1, 1, 1, 1, 2, 2]
+    """
     tokens = []
     strings = []
     in_string = False
     buf_string = ""
+    line = token_line = 1
     i = 0
     n = len(text)
     while i < n:
         ch = text[i]
+        if ch == "\n":
+            line += 1
         if ch == '"':
             if in_string:
                 strings.append(buf_string)
                 tokens.append("*")
+                if lines is not None:
+                    lines.append(token_line)
                 buf_string = ""
                 in_string = False
             else:
+                if not buf_string:
+                    token_line = line
                 in_string = True
             i += 1
             continue
@@ -52,29 +79,128 @@ def tokenize(text):
         if ch in " \t\n":
             if buf_string:
                 tokens.append(buf_string)
+                if lines is not None:
+                    lines.append(token_line)
                 buf_string = ""
             i += 1
             continue
+        if not buf_string:
+            token_line = line
         buf_string += ch
         i += 1
     if buf_string:
         tokens.append(buf_string)
+        if lines is not None:
+            lines.append(token_line)
     return tokens, strings
 
 
-def forth_to_assemble(text: str) -> str:
+def power_of_two_shift(tok: str) -> int | None:
+    """Shift amount for a literal 2**k (k >= 1), used to strength-reduce `* ` and `swap /`.
+
+    >>> power_of_two_shift("8"), power_of_two_shift("1"), power_of_two_shift("12"), power_of_two_shift("x")
+    (3, None, None, None)
+    """
+    if not tok.isdigit():
+        return None
+    value = int(tok)
+    if value < 2 or value & (value - 1):
+        return None
+    return value.bit_length() - 1
+
+
+def live_symbols(refs: dict[str | None, set[str]], roots) -> set[str | None]:
+    """Symbols reachable from `roots` over call edges and data references.
+
+    >>> sorted(live_symbols({None: {"a"}, "a": {"x", "b"}, "b": set(), "c": {"y"}}, [None]), key=str)
+    [None, 'a', 'b', 'x']
+    """
+    live = set()
+    stack = list(roots)
+    while stack:
+        name = stack.pop()
+        if name in live:
+            continue
+        live.add(name)
+        stack.extend(refs.get(name, ()))
+    return live
+
+
+def drop_dead(out: list[str], spans: dict[str, tuple[int, int]], live: set[str | None]) -> list[str]:
+    dead = [False] * len(out)
+    for name, (start, end) in spans.items():
+        if name not in live:
+            dead[start:end] = [True] * (end - start)
+    return [line for line, is_dead in zip(out, dead) if not is_dead]
+
+
+def flip_if(lines: list[str], uid: int) -> list[str]:
+    """Swap the branches of a compiled `if ... else` (`lines` starts at its branch).
+
+    The then-branch moves to the end, where it needs no jump over the else-branch.
+
+    >>> flip_if(["beq else_1", "A", "lit end_1", "jump", "else_1:", "B"], 1)
+    ['bne then_1', 'B', 'lit end_1', 'jump', 'then_1:', 'A']
+    """
+    branch, *rest = lines
+    split = rest.index(f"else_{uid}:")
+    then_branch, else_branch = rest[: split - 2], rest[split + 1 :]
+    opcode = {"beq": "bne", "blt": "bge"}[branch.split()[0]]
+    return [f"{opcode} then_{uid}", *else_branch, f"lit end_{uid}", "jump", f"then_{uid}:", *then_branch]
+
+
+def tail_calls(body: list[str], end_label: str) -> list[int]:
+    """Indexes of `call` lines in `body` after which the word only returns.
+
+    Labels, `nop` and `lit <label> jump` inside the word are followed, so a call
+    at the end of the last `if`/`else` branch is in tail position too.
+
+    >>> tail_calls(["w:", "lit f", "call", "lit end_1", "jump", "else_1:", "lit g", "call", "end_1:", "nop", "w_end:", "ret"], "w_end:")
+    [2, 7]
+    >>> tail_calls(["w:", "lit f", "call", "drop", "w_end:", "ret"], "w_end:")
+    []
+    """
+    labels = {line: n for n, line in enumerate(body) if line.endswith(":")}
+
+    def returns_from(n):
+        seen = set()
+        while n < len(body) and n not in seen:
+            seen.add(n)
+            line = body[n]
+            if line == end_label:
+                return body[n + 1] == "ret"
+            if line.endswith(":") or line == "nop":
+                n += 1
+            elif line.startswith("lit ") and body[n + 1 : n + 2] == ["jump"] and f"{line[4:]}:" in labels:
+                n = labels[f"{line[4:]}:"]
+            else:
+                return False
+        return False
+
+    return [n for n, line in enumerate(body) if line == "call" and returns_from(n + 1)]
+
+
+def forth_to_assemble(text: str, eliminate_dead: bool = True, flip_ifs=frozenset()) -> str:
     tokens, strings = tokenize(text)
     proc_out = []
     global_out = []
     cur = global_out
     data_labels = set()
+    packed_labels = set()  # pstr names, referenced by byte address
+    data_spans = {}  # data label -> slice of global_out
+    func_spans = {}  # word -> slice of proc_out
+    refs = {None: set()}  # word (None for the top level) -> referenced labels
+    owner = None
     func_end = None
     func_labels = set()
     need_tmp_over = False
     begin_stack = []
     if_stack = []
+    do_stack = []
     uid_if_else = 0
     uid_begin_again = 0
+    uid_do_loop = 0
+    string_index = 0
     i = 0
     while i < len(tokens):
         if tokens[i] == "var":
@@ -83,37 +209,77 @@ def forth_to_assemble(text: str) -> str:
         elif tokens[i] == "str":
             data_labels.add(tokens[i + 1])
             i += 3
+        elif tokens[i] == "pstr":
+            data_labels.add(tokens[i + 1])
+            packed_labels.add(tokens[i + 1])
+            i += 3
         elif tokens[i] == "array":
             data_labels.add(tokens[i + 1])
             i += 3
         elif tokens[i] == "*2":
             need_tmp_over = True
             i += 1
+        elif tokens[i] == "extern":
+            if tokens[i + 1] == "var":
+                data_labels.add(tokens[i + 2])
+                i += 3
+            elif tokens[i + 1] == "pstr":
+                data_labels.add(tokens[i + 2])
+                packed_labels.add(tokens[i + 2])
+                i += 3
+            else:
+                func_labels.add(tokens[i + 1])
+                i += 2
         else:
             i += 1
     if need_tmp_over:
         global_out.extend(["var", "_tmp_over", "0"])
+        data_spans["_tmp_over"] = (0, 3)
         data_labels.add("_tmp_over")
     i = 0
     while i < len(tokens):
         tok = tokens[i]
+        shift = power_of_two_shift(tok)
+        if shift is not None and tokens[i + 1 : i + 2] == ["*"]:
+            cur.extend([f"lit {shift}", "lshift"])
+            i += 2
+            continue
+        if shift is not None and tokens[i + 1 : i + 3] == ["swap", "/"]:
+            cur.extend([f"lit {shift}", "arshift"])
+            i += 3
+            continue
         if tok.lstrip("-").isdigit():
             cur.append(f"lit {tok}")
             i += 1
             continue
         if tok == "var":
             name = tokens[i + 1]
+            start = len(global_out)
             global_out.extend(["var", name, "0"])
+            data_spans[name] = (start, len(global_out))
             i += 2
             continue
+        if tok == "extern":
+            i += 3 if tokens[i + 1] in ("var", "pstr") else 2
+            continue
         if tok == "str":
             name = tokens[i + 1]
-            global_out.extend(["var", name, f'"{strings.pop(0)}"'])
+            data_spans[name] = (len(global_out), len(global_out) + 3)
+            global_out.extend(["var", name, f'"{strings[string_index]}"'])
+            string_index += 1
+            i += 3
+            continue
+        if tok == "pstr":
+            name = tokens[i + 1]
+            data_spans[name] = (len(global_out), len(global_out) + 4)
+            global_out.extend(["var", name, "packed", f'"{strings[string_index]}"'])
+            string_index += 1
             i += 3
             continue
         if tok == "array":
             name = tokens[i + 1]
             capacity = int(tokens[i + 2])
+            data_spans[name] = (len(global_out), len(global_out) + 2 + capacity)
             global_out.extend(["var", name] + ["0"] * capacity)
             i += 3
             continue
@@ -125,7 +291,22 @@ def forth_to_assemble(text: str) -> str:
             cur.extend(["in", tokens[i + 1]])
             i += 2
             continue
+        if tok == "outs":
+            cur.extend(["outs", tokens[i + 1]])
+            i += 2
+            continue
+        if tok == "type":
+            cur.extend(["outb", tokens[i + 1]])
+            i += 2
+            continue
+        if tok == "outps":
+            cur.extend(["outps", tokens[i + 1]])
+            i += 2
+            continue
         if tok == ":":
+            owner = tokens[i + 1]
+            refs[owner] = set()
+            func_spans[owner] = (len(proc_out), None)
             func_end = f"{tokens[i + 1]}_end"
             cur = proc_out
             cur.append(f"{tokens[i + 1]}:")
@@ -138,6 +319,11 @@ def forth_to_assemble(text: str) -> str:
             else:
                 cur.append(f"{func_end}:")
                 cur.append("ret")
+                start = func_spans[owner][0]
+                for j in tail_calls(proc_out[start:], f"{func_end}:"):
+                    proc_out[start + j] = "jump"
+            func_spans[owner] = (func_spans[owner][0], len(proc_out))
+            owner = None
             func_end = None
             cur = global_out
             i += 1
@@ -145,34 +331,28 @@ def forth_to_assemble(text: str) -> str:
         if tok == "!=" or tok == ">":
             uid_if_else += 1
             else_label = f"else_{uid_if_else}"
-            end_label = f"end_{uid_if_else}"
+            if_stack.append((uid_if_else, False, len(cur)))
             if tok == "!=":
-                cur.append("-")
-                cur.append(f"lit else_{uid_if_else}")
-                cur.append("swap")
-                cur.append("jz")
+                cur.append(f"beq {else_label}")
             else:
-                cur.append("swap")
-                cur.append("-")
-                cur.append(f"lit else_{uid_if_else}")
-                cur.append("swap")
-                cur.append("jn")
-            if_stack.append((else_label, end_label, False))
+                cur.append(f"blt {else_label}")
             i += 2
             continue
         if tok == "else":
-            else_label, end_label, _sk = if_stack.pop()
-            cur.extend([f"lit {end_label}", "jump"])
-            cur.append(f"{else_label}:")
-            if_stack.append((else_label, end_label, True))
+            uid, _sk, start = if_stack.pop()
+            cur.extend([f"lit end_{uid}", "jump"])
+            cur.append(f"else_{uid}:")
+            if_stack.append((uid, True, start))
             i += 1
             continue
         if tok == "then":
-            else_label, end_label, has_else = if_stack.pop()
+            uid, has_else, start = if_stack.pop()
             if not has_else:
-                cur.append(f"{else_label}:")
+                cur.append(f"else_{uid}:")
                 cur.append("nop")
-            cur.append(f"{end_label}:")
+            elif uid in flip_ifs and "var" not in cur[start:]:
+                cur[start:] = flip_if(cur[start:], uid)
+            cur.append(f"end_{uid}:")
             cur.append("nop")
             i += 1
             continue
@@ -180,54 +360,101 @@ def forth_to_assemble(text: str) -> str:
             uid_begin_again += 1
             l_begin = f"loop_{uid_begin_again}_start"
             l_end = f"loop_{uid_begin_again}_end"
-            begin_stack.append((l_begin, l_end))
+            begin_stack.append((l_begin, l_end, len(do_stack)))
             cur.append(f"{l_begin}:")
             i += 1
             continue
         if tok == "exit":
-            l_begin, l_end = begin_stack[-1]
+            if not begin_stack:
+                sys.exit("exit outside of begin ... again")
+            l_begin, l_end, open_dos = begin_stack[-1]
+            if len(do_stack) > open_dos:
+                # nothing pops the loop stack but a finished loop, so the jump would leave it behind
+                sys.exit("exit from begin ... again inside an open do ... loop")
             cur.extend([f"lit {l_end}", "inc", "inc", "jump"])
             i += 1
             continue
 
         if tok == "again":
-            l_begin, l_end = begin_stack.pop()
+            l_begin, l_end, _ = begin_stack.pop()
             cur.append(f"{l_end}:")
             cur += [f"lit {l_begin}", "jump"]
             i += 1
             continue
-        if tok in data_labels:
-            cur.append(f"lit {tok}")
+        if tok == "do":
+            uid_do_loop += 1
+            l_body = f"do_{uid_do_loop}_body"
+            l_end = f"do_{uid_do_loop}_end"
+            do_stack.append((l_body, l_end))
+            cur.append(f"do {l_end}")
+            cur.append(f"{l_body}:")
+            i += 1
+            continue
+        if tok == "loop":
+            if not do_stack:
+                sys.exit("loop without matching do")
+            l_body, l_end = do_stack.pop()
+            cur.append(f"loop {l_body}")
+            cur.append(f"{l_end}:")
             i += 1
             continue
+        if tok in data_labels:
+            refs[owner].add(tok)
+            nxt = tokens[i + 1] if i + 1 < len(tokens) else None
+            if tok in packed_labels:
+                if nxt in ("@", "!"):
+                    sys.exit(f"pstr {tok} is read-only and byte-addressed, read it with c@")
+                cur.append(f"lit &{tok}")
+                i += 1
+            elif nxt == "@":
+                cur.append(f"load_abs {tok}")
+                i += 2
+            elif nxt == "!":
+                cur.append(f"store_abs {tok}")
+                i += 2
+            else:
+                cur.append(f"lit {tok}")
+                i += 1
+            continue
         if tok in func_labels:
+            refs[owner].add(tok)
             cur.append(f"lit {tok}")
             cur.append("call")
             i += 1
             continue
+        if tok == "i":
+            if not do_stack:
+                sys.exit("i used outside of do ... loop")
+            cur.append("i")
+            i += 1
+            continue
         if tok == "*2":
+            refs[owner].add("_tmp_over")
             cur.extend(
                 [
                     "dup",
-                    "lit _tmp_over",
-                    "!",
+                    "store_abs _tmp_over",
                     "swap",
                     "dup",
-                    "lit _tmp_over",
-                    "@",
+                    "load_abs _tmp_over",
                     "mulh",
-                    "lit _tmp_over",
-                    "!",
+                    "store_abs _tmp_over",
                     "*",
-                    "lit _tmp_over",
-                    "@",
+                    "load_abs _tmp_over",
                     "swap",
                 ]
             )
             i += 1
             continue
+        refs[owner].add(tok)
         cur.append(tok)
         i += 1
+    if "wait" in live_symbols(refs, ["interrupt_handler"]):
+        sys.exit("wait inside interrupt_handler or a word it calls (nothing could wake it)")
+    if eliminate_dead:
+        live = live_symbols(refs, [None, "interrupt_handler"])
+        global_out = drop_dead(global_out, data_spans, live)
+        proc_out = drop_dead(proc_out, func_spans, live)
     full_out = global_out + proc_out
 
     return "\n".join(full_out) + "\n"
@@ -258,6 +485,10 @@ def symbol_to_opcode(symbol):
         "@": Opcode.LOAD,
         "in": Opcode.IN,
         "out": Opcode.OUT,
+        "outs": Opcode.OUTS,
+        "outb": Opcode.OUTB,
+        "outps": Opcode.OUTPS,
+        "c@": Opcode.LOADB,
         "+": Opcode.ADD,
         "-": Opcode.SUB,
         "*": Opcode.MUL,
@@ -281,51 +512,137 @@ def symbol_to_opcode(symbol):
         "eint": Opcode.EINT,
         "dint": Opcode.DINT,
         "halt": Opcode.HALT,
+        "beq": Opcode.BEQ,
+        "bne": Opcode.BNE,
+        "blt": Opcode.BLT,
+        "bge": Opcode.BGE,
+        "load_abs": Opcode.LOAD_ABS,
+        "store_abs": Opcode.STORE_ABS,
+        "do": Opcode.DO,
+        "loop": Opcode.LOOP,
+        "i": Opcode.INDEX,
+        "lshift": Opcode.SHL,
+        "rshift": Opcode.SHR,
+        "arshift": Opcode.SAR,
+        "rol": Opcode.ROL,
+        "ror": Opcode.ROR,
+        "wait": Opcode.WAIT,
     }.get(symbol)
 
 
+def parse_var(tokens: list[str], i: int, strings: list[str], string_index: int):
+    """Items of the `var` at tokens[i]: numbers, strings and (`var <name> packed <string>`) bytes.
+
+    Returns the items, the index of the next token and of the next string.
+    """
+    items = []
+    j = i + 2
+    packed = tokens[j : j + 2] == ["packed", "*"]
+    j += packed
+    while j < len(tokens):
+        v = tokens[j]
+        if v == "*":
+            if string_index >= len(strings):
+                sys.exit(" string index out of range")
+            processed = bytes(strings[string_index], "utf-8").decode("unicode_escape")
+            if packed:
+                if any(ord(c) > 0xFF for c in processed):
+                    sys.exit(f" packed string {tokens[i + 1]} has characters above 255")
+                items.append(processed.encode("latin-1"))
+                return items, j + 1, string_index + 1
+            items.append(processed)
+            string_index += 1
+            j += 1
+        elif is_number(v):
+            items.append(to_int(v))
+            j += 1
+        else:
+            break
+    return items, j, string_index
+
+
+def var_values(items) -> list[int]:
+    """Data words of `var` items: a number is a word, a string a word per character and a zero word.
+
+    >>> var_values([7, "hi"]), var_values([b"hi"])
+    ([7, 104, 105, 0], [26984])
+    """
+    values = []
+    for item in items:
+        if isinstance(item, int):
+            values.append(item)
+        elif isinstance(item, bytes):
+            values.extend(pack_string(item))
+        else:
+            values.extend(ord(c) for c in item)
+            values.append(0)
+    return values
+
+
+def string_hosts(literals) -> dict:
+    """The packed string each literal is stored in: the longest literal ending with it.
+
+    >>> string_hosts([b"world", b"hello world", b"ld", b"world"])
+    {b'world': b'hello world', b'hello world': b'hello world', b'ld': b'hello world'}
+    """
+    hosts = {}  # every suffix -> the longest (then first) literal ending with it
+    for host in sorted(dict.fromkeys(literals), key=len, reverse=True):
+        for start in range(len(host) + 1):
+            hosts.setdefault(host[start:], host)
+    return {literal: hosts[literal] for literal in literals}
+
+
 def first_stage(text: str):
+    """Parse assembly into instructions with unresolved arguments, labels and the data image.
+
+    Packed strings are read-only (there is no byte store): equal ones are
+    stored once, and one that ends another points into it. Other `var`s may be
+    written and always get storage of their own. For every data label `&name`
+    is its byte address, as used by `c@` and `outps`.
+    """
     labels: dict[str, int] = {}
-    data_words: list[str] = []
+    data_words: list[int] = []
     instrs_tmp: list[ParsInstr] = []
     current_data_addr = 0
     tokens, strings = tokenize(text)
-    i = 0
-    string_index = 0
     len_tokens = len(tokens)
+    literals = []
+    i = string_index = 0
+    while i < len_tokens:
+        if tokens[i] == "var" and i + 2 < len_tokens:
+            items, i, string_index = parse_var(tokens, i, strings, string_index)
+            if len(items) == 1 and isinstance(items[0], bytes):
+                literals.append(items[0])
+        else:
+            i += 1
+    hosts = string_hosts(literals)
+    placed = {}  # host string -> data address
+    i = string_index = 0
     while i < len_tokens:
         token = tokens[i]
 
         if token == "var":
             if i + 2 >= len_tokens:
-                sys.exit("syntax: var <name> <numbers>|<string>")
+                sys.exit("syntax: var <name> <numbers>|<string>|packed <string>")
             name = tokens[i + 1]
             if name in labels:
                 sys.exit(f"duplicate symbol {name}")
-            values = []
-            j = i + 2
-            while j < len_tokens:
-                v = tokens[j]
-                if v == "*":
-                    if string_index >= len(strings):
-                        sys.exit(" string index out of range")
-                    raw = strings[string_index]
-                    processed = bytes(raw, "utf-8").decode("unicode_escape")
-                    values.extend(ord(c) for c in processed)
-                    values.append(0)
-                    string_index += 1
-                    j += 1
-                elif is_number(v):
-                    values.append(to_int(v))
-                    j += 1
-                else:
-                    break
-            if not values:
+            items, i, string_index = parse_var(tokens, i, strings, string_index)
+            if not items:
                 sys.exit(f" var {name} must have at least one value")
-            labels[name] = current_data_addr
-            data_words.extend(values)
-            current_data_addr += len(values)
-            i = j
+            if len(items) == 1 and isinstance(items[0], bytes):
+                literal = items[0]
+                host = hosts[literal]
+                if host not in placed:
+                    placed[host] = current_data_addr
+                    data_words.extend(var_values([host]))
+                    current_data_addr = len(data_words)
+                byte_address = 4 * placed[host] + len(host) - len(literal)
+                labels[name], labels[f"&{name}"] = byte_address // 4, byte_address
+                continue
+            labels[name], labels[f"&{name}"] = current_data_addr, 4 * current_data_addr
+            data_words.extend(var_values(items))
+            current_data_addr = len(data_words)
             continue
 
         if token.endswith(":"):
@@ -354,15 +671,20 @@ def first_stage(text: str):
             if i >= len_tokens:
                 sys.exit("input expects literal/label")
             arg_tok = tokens[i]
-            if not is_number(arg_tok) or int(arg_tok) != 0:
-                sys.exit(f"IN only supports port 0 (default input device). You wrote IN {arg_tok}")
+            if not is_number(arg_tok) or to_int(arg_tok) not in (0, INPUT_STATUS_PORT):
+                sys.exit(f"IN only supports port 0 (input data) and port 1 (input status). You wrote IN {arg_tok}")
             i += 1
-        elif opcode == Opcode.OUT:
+        elif opcode in PORT_OPCODES:
             if i >= len_tokens:
-                sys.exit("output expects literal/label")
+                sys.exit(f"{opcode} expects a port number")
+            arg_tok = tokens[i]
+            if not is_number(arg_tok) or not (1 <= to_int(arg_tok) <= 7):
+                sys.exit(f"{opcode.name} only supports port [1-7] (output devices). You wrote {opcode} {arg_tok}")
+            i += 1
+        elif opcode in ARG_OPCODES:
+            if i >= len_tokens:
+                sys.exit(f"{opcode} expects literal/label")
             arg_tok = tokens[i]
-            if not is_number(arg_tok) or not (1 <= int(arg_tok) <= 7):
-                sys.exit(f"OUT only supports port [1-7] (default input device). You wrote IN {arg_tok}")
             i += 1
 
         instrs_tmp.append(ParsInstr(opcode, arg_tok))
@@ -381,13 +703,11 @@ def second_stage(instrs_tmp: list[ParsInstr], labels: dict[str, int]):
     final_instrs: list[dict] = []
     pc = 0
     for ins in instrs_tmp:
-        if ins.opcode == Opcode.LIT:
+        if ins.opcode in PORT_OPCODES:
+            final_instrs.append({"index": pc, "opcode": ins.opcode, "arg": to_int(ins.argument)})
+        elif ins.opcode in ARG_OPCODES:
             arg_val = resolve_arg(ins.argument, labels)
-            final_instrs.append({"index": pc, "opcode": Opcode.LIT, "arg": arg_val})
-        elif ins.opcode in Opcode.IN:
-            final_instrs.append({"index": pc, "opcode": Opcode.IN, "arg": to_int(ins.argument)})
-        elif ins.opcode == Opcode.OUT:
-            final_instrs.append({"index": pc, "opcode": Opcode.OUT, "arg": to_int(ins.argument)})
+            final_instrs.append({"index": pc, "opcode": ins.opcode, "arg": arg_val})
         else:
             final_instrs.append({"index": pc, "opcode": ins.opcode})
         pc += 1
@@ -402,9 +722,9 @@ def check_interrupt_handler(instrs_tmp: list[ParsInstr], labels: dict[str, int])
     if interrupt_label not in labels:
         sys.exit("EINT встречается, но метка interrupt_handler не объявлена")
     start = labels[interrupt_label]
-    end = min((i for i in labels.values() if i > start), default=len(instrs_tmp))
-    handler_instructions = instrs_tmp[start:end]
-    if not any(ins.opcode == Opcode.IRET for ins in handler_instructions):
+    # the handler body may contain its own branch labels, so it ends at the first iret (or ret of the next word)
+    body_end = next((ins.opcode for ins in instrs_tmp[start:] if ins.opcode in (Opcode.IRET, Opcode.RET)), None)
+    if body_end != Opcode.IRET:
         sys.exit("Обработчик прерывания не завершается IRET")
     return True, start
 
@@ -416,10 +736,176 @@ def assemble(source: str):
     return instructions, data_words, intr_enabled, handler_addr
 
 
-def main(source, code_file, data_file):
+def exported_symbols(forth_text: str) -> set[str]:
+    tokens, _ = tokenize(forth_text)
+    return {tokens[i + 1] for i, tok in enumerate(tokens[:-1]) if tok in (":", "var", "str", "pstr", "array")}
+
+
+def packed_symbols(forth_text: str) -> set[str]:
+    tokens, _ = tokenize(forth_text)
+    return {tokens[i + 1] for i, tok in enumerate(tokens[:-1]) if tok == "pstr"}
+
+
+def data_symbols(asm_text: str) -> set[str]:
+    tokens, _ = tokenize(asm_text)
+    return {tokens[i + 1] for i, tok in enumerate(tokens[:-1]) if tok == "var"}
+
+
+def program_symbols(forth_text: str, asm_text: str, labels: dict[str, int]) -> dict:
+    data_labels = data_symbols(asm_text)
+    return {
+        name: {"section": "data" if name in data_labels else "code", "value": labels[name]}
+        for name in sorted(exported_symbols(forth_text))
+        if name in labels
+    }
+
+
+def source_map(forth_text: str, instrs_tmp: list[ParsInstr], labels: dict[str, int]) -> list[dict]:
+    """Instruction ranges [start, end) of the words that survived translation, with their source lines."""
+    entries = []
+    lines = []
+    tokens, _ = tokenize(forth_text, lines)
+    for pos, tok in enumerate(tokens[:-1]):
+        word = tokens[pos + 1]
+        if tok != ":" or word not in labels:
+            continue
+        start = labels[word]
+        if f"{word}_end" in labels:
+            end = labels[f"{word}_end"] + 1  # the label marks the trailing ret
+        else:
+            end = next(pc for pc in range(start, len(instrs_tmp)) if instrs_tmp[pc].opcode == Opcode.IRET) + 1
+        entries.append({"word": word, "line": lines[pos], "start": start, "end": end})
+    return sorted(entries, key=lambda entry: entry["start"])
+
+
+def hot_then_branches(forth_text: str, retired_pc: dict[int, int], digest: str | None = None) -> set[int]:
+    """`if ... else` numbers whose then-branch ran more often than the else-branch.
+
+    `retired_pc` is the per-PC profile (PerfCounters.retired_pc) of a training
+    run of the same source translated without a profile; `digest` is the
+    program digest recorded with it.
+    """
+    instrs_tmp, labels, _ = first_stage(forth_to_assemble(forth_text))
+    if digest is not None and digest != program_digest(second_stage(instrs_tmp, labels)):
+        sys.exit("profile was recorded for a different program")
+    outside = [pc for pc in retired_pc if not 0 <= pc < len(instrs_tmp)]
+    if outside:
+        sys.exit(f"profile counts pc {outside[0]} outside the program ({len(instrs_tmp)} instructions)")
+    jumps_over = {ins.argument for ins in instrs_tmp if ins.opcode == Opcode.LIT}
+    hot = set()
+    for pc, ins in enumerate(instrs_tmp):
+        if ins.opcode not in (Opcode.BEQ, Opcode.BLT) or not ins.argument.startswith("else_"):
+            continue
+        uid = int(ins.argument.removeprefix("else_"))
+        then_count = retired_pc.get(pc + 1, 0)  # the first instruction of the then-branch
+        if f"end_{uid}" in jumps_over and then_count > retired_pc.get(pc, 0) - then_count:
+            hot.add(uid)
+    return hot
+
+
+def read_profile(filename) -> tuple[dict[int, int], str]:
+    """Per-PC retired instructions and the program digest from a PerfCounters JSON file."""
+    with open(filename, encoding="utf-8") as file:
+        stats = json.load(file)
+    if stats.get("program") is None:
+        sys.exit(f"profile {filename} does not say which program it was recorded for")
+    return {int(pc): n for pc, n in stats["retired_pc"].items()}, stats["program"]
+
+
+def profiled_assemble(forth_text: str, profile=None) -> str:
+    if profile is None:
+        return forth_to_assemble(forth_text)
+    return forth_to_assemble(forth_text, flip_ifs=hot_then_branches(forth_text, *read_profile(profile)))
+
+
+def compile_object(forth_text: str) -> dict:
+    """Translate one module into a relocatable object.
+
+    Arguments referring to the module's own labels are stored as section offsets
+    with a relocation record; unknown labels become imports resolved by the linker.
+    A packed string `name` also exports `&name`, its byte offset in the data section.
+    """
+    asm_text = forth_to_assemble(forth_text, eliminate_dead=False)
+    instrs_tmp, labels, data_words = first_stage(asm_text)
+    data_labels = data_symbols(asm_text)
+    code = []
+    relocations = []
+    imports = set()
+    for pc, ins in enumerate(instrs_tmp):
+        entry = {"opcode": ins.opcode.value}
+        if ins.opcode in PORT_OPCODES:
+            entry["arg"] = to_int(ins.argument)
+        elif ins.opcode in ARG_OPCODES:
+            if is_number(ins.argument):
+                entry["arg"] = to_int(ins.argument)
+            elif ins.argument in labels:
+                entry["arg"] = labels[ins.argument]
+                if ins.argument.startswith("&"):  # byte address of a data label
+                    relocations.append({"offset": pc, "section": "data", "scale": 4})
+                else:
+                    section = "data" if ins.argument in data_labels else "code"
+                    relocations.append({"offset": pc, "section": section})
+            else:
+                entry["arg"] = 0
+                relocations.append({"offset": pc, "symbol": ins.argument})
+                imports.add(ins.argument)
+        code.append(entry)
+    symbols = program_symbols(forth_text, asm_text, labels)
+    for name in packed_symbols(forth_text) & symbols.keys():
+        symbols[f"&{name}"] = {"section": "data", "value": labels[f"&{name}"], "scale": 4}
+    return {
+        "format": OBJECT_FORMAT,
+        "version": OBJECT_VERSION,
+        "code": code,
+        "data": data_words,
+        "symbols": symbols,
+        "imports": sorted(imports),
+        "relocations": relocations,
+        "interrupts": any(ins.opcode == Opcode.EINT for ins in instrs_tmp),
+    }
+
+
+def write_object(filename, obj):
+    with open(filename, "w", encoding="utf-8") as file:
+        json.dump(obj, file)
+
+
+def main_object(source, object_file):
+    forth_text = Path(source).read_text(encoding="utf-8")
+    obj = compile_object(forth_text)
+    os.makedirs(os.path.dirname(os.path.abspath(object_file)) or ".", exist_ok=True)
+    write_object(object_file, obj)
+    print("source LoC:", len(forth_text.split("\n")), "code instr:", len(obj["code"]))
+
+
+def main_container(source, container_file, compress=False, verify=True, profile=None):
+    forth_text = Path(source).read_text(encoding="utf-8")
+    asm_text = profiled_assemble(forth_text, profile)
+    instrs_tmp, labels, data_words = first_stage(asm_text)
+    intr, addr_handler = check_interrupt_handler(instrs_tmp, labels)
+    instructions = second_stage(instrs_tmp, labels)
+    smap = source_map(forth_text, instrs_tmp, labels)
+    if verify:
+        verifier.verify(instructions, addr_handler, smap)
+    os.makedirs(os.path.dirname(os.path.abspath(container_file)) or ".", exist_ok=True)
+    write_container(
+        container_file,
+        instructions,
+        data_words,
+        intr,
+        addr_handler,
+        program_symbols(forth_text, asm_text, labels),
+        smap,
+        compress,
+        verify,
+    )
+    print("source LoC:", len(forth_text.split("\n")), "code instr:", len(instructions))
+
+
+def main(source, code_file, data_file, profile=None):
     forth_path = Path(source)
     forth_text = forth_path.read_text(encoding="utf-8")
-    asm_text = forth_to_assemble(forth_text)
+    asm_text = profiled_assemble(forth_text, profile)
     instructions, data_words, intr, addr_handler = assemble(asm_text)
 
     os.makedirs(os.path.dirname(os.path.abspath(code_file)) or ".", exist_ok=True)
@@ -434,8 +920,22 @@ def main(source, code_file, data_file):
 
 
 if __name__ == "__main__":
-    assert (
-        len(sys.argv) == 4
-    ), "Wrong arguments: translator.py <input_file> <target_instructions_file> <target_data_file>"
-    _, source, target_instructions_file, target_data_file = sys.argv
-    main(source, target_instructions_file, target_data_file)
+    if len(sys.argv) == 4 and sys.argv[1] == "-c":
+        _, _, source, target_object_file = sys.argv
+        main_object(source, target_object_file)
+        sys.exit(0)
+    flags = {arg for arg in sys.argv[1:] if arg in ("-z", "-u")}
+    profiles = [arg.removeprefix("--profile=") for arg in sys.argv[1:] if arg.startswith("--profile=")]
+    positional = [arg for arg in sys.argv[1:] if arg not in flags and not arg.startswith("--profile=")]
+    profile = profiles[-1] if profiles else None
+    if len(positional) == 2:
+        main_container(*positional, compress="-z" in flags, verify="-u" not in flags, profile=profile)
+        sys.exit(0)
+    usage = (
+        "Wrong arguments: translator.py <input_file> <target_instructions_file> <target_data_file> [--profile=<file>]"
+        " | translator.py [-z] [-u] <input_file> <target_container_file> [--profile=<file>]"
+    )
+    assert len(positional) == 3, usage
+    assert not flags, usage
+    source, target_instructions_file, target_data_file = positional
+    main(source, target_instructions_file, target_data_file, profile)
@@ -0,0 +1,224 @@
+"""Stack-effect verification of a translated program.
+
+Every procedure (main, the interrupt handler and every called word) is
+interpreted abstractly over its control-flow graph with the data stack depth
+and the loop stack depth relative to its entry. Both must agree wherever
+paths meet (so every loop and every if/else branch is stack-neutral), and all
+returns of a word must leave the same depth. This gives each word an effect
+(items taken, net change) and its peak use of the three stacks. The program
+is accepted when main, with the interrupt handler entered at its deepest
+point, stays within the capacities of the machine.
+
+A verified image cannot underflow or overflow the stacks, so the machine
+may run it without the run-time stack checks (machine.UncheckedDataPath and
+machine.UncheckedControlUnit).
+"""
+
+from __future__ import annotations
+
+import sys
+
+from src.analyzer import literal_before
+from src.isa import BRANCH_OPCODES, Opcode, instruction_to_mnemonic
+from src.machine import BINARY_ALU_OPCODES, CALL_STACK_CAPACITY, DATA_STACK_CAPACITY, LOOP_STACK_CAPACITY
+
+# opcode -> (items taken, net change of the data stack depth)
+STACK_EFFECTS = {
+    Opcode.NOP: (0, 0),
+    Opcode.LIT: (0, 1),
+    Opcode.IN: (0, 1),
+    Opcode.LOAD_ABS: (0, 1),
+    Opcode.INDEX: (0, 1),
+    Opcode.DUP: (1, 1),
+    Opcode.LOAD: (1, 0),
+    Opcode.LOADB: (1, 0),
+    Opcode.INC: (1, 0),
+    Opcode.DEC: (1, 0),
+    Opcode.NOT: (1, 0),
+    Opcode.DROP: (1, -1),
+    Opcode.OUT: (1, -1),
+    Opcode.OUTS: (1, -1),
+    Opcode.OUTPS: (1, -1),
+    Opcode.STORE_ABS: (1, -1),
+    Opcode.JUMP: (1, -1),
+    Opcode.CALL: (1, -1),
+    Opcode.SWAP: (2, 0),
+    Opcode.STORE: (2, -2),
+    Opcode.OUTB: (2, -2),
+    Opcode.JZ: (2, -2),
+    Opcode.JN: (2, -2),
+    Opcode.DO: (2, -2),
+    **dict.fromkeys(BINARY_ALU_OPCODES, (2, -1)),
+    **dict.fromkeys(BRANCH_OPCODES, (2, -2)),
+    **dict.fromkeys((Opcode.LOOP, Opcode.RET, Opcode.IRET, Opcode.EINT, Opcode.DINT, Opcode.HALT, Opcode.WAIT), (0, 0)),
+}
+
+
+class Effect:
+    def __init__(self, taken, change, data_peak, call_peak, loop_peak, at):
+        self.taken = taken  # items the word needs on entry
+        self.change = change  # net depth change, None if the word never returns
+        self.data_peak = data_peak  # deepest point relative to the entry depth
+        self.call_peak = call_peak  # return addresses pushed, including its own callees
+        self.loop_peak = loop_peak
+        self.at = at  # "taken"/"data"/"call"/"loop" -> pc where the extreme is reached
+
+    def __repr__(self):
+        return f"( {self.taken} -- {self.change} ) peak {self.data_peak}/{self.call_peak}/{self.loop_peak}"
+
+
+class Verifier:
+    def __init__(self, program, handler_addr=None, source_map=None):
+        self.program = program
+        self.handler_addr = handler_addr if handler_addr is not None and handler_addr < len(program) else None
+        self.source_map = source_map or []
+        self.entries = {0}
+        self.entries.update(
+            literal_before(program, pc) for pc, ins in enumerate(program) if ins["opcode"] == Opcode.CALL
+        )
+        self.entries.update(entry["start"] for entry in self.source_map)
+        if self.handler_addr is not None:
+            self.entries.add(self.handler_addr)
+        self.entries.discard(None)
+        self.effects = {}
+        self.in_progress = set()
+
+    def location(self, pc):
+        word = next((e for e in self.source_map if e["start"] <= pc < e["end"]), None)
+        where = f"word {word['word']} (line {word['line']})" if word else "main program"
+        return f"{where}, pc {pc} `{instruction_to_mnemonic(self.program[pc])}`"
+
+    def fail(self, pc, message):
+        sys.exit(f"stack verification failed in {self.location(pc)}: {message}")
+
+    def target(self, pc):
+        target = literal_before(self.program, pc)
+        if target is None or not 0 <= target < len(self.program):
+            self.fail(pc, "computed jump target")
+        return target
+
+    def effect(self, entry):
+        if entry in self.effects:
+            return self.effects[entry]
+        if entry in self.in_progress:
+            self.fail(entry, "recursive call (the stack depth cannot be bounded)")
+        self.in_progress.add(entry)
+        try:
+            self.effects[entry] = self.interpret(entry)
+        finally:
+            self.in_progress.discard(entry)
+        return self.effects[entry]
+
+    def interpret(self, entry):
+        states = {entry: (0, 0)}  # pc -> (data depth, loop depth) before it
+        todo = [entry]
+        low = peak = loop_peak = call_peak = 0
+        at = dict.fromkeys(("taken", "data", "call", "loop"), entry)
+        exits = set()
+
+        def flow(pc, succ, state):
+            if not 0 <= succ < len(self.program):
+                self.fail(pc, f"control runs off the program to pc {succ}")
+            if succ not in states:
+                states[succ] = state
+                todo.append(succ)
+            elif states[succ] != state:
+                depth, loops = states[succ]
+                self.fail(
+                    succ, f"paths meet with stack depths {depth} and {state[0]} (loop depths {loops}, {state[1]})"
+                )
+
+        while todo:
+            pc = todo.pop()
+            depth, loops = states[pc]
+            ins = self.program[pc]
+            opcode = ins["opcode"]
+            taken, change = STACK_EFFECTS[opcode]
+            if depth - taken < low:
+                low, at["taken"] = depth - taken, pc
+            depth += change
+            if depth > peak:
+                peak, at["data"] = depth, pc
+            if opcode == Opcode.INDEX and loops == 0:
+                self.fail(pc, "loop index used outside of do ... loop")
+            if opcode == Opcode.HALT:
+                continue
+            if opcode in (Opcode.RET, Opcode.IRET):
+                exits.add((pc, depth, loops))
+                continue
+            if opcode in (Opcode.CALL, Opcode.JUMP):
+                target = self.target(pc)
+                if opcode == Opcode.JUMP and (target not in self.entries or target == entry):
+                    flow(pc, target, (depth, loops))
+                    continue
+                callee = self.effect(target)
+                if depth - callee.taken < low:
+                    low, at["taken"] = depth - callee.taken, pc
+                if depth + callee.data_peak > peak:
+                    peak, at["data"] = depth + callee.data_peak, pc
+                if loops + callee.loop_peak > loop_peak:
+                    loop_peak, at["loop"] = loops + callee.loop_peak, pc
+                if callee.call_peak + (opcode == Opcode.CALL) > call_peak:
+                    call_peak, at["call"] = callee.call_peak + (opcode == Opcode.CALL), pc
+                if callee.change is None:
+                    continue
+                depth += callee.change
+                if opcode == Opcode.JUMP:  # tail call: the callee returns for us
+                    exits.add((pc, depth, loops))
+                else:
+                    flow(pc, pc + 1, (depth, loops))
+                continue
+            if opcode == Opcode.DO:
+                if loops + 1 > loop_peak:
+                    loop_peak, at["loop"] = loops + 1, pc
+                flow(pc, pc + 1, (depth, loops + 1))
+                flow(pc, ins["arg"], (depth, loops))
+                continue
+            if opcode == Opcode.LOOP:
+                if loops == 0:
+                    self.fail(pc, "loop without do")
+                flow(pc, ins["arg"], (depth, loops))
+                flow(pc, pc + 1, (depth, loops - 1))
+                continue
+            if opcode in (Opcode.JZ, Opcode.JN):
+                self.fail(pc, "computed jump target")
+            if opcode in BRANCH_OPCODES:
+                flow(pc, ins["arg"], (depth, loops))
+            flow(pc, pc + 1, (depth, loops))
+
+        if len({(depth, loops) for _, depth, loops in exits}) > 1:
+            (pc_a, depth_a, _), (pc_b, depth_b, _) = sorted(exits)[:2]
+            self.fail(pc_b, f"returns with stack depth {depth_b}, but pc {pc_a} returns with {depth_a}")
+        change = None
+        if exits:
+            pc, change, loops = next(iter(exits))
+            if loops != 0:
+                self.fail(pc, "returns from inside a do ... loop")
+        return Effect(-low, change, peak, call_peak, loop_peak, at)
+
+    def verify(self):
+        """Effects of every procedure; exit with the failing location if the program can break its stacks."""
+        for entry in sorted(self.entries):
+            self.effect(entry)
+        main = self.effects[0]
+        if main.taken:
+            self.fail(main.at["taken"], f"takes {main.taken} item(s) more than the stack holds")
+        handler = None
+        if self.handler_addr is not None:
+            handler = self.effects[self.handler_addr]
+            if handler.change not in (0, None) or handler.taken:
+                self.fail(self.handler_addr, f"interrupt handler must leave the stack as it was, effect {handler}")
+        for name, kind, capacity in (
+            ("data stack", "data", DATA_STACK_CAPACITY),
+            ("call stack", "call", CALL_STACK_CAPACITY),
+            ("loop stack", "loop", LOOP_STACK_CAPACITY),
+        ):
+            used = getattr(main, f"{kind}_peak") + (getattr(handler, f"{kind}_peak") if handler else 0)
+            if used > capacity:
+                where = "" if handler is None else " with the interrupt handler on top"
+                self.fail(main.at[kind], f"{name} may hold {used} entries{where}, capacity is {capacity}")
+        return self.effects
+
+
+def verify(program, handler_addr=None, source_map=None):
+    return Verifier(program, handler_addr, source_map).verify()
@@ -0,0 +1,48 @@
+import pytest
+from src import analyzer, machine, translator
+
+
+def translate(text):
+    asm = translator.forth_to_assemble(text)
+    instrs_tmp, labels, data = translator.first_stage(asm)
+    _, handler_addr = translator.check_interrupt_handler(instrs_tmp, labels)
+    code = translator.second_stage(instrs_tmp, labels)
+    return code, data, handler_addr, translator.program_symbols(text, asm, labels)
+
+
+def test_estimate_is_exact_with_tight_bounds():
+    with open("examples/prob2_do.fs", encoding="utf-8") as file:
+        code, data, handler_addr, symbols = translate(file.read())
+    report = analyzer.Analyzer(code, data, handler_addr, symbols, {"print": 9, "int_to_digits": 9}).report()
+    costs = {row["name"]: (row["best"], row["worst"]) for row in report}
+    assert costs["sum"] == (712, 712)  # lit, lit, do, 101 iterations of 7 ticks, ret
+    assert costs["main"][1] == machine.simulation(code, data, 200, handler_addr, {}, 10000)[1]
+
+
+def test_unbounded_loops_and_tail_recursion():
+    text = "var acc\n: down\n    dup 0 != if\n        dup acc @ + acc !\n        dec down\n    else\n        drop\n    then\n;\n30 down\nhalt\n"
+    code, data, handler_addr, symbols = translate(text)
+    [row] = [row for row in analyzer.Analyzer(code, data, handler_addr, symbols).report() if row["name"] == "down"]
+    assert row["error"] == f"loop at pc {symbols['down']['value']} in down needs a bound"
+    bounded = analyzer.Analyzer(code, data, handler_addr, symbols, {"down": 31})
+    assert bounded.cost(0)[1] >= machine.simulation(code, data, 200, handler_addr, {}, 10000)[1]
+    with pytest.raises(SystemExit, match="unknown word"):
+        analyzer.Analyzer(code, data, handler_addr, symbols, {"up": 1})
+
+
+def test_schedule_check():
+    with open("examples/cat.fs", encoding="utf-8") as file:
+        code, data, handler_addr, symbols = translate(file.read())
+    cat = analyzer.Analyzer(code, data, handler_addr, symbols, {"cat": 60})
+    assert cat.interrupt_latency() == 1 + 1 + cat.cost(handler_addr)[1]
+    assert cat.check({30: [0, 72], 90: [0, 73], 160: [0, 0]}, 10000) == []
+    problems = cat.check({30: [0, 72], 35: [0, 73], 160: [0, 0]}, 1000)
+    assert problems[0] == "input at tick 35 comes 5 ticks after the previous one, handler latency is 10"
+    assert problems[1].startswith("worst case")
+
+
+def test_wait_without_input_is_unbounded():
+    code, data, handler_addr, symbols = translate("eint\nwait\nhalt\n: interrupt_handler\n;\n")
+    waiter = analyzer.Analyzer(code, data, handler_addr, symbols)
+    assert waiter.check({}, 10000) == ["wait is unbounded: the schedule has no input to wake it"]
+    assert waiter.check({300: [0, 0]}, 10000) == []
@@ -0,0 +1,137 @@
+import asyncio
+
+from src import async_machine, translator
+
+ECHO = """
+var buffer
+var ready
+: interrupt_handler
+    in 0 buffer !
+    1 ready !
+;
+eint
+begin
+    ready @ 0 != if
+        buffer @ 0 != if
+            buffer @ out 1
+            0 ready !
+        else
+            exit
+        then
+    then
+again
+halt
+"""
+
+ECHO_WAIT = """
+var buffer
+var ready
+: interrupt_handler
+    in 0 buffer !
+    1 ready !
+;
+eint
+begin
+    ready @ 0 != if
+        buffer @ 0 != if
+            buffer @ out 1
+            0 ready !
+        else
+            exit
+        then
+    else
+        wait
+    then
+again
+halt
+"""
+
+PRINT = """
+str w "ok"
+: print_str
+    begin
+        dup @
+        dup 0 != if
+            out 1
+            inc
+        else
+            drop
+            exit
+        then
+    again
+;
+w print_str
+halt
+"""
+
+
+class Sink:
+    def __init__(self):
+        self.chunks = []
+        self.drains = 0
+
+    def write(self, data):
+        self.chunks.append(data)
+
+    async def drain(self):
+        self.drains += 1
+        await asyncio.sleep(0)
+
+
+def echo_machine(text, sink):
+    instructions, data, _, handler_addr = translator.assemble(translator.forth_to_assemble(ECHO))
+    source = asyncio.StreamReader()
+    source.feed_data(text.encode())
+    source.feed_eof()
+    return async_machine.AsyncMachine(instructions, data, handler_addr, source, sink, slice_ticks=50, limit=100000)
+
+
+def test_async_machines_share_one_event_loop():
+    async def main():
+        sinks = [Sink(), Sink()]
+        machines = [echo_machine("first", sinks[0]), echo_machine("second", sinks[1])]
+        results = await asyncio.gather(*(machine.run() for machine in machines))
+        return results, sinks
+
+    results, sinks = asyncio.run(main())
+    # streamed output is not also kept in memory
+    assert [output for output, _ in results] == ["", ""]
+    assert [b"".join(sink.chunks) for sink in sinks] == [b"first", b"second"]
+    assert all(sink.drains > 0 for sink in sinks)
+
+
+def test_async_machine_without_input_runs_to_halt():
+    instructions, data, _, _ = translator.assemble(translator.forth_to_assemble(PRINT))
+    output, ticks = asyncio.run(async_machine.AsyncMachine(instructions, data, None).run())
+    assert output == "ok"
+    assert ticks > 0
+
+
+def test_async_machine_fault_ends_only_its_session():
+    instructions, data, _, handler_addr = translator.assemble(translator.forth_to_assemble("in 0 out 1 halt"))
+    machine = async_machine.AsyncMachine(instructions, data, handler_addr)
+    output, _ = asyncio.run(machine.run())
+    assert output == ""
+    assert machine.fault.startswith("IndexError")
+
+
+def test_waiting_machine_sleeps_until_input_arrives():
+    async def main():
+        instructions, data, _, handler_addr = translator.assemble(translator.forth_to_assemble(ECHO_WAIT))
+        source = asyncio.StreamReader()
+        machine = async_machine.AsyncMachine(instructions, data, handler_addr, source, slice_ticks=50)
+        run = asyncio.create_task(machine.run())
+        for _ in range(10):
+            await asyncio.sleep(0)
+        ticks = machine.control_unit.current_tick()
+        for _ in range(10):
+            await asyncio.sleep(0)
+        assert machine.starved()
+        assert machine.control_unit.current_tick() == ticks
+        source.feed_data(b"hi")
+        source.feed_eof()
+        return await run
+
+    output, ticks = asyncio.run(main())
+    assert output == "hi"
+    assert ticks < 1000
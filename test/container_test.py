@@ -0,0 +1,67 @@
+import contextlib
+import io
+
+import pytest
+from src import container, machine, translator
+
+
+def translate(tmp_path, source, *flags):
+    target = tmp_path / "program.csa"
+    with contextlib.redirect_stdout(io.StringIO()):
+        translator.main_container(source, str(target), *flags)
+    return target
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_container_runs_like_separate_images(tmp_path, compress):
+    (tmp_path / "input.txt").write_text("30 0 H\n90 0 I\n160 0 \\0\n")
+    target = translate(tmp_path, "examples/cat.fs", compress)
+    code, data = tmp_path / "code.bin", tmp_path / "data.bin"
+    with contextlib.redirect_stdout(io.StringIO()):
+        translator.main("examples/cat.fs", str(code), str(data))
+    with contextlib.redirect_stdout(io.StringIO()) as stdout:
+        machine.main_container(str(target), str(tmp_path / "input.txt"))
+    assert stdout.getvalue() == "output_buffer:HI\nticks: 187\n"
+    with container.Container(target) as image:
+        assert image.code_listing() == (tmp_path / "code.bin.hex").read_text()
+        assert image.data_listing() == (tmp_path / "data.bin.hex").read_text()
+        assert image.symbols["interrupt_handler"] == {"section": "code", "value": image.code[1]}
+        assert image.symbols["buffer"]["section"] == "data"
+        assert [(entry["word"], entry["line"]) for entry in image.source_map] == [("cat", 3), ("interrupt_handler", 18)]
+
+
+def test_sections_are_decoded_lazily_and_checked(tmp_path):
+    target = translate(tmp_path, "examples/sort.fs")
+    with container.Container(target) as image:
+        assert image.code[0]
+        assert "symbols" not in vars(image)
+    corrupt = bytearray(target.read_bytes())
+    with container.Container(target) as image:
+        offset = image.sections[container.SYMBOLS][0]
+    corrupt[offset] ^= 0xFF
+    target.write_bytes(bytes(corrupt))
+    with container.Container(target) as image:
+        assert image.data is not None
+        with pytest.raises(AssertionError, match="SYMS section checksum"):
+            _ = image.symbols
+    target.write_bytes(b"CSA1" + bytes(corrupt[4:12]) + b"\xff" + bytes(corrupt[13:]))
+    with pytest.raises(AssertionError, match="header checksum"):
+        container.Container(target)
+
+
+def test_bad_containers_are_rejected_and_unmapped(tmp_path, monkeypatch):
+    target = translate(tmp_path, "examples/sort.fs")
+    good = target.read_bytes()
+    for image in (b"", good[:10]):
+        target.write_bytes(image)
+        with pytest.raises(AssertionError, match="truncated container"):
+            container.Container(target)
+    maps = []
+    real_mmap = container.mmap.mmap
+    monkeypatch.setattr(
+        container.mmap, "mmap", lambda *args, **kwargs: maps.append(real_mmap(*args, **kwargs)) or maps[-1]
+    )
+    target.write_bytes(b"XXXX" + good[4:])
+    with pytest.raises(AssertionError, match="not a container"):
+        container.Container(target)
+    assert maps[0].closed
@@ -0,0 +1,58 @@
+import json
+from pathlib import Path
+
+from src import machine, translator
+from src.counters import PerfCounters
+from src.isa import Opcode
+
+EXAMPLES = Path(__file__).resolve().parent.parent / "examples"
+SCHEDULE = {30: [0, ord("H")], 90: [0, ord("I")], 160: [0, 0]}
+
+
+def assemble_cat():
+    with open(EXAMPLES / "cat.fs", encoding="utf-8") as file:
+        return translator.assemble(translator.forth_to_assemble(file.read()))
+
+
+def run(counters=None):
+    instructions, data, _, handler_addr = assemble_cat()
+    return machine.simulation(instructions, data, 200, handler_addr, SCHEDULE, 10000, counters)
+
+
+def test_counters_do_not_change_the_run():
+    counters = PerfCounters()
+    assert run(counters) == run()
+    _, ticks = run()
+    assert counters.ticks == ticks
+    assert sum(counters.opcode_ticks.values()) + counters.interrupts == ticks
+    assert counters.interrupts == 3
+    assert counters.retired[Opcode.IRET] == 3
+    assert counters.retired[Opcode.OUT] == 2
+    assert counters.memory_writes[0] >= 1
+    assert 0 < counters.data_stack_high_water <= 25
+    assert counters.call_stack_high_water == 1
+
+
+def test_counters_export(tmp_path):
+    counters = PerfCounters(tmp_path / "run.json", tmp_path / "run.prom", export_every=50)
+    _, ticks = run(counters)
+    stats = json.loads((tmp_path / "run.json").read_text())
+    assert stats["ticks"] == ticks
+    assert stats["retired"]["iret"] == 3
+    prom = (tmp_path / "run.prom").read_text()
+    assert f"csa_ticks_total {ticks}\n" in prom
+    assert 'csa_instructions_retired_total{opcode="out"} 2\n' in prom
+
+
+def test_interrupt_latency_and_dropped_inputs():
+    counters = PerfCounters()
+    run(counters)
+    assert sum(counters.input_latency.values()) == 3
+    assert counters.service_ticks == {9: 3}  # entry to iret of the cat handler
+    assert (counters.dropped_inputs, counters.nested_interrupts) == (0, 0)
+    instructions, data, _, handler_addr = assemble_cat()
+    counters = PerfCounters()
+    schedule = {1: [0, ord("H")], 90: [0, ord("I")], 160: [0, 0]}  # before eint
+    assert machine.simulation(instructions, data, 200, handler_addr, schedule, 10000, counters)[0] == "I"
+    assert counters.dropped_inputs == 1
+    assert counters.to_dict()["dropped_inputs"] == 1
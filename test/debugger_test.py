@@ -0,0 +1,69 @@
+import contextlib
+import io
+
+from src import container, debugger, machine, translator
+
+SCHEDULE = {30: [0, ord("H")], 90: [0, ord("I")], 160: [0, 0]}
+
+
+def load(tmp_path):
+    target = tmp_path / "cat.csa"
+    with contextlib.redirect_stdout(io.StringIO()):
+        translator.main_container("examples/cat.fs", str(target))
+    with container.Container(target) as image:
+        (code, handler_addr), data = image.code, image.data
+        control_unit = machine.build_control_unit(code, data, 200, handler_addr, dict(SCHEDULE))
+        return debugger.Debugger(control_unit, image.symbols, image.source_map)
+
+
+def test_unarmed_run_matches_simulation(tmp_path):
+    session = load(tmp_path)
+    assert session.run() is None
+    assert session.finished == "halt"
+    assert not vars(session.control_unit).keys() & {"decode_and_execute_instruction"}
+    assert not vars(session.control_unit.data_path).keys() & {"signal_memory_store", "latch_sp"}
+    state = session.state()
+    assert (state["output"], state["tick"]) == ("HI", 187)
+
+
+def test_breakpoints_and_watchpoints(tmp_path):
+    session = load(tmp_path)
+    session.watch_depth(3)
+    assert session.run().reason == "stack depth 3"
+    assert session.state()["stack"] == [0, 0, 0]
+    session.watch_depth(None)
+    session.break_at("interrupt_handler")
+    stop = session.run()
+    assert stop.reason == "breakpoint"
+    assert session.state()["word"] == "interrupt_handler"
+    session.clear_break("interrupt_handler")
+    session.watch("data_ready")
+    stop = session.run()
+    assert stop.reason == "write 1: 0 -> 1"
+    assert session.memory("data_ready") == [1]
+    session.unwatch("data_ready")
+    session.stop_at_tick(150)
+    assert session.run().tick == 150
+    assert session.state()["output"] == "HI"
+    assert session.run() is None
+    assert session.state()["tick"] == 187
+    assert not vars(session.control_unit).keys() & {"decode_and_execute_instruction"}
+    assert not vars(session.control_unit.data_path).keys() & {"signal_memory_store", "latch_sp"}
+
+
+def test_stepi_and_shell(tmp_path):
+    session = load(tmp_path)
+    assert session.stepi() is None
+    assert session.state()["pc"] == 1
+    shell = debugger.DebuggerShell(session)
+    with contextlib.redirect_stdout(io.StringIO()) as stdout:
+        for line in ("break cat", "continue", "x buffer 2", "break nowhere", "delete cat", "c"):
+            shell.onecmd(line)
+    assert stdout.getvalue().splitlines() == [
+        "stopped: breakpoint",
+        "tick 9 pc 8 in cat: load_abs 1",
+        "[0, 0]",
+        "error: unknown symbol nowhere",
+        "finished (halt)",
+        "tick 187 pc 7: halt",
+    ]
@@ -0,0 +1,41 @@
+from pathlib import Path
+
+from src import machine, translator
+from src.counters import PerfCounters
+
+EXAMPLES = Path(__file__).resolve().parent.parent / "examples"
+TEXT = "buffered input"
+
+
+def schedule(gap, start=20):
+    events = {start + n * gap: [0, ord(ch)] for n, ch in enumerate(TEXT)}
+    events[start + len(TEXT) * gap] = [0, 0]
+    return events
+
+
+def run(events, fifo=None):
+    source = (EXAMPLES / "cat_fifo.fs").read_text(encoding="utf-8")
+    instructions, data, _, handler_addr = translator.assemble(translator.forth_to_assemble(source))
+    counters = PerfCounters()
+    output, _ = machine.simulation(instructions, data, 200, handler_addr, events, 10000, counters, fifo)
+    return output, counters.interrupts
+
+
+def test_fifo_coalesces_interrupts():
+    per_char, per_char_interrupts = run(schedule(40))
+    output, interrupts = run(schedule(5), machine.InputFIFO(depth=16, threshold=4, timeout=30))
+    assert per_char == output == TEXT
+    assert per_char_interrupts == len(TEXT) + 1
+    assert interrupts <= (len(TEXT) + 1) // 4 + 1
+
+
+def test_fifo_timeout_flushes_a_short_burst_and_counts_overflows():
+    fifo = machine.InputFIFO(depth=4, threshold=4, timeout=10)
+    fifo.push(1, 0)
+    assert not fifo.interrupt_request(9)
+    assert fifo.interrupt_request(10)
+    for value in range(2, 7):
+        fifo.push(value, 1)
+    assert fifo.occupancy() == 4
+    assert fifo.overflows == 2
+    assert [fifo.pop() for _ in range(4)] == [1, 2, 3, 4]
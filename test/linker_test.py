@@ -0,0 +1,101 @@
+import contextlib
+import io
+
+import pytest
+from src import linker, machine, translator
+
+LIB = """
+str greeting "hello "
+var calls
+: print_str
+    begin
+        dup @
+        dup 0 != if
+            out 1
+            inc
+        else
+            drop
+            exit
+        then
+    again
+;
+: greet
+    calls @ inc calls !
+    greeting print_str
+;
+"""
+
+EXTERNS = """
+extern print_str
+extern greet
+extern var calls
+"""
+
+MAIN_BODY = """
+str name "world"
+greet
+name print_str
+calls @ 48 + out 1
+halt
+"""
+
+MAIN = EXTERNS + MAIN_BODY
+
+
+def run(instructions, data, handler_addr=None):
+    output, _ = machine.simulation(instructions, data, 200, handler_addr, {}, 10000)
+    return output
+
+
+def test_link_resolves_imports_and_relocates_sections():
+    objects = [translator.compile_object(MAIN), translator.compile_object(LIB)]
+    assert objects[0]["imports"] == ["calls", "greet", "print_str"]
+    instructions, data, intr, _ = linker.link(objects)
+    assert not intr
+    assert run(instructions, data) == "hello world1"
+
+
+def test_link_matches_single_file_translation():
+    instructions, data, _, _ = translator.assemble(translator.forth_to_assemble(LIB + MAIN_BODY))
+    linked, linked_data, _, _ = linker.link([translator.compile_object(MAIN), translator.compile_object(LIB)])
+    assert run(linked, linked_data) == run(instructions, data)
+
+
+def test_link_rejects_undefined_symbol():
+    with pytest.raises(SystemExit):
+        linker.link([translator.compile_object(MAIN)])
+
+
+def test_link_rejects_duplicate_symbol():
+    with pytest.raises(SystemExit):
+        linker.link([translator.compile_object(LIB), translator.compile_object(LIB)])
+
+
+def test_ensure_object_recompiles_only_changed_sources(tmp_path):
+    source = tmp_path / "lib.fs"
+    source.write_text(LIB, encoding="utf-8")
+    with contextlib.redirect_stdout(io.StringIO()) as stdout:
+        object_file = linker.ensure_object(str(source))
+        linker.ensure_object(str(source))
+    assert object_file == str(tmp_path / "lib.o")
+    assert stdout.getvalue().count("code instr") == 1
+
+
+def test_link_scales_byte_address_relocations():
+    lib = 'pstr tag "packed"\n: tag_out\n    tag outps 1\n    tag 2 + c@ out 1\n;\n'
+    main = EXTERNS + "extern tag_out\n" + MAIN_BODY.replace("calls @ 48 + out 1\n", "tag_out\n")
+    objects = [translator.compile_object(main), translator.compile_object(LIB), translator.compile_object(lib)]
+    assert {"offset": 0, "section": "data", "scale": 4} in objects[2]["relocations"]
+    instructions, data, _, _ = linker.link(objects)
+    assert run(instructions, data) == "hello worldpackedc"
+
+
+def test_packed_string_is_imported_by_byte_address():
+    lib = 'var count\npstr msg "hello"\n'
+    main = "var pad\n7 pad !\nextern pstr msg\nmsg outps 1\nmsg 1 + c@ out 1\nhalt\n"
+    objects = [translator.compile_object(main), translator.compile_object(lib)]
+    assert objects[1]["symbols"]["&msg"] == {"section": "data", "value": 4, "scale": 4}
+    instructions, data, _, _ = linker.link(objects)
+    assert run(instructions, data) == "helloe"
+    with pytest.raises(SystemExit, match="import it with extern pstr"):
+        linker.link([translator.compile_object(main.replace("extern pstr", "extern var")), objects[1]])
@@ -0,0 +1,47 @@
+from src import multicore, translator
+
+PROGRAM = """
+var flag
+var got
+: interrupt_handler
+    in 0 got !
+;
+eint
+0 != if
+    1 flag !
+    42 out 2
+    halt
+then
+begin
+    got @ 0 != if exit then
+again
+flag @ 48 + out 1
+got @ out 1
+halt
+"""
+
+SPMD = """
+48 + out 1
+halt
+"""
+
+
+def build(source):
+    instructions, data, _, handler_addr = translator.assemble(translator.forth_to_assemble(source))
+    return instructions, data, handler_addr
+
+
+def test_cores_share_memory_and_interrupt_each_other():
+    instructions, data, handler_addr = build(PROGRAM)
+    machine = multicore.MultiCoreMachine(instructions, data, handler_addr, 2, links={(1, 2): 0})
+    outputs, ticks, cycles = machine.run(10000)
+    assert outputs == ["1*", ""]
+    assert cycles == max(ticks)
+
+
+def test_independent_cores_run_in_parallel_with_same_result():
+    instructions, data, handler_addr = build(SPMD)
+    lockstep = multicore.MultiCoreMachine(instructions, data, handler_addr, 3, shared_memory=False).run(100)
+    parallel = multicore.MultiCoreMachine(instructions, data, handler_addr, 3, shared_memory=False).run(100, True)
+    assert lockstep == parallel
+    assert lockstep[0] == ["0", "1", "2"]
@@ -0,0 +1,88 @@
+import asyncio
+import contextlib
+import io
+import threading
+
+import pytest
+from src import client, machine, server, translator
+
+SCHEDULE = "30 0 H\n90 0 I\n160 0 \\0\n"
+
+
+@pytest.fixture
+def socket_path(tmp_path):
+    path = str(tmp_path / "csa.sock")
+    loop = asyncio.new_event_loop()
+    simulator = server.SimulatorServer(workers=2)
+    unix_server = loop.run_until_complete(simulator.start(path))
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield path
+
+    async def shutdown():
+        unix_server.close()
+        await unix_server.wait_closed()
+        await asyncio.gather(*(task for task in asyncio.all_tasks() if task is not asyncio.current_task()))
+
+    asyncio.run_coroutine_threadsafe(shutdown(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+    simulator.close()
+
+
+def run_cli(main, *args):
+    with contextlib.redirect_stdout(io.StringIO()) as stdout:
+        main(*args)
+    return stdout.getvalue()
+
+
+def test_client_matches_local_translator_and_machine(socket_path, tmp_path):
+    (tmp_path / "input.txt").write_text(SCHEDULE)
+    local, remote = tmp_path / "local", tmp_path / "remote"
+    files = {}
+    for name, translate, run in (
+        (local, translator.main, machine.main),
+        (
+            remote,
+            lambda *args: client.translator(*args, socket_path),
+            lambda *args: client.machine(*args, socket_path=socket_path),
+        ),
+    ):
+        code, data = str(name / "code.bin"), str(name / "data.bin")
+        out = run_cli(translate, "examples/cat.fs", code, data)
+        out += run_cli(run, code, data, str(tmp_path / "input.txt"))
+        files[name] = [(name / f).read_bytes() for f in ("code.bin", "data.bin", "code.bin.hex", "data.bin.hex")]
+        files[name, "stdout"] = out
+    assert files[local] == files[remote]
+    assert files[local, "stdout"] == files[remote, "stdout"]
+    assert "output_buffer:HI" in files[remote, "stdout"]
+
+
+def test_run_from_source_and_errors(socket_path):
+    result = client.request({"op": "run", "source": 'str s "ok"\ns @ out 1\nhalt\n'}, socket_path)
+    assert result["output"] == "o"
+    with pytest.raises(SystemExit):
+        client.request({"op": "translate", "source": "undefined_word\nhalt\n"}, socket_path)
+
+
+def test_unexpected_job_failures_are_reported(socket_path):
+    with pytest.raises(SystemExit, match="translation error: IndexError"):
+        client.request({"op": "translate", "source": "var"}, socket_path)
+    with pytest.raises(SystemExit, match="machine error: IndexError"):
+        client.request({"op": "run", "source": "in 0\nout 1\nhalt\n"}, socket_path)
+    assert client.request({"op": "run", "source": "halt\n"}, socket_path)["ticks"] == 0
+
+
+def test_client_forwards_fifo_and_counters(socket_path, tmp_path):
+    (tmp_path / "input.txt").write_text(SCHEDULE)
+    code, data, schedule = str(tmp_path / "code.bin"), str(tmp_path / "data.bin"), str(tmp_path / "input.txt")
+    run_cli(translator.main, "examples/cat_fifo.fs", code, data)
+    local = run_cli(machine.main, code, data, schedule, str(tmp_path / "local"), machine.parse_fifo("4:2:20"))
+    remote = run_cli(
+        lambda: client.machine(code, data, schedule, str(tmp_path / "remote"), "4:2:20", socket_path=socket_path)
+    )
+    assert remote == local
+    assert "output_buffer:HI" in remote
+    for ext in ("json", "prom"):
+        assert (tmp_path / f"remote.{ext}").read_text() == (tmp_path / f"local.{ext}").read_text()
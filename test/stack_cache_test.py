@@ -0,0 +1,50 @@
+import pytest
+from src import machine, translator
+from src.stack_cache import StackCache
+
+RECURSION = """
+var acc
+: down
+    dup 0 != if
+        dup dec down drop
+        dup acc @ + acc !
+    then
+;
+30 down drop
+400 acc @ - out 1
+halt
+"""
+
+DEEP_EXPRESSION = "25 " + "1 " * 40 + "+ " * 40 + "out 1\nhalt\n"
+
+
+def run(text, stack_cache=None):
+    instructions, data, _, handler_addr = translator.assemble(translator.forth_to_assemble(text))
+    return machine.simulation(instructions, data, 200, handler_addr, {}, 10000, stack_cache=stack_cache)
+
+
+@pytest.mark.parametrize("text", [RECURSION, DEEP_EXPRESSION])
+def test_fixed_stacks_overflow(text):
+    with pytest.raises((AssertionError, IndexError)):
+        run(text)
+
+
+def test_deep_call_chain_spills_the_call_stack():
+    cache = StackCache(chunk=4, cost=2)
+    output, ticks = run(RECURSION, cache)
+    assert output == "A"
+    stats = cache.to_dict()
+    assert stats["call_stack"]["max_depth"] == 24
+    assert stats["call_stack"]["words_spilled"] == stats["call_stack"]["words_filled"]
+    moved = sum(area["words_spilled"] + area["words_filled"] for area in (stats["call_stack"], stats["data_stack"]))
+    assert stats["stall_ticks"] == 2 * moved
+    free_output, free_ticks = run(RECURSION, StackCache(chunk=4, cost=0))
+    assert free_output == output
+    assert ticks - free_ticks == stats["stall_ticks"]
+
+
+def test_deep_expression_spills_the_data_stack():
+    cache = StackCache(chunk=4, cost=1)
+    assert run(DEEP_EXPRESSION, cache)[0] == "A"
+    assert cache.data_area.max_depth > 0
+    assert cache.data_area.depth == 0
@@ -0,0 +1,37 @@
+import json
+
+from src import sweep, translator
+
+SCHEDULE = {30: [0, ord("H")], 90: [0, ord("I")], 160: [0, 0]}
+
+
+def translate(path):
+    with open(path, encoding="utf-8") as file:
+        instructions, data, _, handler_addr = translator.assemble(translator.forth_to_assemble(file.read()))
+    return instructions, data, handler_addr
+
+
+def test_sweep_finds_the_smallest_sustained_gap():
+    results, sustained = sweep.sweep(*translate("examples/cat.fs"), SCHEDULE, [2, 20, 30, 40, 60], workers=2)
+    assert sustained == 40
+    assert results[60]["output"] == "HI"
+    assert results[30]["output"] == "H"  # the terminator overwrites 'I' before the main loop reads it
+    assert results[2]["nested"] > 0  # inputs inside the handler re-enter it
+    assert not results[2]["sustained"]
+
+
+def test_sweep_with_fifo_counts_dropped_inputs():
+    schedule = {30 + 40 * n: [0, ord("A") + n] for n in range(10)} | {500: [0, 0]}
+    results, sustained = sweep.sweep(*translate("examples/cat_fifo.fs"), schedule, [3, 13, 20], "4:2:20")
+    assert sustained == 13
+    assert results[3]["dropped"] > 0
+    assert results[13]["output"] == "ABCDEFGHIJ"
+    assert json.dumps(results)  # plain data, picklable across the pool
+
+
+def test_machine_faults_fail_only_their_gap():
+    schedule = {100 * n: [0, ord(ch)] for n, ch in enumerate("94891", start=1)} | {600: [0, 0]}
+    results, sustained = sweep.sweep(*translate("examples/sort.fs"), schedule, [1, 100], workers=2)
+    assert results[1]["error"] == "IndexError: pop from empty list"  # the handler reads an empty input buffer
+    assert not results[1]["sustained"]
+    assert sustained == 100
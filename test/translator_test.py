@@ -0,0 +1,184 @@
+import json
+
+import pytest
+from src import machine, translator
+from src.counters import PerfCounters
+
+LIBRARY = """
+var used
+var unused
+str greeting "hi"
+str farewell "bye"
+: unused_helper
+    unused @ 3 *2 drop drop
+;
+: unused_word
+    farewell unused_helper
+;
+: print_str
+    begin
+        dup @
+        dup 0 != if
+            out 1
+            inc
+        else
+            drop
+            exit
+        then
+    again
+;
+"""
+
+
+def assemble(text):
+    return translator.assemble(translator.forth_to_assemble(text))
+
+
+def test_unreachable_words_and_data_are_dropped():
+    asm = translator.forth_to_assemble(LIBRARY + "greeting print_str\n1 used !\nhalt\n")
+    for name in ("unused_word", "unused_helper", "unused", "farewell", "_tmp_over"):
+        assert name not in asm.split()
+        assert f"{name}:" not in asm.split()
+    assert "print_str:" in asm.split()
+    instructions, data, _, handler_addr = assemble(LIBRARY + "greeting print_str\n1 used !\nhalt\n")
+    assert machine.simulation(instructions, data, 200, handler_addr, {}, 10000)[0] == "hi"
+    assert len(data) == 1 + len("hi") + 1
+
+
+def test_words_reachable_through_calls_and_the_handler_are_kept():
+    text = LIBRARY + ": interrupt_handler\n    unused_word\n;\neint\nhalt\n"
+    asm = translator.forth_to_assemble(text).split()
+    for name in ("unused_word:", "unused_helper:", "unused", "farewell", "_tmp_over"):
+        assert name in asm
+    assert "print_str:" not in asm
+    assert assemble(text)[3] is not None
+
+
+def test_object_files_keep_every_symbol():
+    obj = translator.compile_object(LIBRARY)
+    assert {"unused_word", "unused_helper", "unused", "farewell", "print_str"} <= obj["symbols"].keys()
+
+
+TAIL_RECURSION = """
+var acc
+: down
+    dup 0 != if
+        dup acc @ + acc !
+        dec down
+    else
+        drop
+    then
+;
+: interrupt_handler
+    down
+;
+30 down
+400 acc @ - out 1
+halt
+"""
+
+
+def test_calls_in_tail_position_become_jumps():
+    asm = translator.forth_to_assemble(TAIL_RECURSION).split("\n")
+    down = asm[asm.index("down:") : asm.index("down_end:")]
+    handler = asm[asm.index("interrupt_handler:") : asm.index("iret")]
+    assert "call" not in down
+    assert "jump" in down
+    assert handler[-1] == "call"
+    instructions, data, _, handler_addr = assemble(TAIL_RECURSION)
+    assert machine.simulation(instructions, data, 200, handler_addr, {}, 10000)[0] == "A"
+
+
+def run_output(text):
+    instructions, data, _, handler_addr = assemble(text)
+    return machine.simulation(instructions, data, 200, handler_addr, {}, 10000)[0]
+
+
+def test_shift_and_rotate_words():
+    text = """
+    3 4 lshift out 1
+    1040 4 rshift out 1
+    -1040 4 arshift 130 + out 1
+    1 31 ror 3 rol 49 + out 1
+    halt
+    """
+    assert run_output(text) == "0AAA"
+
+
+def test_power_of_two_multiply_and_divide_become_shifts():
+    text = "var x\n200 x !\nx @ 8 * 1536 swap - out 1\nx @ 4 swap / 15 + out 1\nhalt\n"
+    asm = translator.forth_to_assemble(text).split("\n")
+    assert "lshift" in asm
+    assert "arshift" in asm
+    assert "*" not in asm
+    assert "/" not in asm
+    assert run_output(text) == "@A"
+    assert run_output(text.replace("8 *", "8 dup drop *").replace("4 swap /", "4 dup drop swap /")) == "@A"
+
+
+def test_profile_moves_hot_then_branch_last(tmp_path):
+    text = LIBRARY + "greeting print_str\nhalt\n"
+    counters = PerfCounters()
+    instructions, data, _, handler_addr = assemble(text)
+    trained = machine.simulation(instructions, data, 200, handler_addr, {}, 10000, counters)
+    (tmp_path / "profile.json").write_text(json.dumps(counters.to_dict()))
+    assert translator.hot_then_branches(text, counters.retired_pc) == {1}
+    asm = translator.profiled_assemble(text, tmp_path / "profile.json")
+    assert "bne then_1" in asm.split("\n")
+    instructions, data, _, handler_addr = translator.assemble(asm)
+    output, ticks = machine.simulation(instructions, data, 200, handler_addr, {}, 10000)
+    assert (output, ticks) == (trained[0], trained[1] - 2 * len("hi"))  # no jump over the else-branch
+
+
+def test_profile_of_another_program_is_rejected(tmp_path):
+    text = LIBRARY + "greeting print_str\nhalt\n"
+    counters = PerfCounters()
+    instructions, data, _, handler_addr = assemble(text + "halt\n")
+    machine.simulation(instructions, data, 200, handler_addr, {}, 10000, counters)
+    (tmp_path / "profile.json").write_text(json.dumps(counters.to_dict()))
+    with pytest.raises(SystemExit, match="different program"):
+        translator.profiled_assemble(text, tmp_path / "profile.json")
+    with pytest.raises(SystemExit, match="outside the program"):
+        translator.hot_then_branches(text, {len(instructions): 1})
+
+
+def test_equal_packed_strings_and_suffixes_are_stored_once():
+    text = 'pstr p "abcdef"\npstr q "def"\npstr r "abcdef"\np outps 1\nq outps 1\nr outps 1\nq c@ out 1\nhalt\n'
+    _, labels, data = translator.first_stage(translator.forth_to_assemble(text))
+    assert len(data) == 2  # "abcdef" and its zero byte
+    assert (labels["&q"], labels["&r"]) == (labels["&p"] + len("abc"), labels["&p"])
+    instructions, data, _, handler_addr = assemble(text)
+    assert machine.simulation(instructions, data, 200, handler_addr, {}, 10000)[0] == "abcdefdefabcdefd"
+
+
+def test_writable_strings_are_not_shared():
+    text = 'str a "hi"\nstr b "hi"\n: f 120 a ! ;\nf\nb outs 1\na outs 1\nhalt\n'
+    instructions, data, _, handler_addr = assemble(text)
+    assert len(data) == 2 * len("hi\0")
+    assert machine.simulation(instructions, data, 200, handler_addr, {}, 10000)[0] == "hixi"
+    with pytest.raises(SystemExit, match="read-only"):
+        assemble('pstr p "hi"\n120 p !\nhalt\n')
+
+
+def test_output_ports_are_checked():
+    for text in ('str a "hi"\na outs x\nhalt\n', "var a\na 2 type 9\nhalt\n", 'pstr a "hi"\na outps 0\nhalt\n'):
+        with pytest.raises(SystemExit, match=r"only supports port \[1-7\]"):
+            assemble(text)
+
+
+def test_exit_across_an_open_do_loop_is_rejected():
+    with pytest.raises(SystemExit, match="inside an open do"):
+        assemble(
+            ": f\n    begin\n        3 0 do\n            i out 1\n            exit\n        loop\n    again\n;\nf\nhalt\n"
+        )
+    instructions, data, _, handler_addr = assemble(
+        ": f\n    3 0 do\n        begin\n            i out 1\n            exit\n        again\n    loop\n;\nf\nhalt\n"
+    )
+    assert machine.simulation(instructions, data, 200, handler_addr, {}, 10000)[0] == "\x00\x01\x02"
+
+
+def test_source_map_finds_words_defined_mid_line():
+    text = 'var x : f drop drop ;\n\\ : not_a_word\nstr s ": g"\n: g\n    1 f\n;\n0 x ! 2 g halt\n'
+    instrs_tmp, labels, _ = translator.first_stage(translator.forth_to_assemble(text))
+    smap = translator.source_map(text, instrs_tmp, labels)
+    assert [(entry["word"], entry["line"]) for entry in smap] == [("f", 1), ("g", 4)]
@@ -0,0 +1,64 @@
+import contextlib
+import io
+
+import pytest
+from src import machine, translator, verifier
+
+
+def compile_text(text):
+    asm = translator.forth_to_assemble(text)
+    instrs_tmp, labels, _ = translator.first_stage(asm)
+    _, handler_addr = translator.check_interrupt_handler(instrs_tmp, labels)
+    code = translator.second_stage(instrs_tmp, labels)
+    return code, handler_addr, translator.source_map(text, instrs_tmp, labels)
+
+
+@pytest.mark.parametrize(
+    ("text", "message"),
+    [
+        (": bad\n    dup 0 != if\n        1\n    then\n;\n5 bad\nhalt\n", r"in word bad \(line 1\).*paths meet"),
+        ("1 +\nhalt\n", r"in main program, pc 1 `add`: takes 1 item"),
+        (": deep\n    deep 1\n;\ndeep\nhalt\n", "recursive call"),
+    ],
+)
+def test_rejected_programs_name_the_location(text, message):
+    with pytest.raises(SystemExit, match=message):
+        verifier.verify(*compile_text(text))
+
+
+def test_effects_of_words():
+    with open("examples/prob2_do.fs", encoding="utf-8") as file:
+        text = file.read()
+    code, handler_addr, smap = compile_text(text)
+    starts = {entry["word"]: entry["start"] for entry in smap}
+    with pytest.raises(SystemExit, match=r"int_to_digits.*paths meet"):
+        verifier.verify(code, handler_addr, smap)
+    effect = verifier.Verifier(code, handler_addr, smap).effect(starts["sum"])
+    assert (effect.taken, effect.change, effect.loop_peak) == (0, 0, 1)
+
+
+@pytest.mark.parametrize(
+    ("source", "schedule"),
+    [("examples/cat.fs", "30 0 H\n90 0 I\n160 0 \\0\n"), ("examples/sort.fs", ""), ("examples/prob2.fs", "")],
+)
+def test_unchecked_run_matches_checked(tmp_path, source, schedule):
+    (tmp_path / "input.txt").write_text(schedule)
+    target = str(tmp_path / "program.csa")
+    outputs = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        translator.main_container(source, target)
+    for unchecked in (False, True):
+        with contextlib.redirect_stdout(io.StringIO()) as stdout:
+            machine.main_container(target, str(tmp_path / "input.txt"), unchecked=unchecked)
+        outputs.append(stdout.getvalue())
+    assert outputs[0] == outputs[1]
+    assert "output_buffer:" in outputs[0]
+
+
+def test_unverified_container_cannot_run_unchecked(tmp_path):
+    target = str(tmp_path / "program.csa")
+    (tmp_path / "input.txt").write_text("")
+    with contextlib.redirect_stdout(io.StringIO()):
+        translator.main_container("examples/prob2_do.fs", target, verify=False)
+    with pytest.raises(AssertionError, match="only verified containers"):
+        machine.main_container(target, str(tmp_path / "input.txt"), unchecked=True)
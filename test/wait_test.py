@@ -0,0 +1,102 @@
+import contextlib
+
+import pytest
+from src import machine, translator
+from src.counters import PerfCounters
+
+SORT_SCHEDULE = {100: [0, ord("9")], 200: [0, ord("4")], 300: [0, ord("8")], 400: [0, ord("9")], 500: [0, 0]}
+
+CAT_FIFO_WAIT = """
+var done
+: interrupt_handler
+    begin
+        in 1 0 != if
+            in 0
+            dup 0 != if
+                out 1
+            else
+                drop
+                1 done !
+            then
+        else
+            exit
+        then
+    again
+;
+eint
+begin
+    done @ 0 != if
+        exit
+    else
+        wait
+    then
+again
+halt
+"""
+
+
+def assemble(text):
+    instructions, data, _, handler_addr = translator.assemble(translator.forth_to_assemble(text))
+    return instructions, data, handler_addr
+
+
+def run(program, schedule, idle_limit, fifo=None):
+    """(output, ticks, decode calls) with the given fast-forward bound."""
+    code, data, handler_addr = program
+    control_unit = machine.build_control_unit(code, data, 200, handler_addr, dict(schedule), fifo)
+    control_unit.idle_limit = idle_limit
+    calls = 0
+    with contextlib.suppress(StopIteration):
+        while control_unit.current_tick() < 10000:
+            calls += 1
+            control_unit.decode_and_execute_instruction()
+    return "".join(control_unit.data_path.IO_Controller.io_ports[1]), control_unit.current_tick(), calls
+
+
+def test_fast_forward_keeps_tick_count():
+    with open("examples/sort_wait.fs", encoding="utf-8") as file:
+        program = assemble(file.read())
+    output, ticks, calls = run(program, SORT_SCHEDULE, 10000)
+    stepped_output, stepped_ticks, stepped_calls = run(program, SORT_SCHEDULE, None)
+    assert (stepped_output, stepped_ticks) == (output, ticks)
+    assert output == "4899"
+    assert stepped_calls - calls > 250  # the gaps between inputs are skipped
+    counters = PerfCounters()
+    assert machine.simulation(*program[:2], 200, program[2], dict(SORT_SCHEDULE), 10000, counters) == (output, ticks)
+    assert counters.idle_ticks + sum(counters.opcode_ticks.values()) + counters.interrupts == ticks
+    assert counters.idle_ticks > 250
+
+
+def test_fast_forward_with_fifo_timeout():
+    program = assemble(CAT_FIFO_WAIT)
+    schedule = {30: [0, ord("H")], 40: [0, ord("I")], 500: [0, ord("!")], 900: [0, 0]}
+    fast = run(program, schedule, 10000, machine.InputFIFO(8, 4, 50))
+    assert run(program, schedule, None, machine.InputFIFO(8, 4, 50))[:2] == fast[:2] == ("HI!", fast[1])
+    assert fast[1] > 950  # the last word is only taken after the FIFO timeout
+    assert fast[2] < 200
+
+
+def test_wait_stops_at_the_limit():
+    program = assemble("eint\nwait\nhalt\n: interrupt_handler\n;\n")
+    output, ticks = machine.simulation(*program[:2], 200, program[2], {}, 5000)
+    assert (output, ticks) == ("", 5000)
+
+
+def test_input_between_flag_test_and_wait_is_not_lost():
+    with open("examples/sort_wait.fs", encoding="utf-8") as file:
+        program = assemble(file.read())
+    # the terminator at 248..252 is taken after `data_ready @ 0 !=` has seen no data, just before `wait`
+    for tick in range(240, 261):
+        schedule = {100: [0, ord("9")], 200: [0, ord("4")], tick: [0, 0]}
+        output, ticks = machine.simulation(*program[:2], 200, program[2], schedule, 10000)
+        assert (output, tick) == ("49", tick)
+        assert ticks < 1000
+
+
+def test_wait_reachable_from_the_handler_is_rejected():
+    for text in (
+        ": interrupt_handler\n    wait\n;\neint\nhalt\n",
+        ": idle\n    wait\n;\n: interrupt_handler\n    idle\n;\neint\nhalt\n",
+    ):
+        with pytest.raises(SystemExit, match="wait inside interrupt_handler"):
+            assemble(text)